@@ -0,0 +1,14 @@
+import os
+
+from backend.algorithms.parallel import start_executor, worker_count
+from backend.app import app
+
+# Serving from here rather than from backend.app matters to the process pool: workers
+# re-import the main module unless it is a package's __main__, and backend.app would
+# build every service (geocoder, OSRM client, caches, job queue) again in each of them.
+if __name__ == '__main__':
+    # The reloader runs this module twice, a file watcher and (WERKZEUG_RUN_MAIN) the server;
+    # only the server gets a pool, started now so the first restarts don't wait for it.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and worker_count() > 1:
+        start_executor()
+    app.run(debug=True, host='0.0.0.0', port=3000)
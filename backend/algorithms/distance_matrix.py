@@ -0,0 +1,54 @@
+import math
+import numpy as np
+from typing import List, Dict, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371
+
+def coordinates(locations: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitudes and longitudes of the locations as float arrays."""
+    lats = np.fromiter((loc['lat'] for loc in locations), dtype=np.float64, count=len(locations))
+    lngs = np.fromiter((loc['lng'] for loc in locations), dtype=np.float64, count=len(locations))
+    return lats, lngs
+
+def haversine_distance(loc1: Dict, loc2: Dict) -> float:
+    """Great-circle distance in kilometers between two locations."""
+    lat1, lng1 = math.radians(loc1['lat']), math.radians(loc1['lng'])
+    lat2, lng2 = math.radians(loc2['lat']), math.radians(loc2['lng'])
+    
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def haversine_pairs(lats1: np.ndarray, lngs1: np.ndarray, lats2: np.ndarray, lngs2: np.ndarray) -> np.ndarray:
+    """Element-wise (or broadcast) great-circle distances in kilometers; inputs are in degrees."""
+    lat1, lng1 = np.radians(lats1), np.radians(lngs1)
+    lat2, lng2 = np.radians(lats2), np.radians(lngs2)
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_matrix(locations: List[Dict]) -> np.ndarray:
+    """Full N x N great-circle distance matrix (km) as a C-contiguous float64 array."""
+    lats, lngs = coordinates(locations)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    n = len(locations)
+    
+    # Chord length between unit vectors gives the same great-circle distance as the
+    # haversine formula, but needs only N trig calls plus in-place N x N arithmetic.
+    unit = (np.cos(lats) * np.cos(lngs), np.cos(lats) * np.sin(lngs), np.sin(lats))
+    matrix = np.zeros((n, n))
+    for axis in unit:
+        diff = axis[:, None] - axis[None, :]
+        diff *= diff
+        matrix += diff
+    
+    np.sqrt(matrix, out=matrix)
+    matrix *= 0.5
+    np.minimum(matrix, 1.0, out=matrix)
+    np.arcsin(matrix, out=matrix)
+    matrix *= 2 * EARTH_RADIUS_KM
+    return matrix
+
+def as_distance_matrix(matrix: Sequence[Sequence[float]]) -> np.ndarray:
+    """Coerce a list-of-lists (or array) distance matrix to a C-contiguous float64 array."""
+    return np.ascontiguousarray(matrix, dtype=np.float64)
@@ -0,0 +1,380 @@
+import math
+from collections import deque
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+
+from backend.algorithms.local_search import SearchBudget, EPSILON, matrix_rows, neighbor_lists
+from backend.algorithms.parallel import parallel_improve_routes
+from backend.algorithms.route_optimizer import RouteOptimizer
+
+DEPOT = 0
+FLEET_METHODS = ('savings', 'sweep')
+
+def _check_demands(demands: Sequence[float], capacity: float):
+    """Stop demands (the depot's entry aside) must be finite, non-negative and fit in one vehicle."""
+    if capacity <= 0:
+        raise ValueError("capacity must be positive")
+    invalid = [i for i in range(1, len(demands))
+               if isinstance(demands[i], bool) or not isinstance(demands[i], (int, float))
+               or not math.isfinite(demands[i]) or demands[i] < 0]
+    if invalid:
+        raise ValueError(f"Stops {invalid} need a demand that is a finite, non-negative number")
+    too_large = [i for i in range(1, len(demands)) if demands[i] > capacity]
+    if too_large:
+        raise ValueError(f"Stops {too_large} have a demand above the vehicle capacity")
+
+def clarke_wright(matrix: np.ndarray, demands: Sequence[float], capacity: float,
+                  closed: bool = True) -> List[List[int]]:
+    """
+    Parallel Clarke-Wright savings. Every stop starts on its own depot round trip;
+    routes are then joined end-to-start in order of decreasing saving while the
+    combined load fits. Returns routes of stop indices without the depot.
+    """
+    _check_demands(demands, capacity)
+    n = len(matrix)
+    if n < 2:
+        return []
+    
+    D = np.asarray(matrix)
+    # Joining a route ending at i to one starting at j drops i -> depot and depot -> j for i -> j.
+    back = D[1:, DEPOT] if closed else np.zeros(n - 1)
+    savings = back[:, None] + D[DEPOT, 1:][None, :] - D[1:, 1:]
+    np.fill_diagonal(savings, -np.inf)
+    ends, starts = np.nonzero(savings > EPSILON)
+    order = np.argsort(-savings[ends, starts], kind='stable')
+    
+    routes = {i: [i] for i in range(1, n)}
+    loads = {i: demands[i] for i in range(1, n)}
+    route_of = list(range(n))
+    
+    for k in order:
+        i, j = int(ends[k]) + 1, int(starts[k]) + 1
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj or routes[ri][-1] != i or routes[rj][0] != j:
+            continue
+        if loads[ri] + loads[rj] > capacity:
+            continue
+        # Relabel the shorter route into the longer one.
+        if len(routes[ri]) >= len(routes[rj]):
+            keep, drop = ri, rj
+            routes[ri].extend(routes[rj])
+        else:
+            keep, drop = rj, ri
+            routes[rj][:0] = routes[ri]
+        for stop in routes[drop]:
+            route_of[stop] = keep
+        loads[keep] += loads.pop(drop)
+        del routes[drop]
+    
+    return list(routes.values())
+
+def sweep(locations: List[Dict], demands: Sequence[float], capacity: float) -> List[List[int]]:
+    """
+    Sweep construction: order stops by bearing around the depot, starting after the
+    widest angular gap, and cut a new route whenever the next stop would overflow
+    the vehicle. Returns routes of stop indices without the depot.
+    """
+    _check_demands(demands, capacity)
+    if len(locations) < 2:
+        return []
+    
+    depot = locations[DEPOT]
+    scale = math.cos(math.radians(depot['lat']))
+    angles = sorted(
+        (math.atan2(loc['lat'] - depot['lat'], (loc['lng'] - depot['lng']) * scale), i)
+        for i, loc in enumerate(locations) if i != DEPOT
+    )
+    gaps = [(angles[(k + 1) % len(angles)][0] - angles[k][0]) % (2 * math.pi) for k in range(len(angles))]
+    first = (max(range(len(gaps)), key=gaps.__getitem__) + 1) % len(angles)
+    ordered = [stop for _, stop in angles[first:] + angles[:first]]
+    
+    routes, route, load = [], [], 0
+    for stop in ordered:
+        if route and load + demands[stop] > capacity:
+            routes.append(route)
+            route, load = [], 0
+        route.append(stop)
+        load += demands[stop]
+    if route:
+        routes.append(route)
+    return routes
+
+class _FleetState:
+    """Routes (without the depot) with the stop -> (route, position) lookup and loads."""
+    
+    def __init__(self, routes: List[List[int]], D, demands: Sequence[float], closed: bool):
+        self.routes = [list(route) for route in routes]
+        self.D = D
+        self.demands = demands
+        self.closed = closed
+        self.loads = [sum(demands[stop] for stop in route) for route in self.routes]
+        self.route_of = {}
+        self.position = {}
+        for r in range(len(self.routes)):
+            self._reindex(r)
+    
+    def _reindex(self, r: int):
+        for p, stop in enumerate(self.routes[r]):
+            self.route_of[stop] = r
+            self.position[stop] = p
+    
+    def prev(self, r: int, p: int) -> int:
+        return self.routes[r][p - 1] if p > 0 else DEPOT
+    
+    def next(self, r: int, p: int) -> Optional[int]:
+        route = self.routes[r]
+        if p + 1 < len(route):
+            return route[p + 1]
+        return DEPOT if self.closed else None
+    
+    def link(self, a: int, b: Optional[int]) -> float:
+        return self.D[a][b] if b is not None else 0.0
+    
+    def removal_gain(self, r: int, p: int) -> float:
+        stop = self.routes[r][p]
+        a, b = self.prev(r, p), self.next(r, p)
+        return self.link(a, stop) + self.link(stop, b) - self.link(a, b)
+    
+    def insertion_cost(self, stop: int, r: int, gap: int) -> float:
+        """Cost of placing `stop` before position `gap` of route r (gap == len means at the end)."""
+        a = self.prev(r, gap)
+        b = self.routes[r][gap] if gap < len(self.routes[r]) else (DEPOT if self.closed else None)
+        return self.link(a, stop) + self.link(stop, b) - self.link(a, b)
+    
+    def replacement_delta(self, r: int, p: int, stop: int) -> float:
+        """Cost change of putting `stop` in place of the stop at position p of route r."""
+        old = self.routes[r][p]
+        a, b = self.prev(r, p), self.next(r, p)
+        return (self.link(a, stop) + self.link(stop, b)) - (self.link(a, old) + self.link(old, b))
+    
+    def relocate(self, stop: int, r: int, gap: int):
+        source = self.route_of[stop]
+        del self.routes[source][self.position[stop]]
+        self.loads[source] -= self.demands[stop]
+        self._reindex(source)
+        self.routes[r].insert(gap, stop)
+        self.loads[r] += self.demands[stop]
+        self._reindex(r)
+    
+    def exchange(self, a: int, b: int):
+        ra, rb = self.route_of[a], self.route_of[b]
+        pa, pb = self.position[a], self.position[b]
+        self.routes[ra][pa], self.routes[rb][pb] = b, a
+        self.loads[ra] += self.demands[b] - self.demands[a]
+        self.loads[rb] += self.demands[a] - self.demands[b]
+        self.route_of[a], self.route_of[b] = rb, ra
+        self.position[a], self.position[b] = pb, pa
+    
+    def neighbors_of(self, stop: int) -> List[int]:
+        r, p = self.route_of[stop], self.position[stop]
+        return [node for node in (self.prev(r, p), stop, self.next(r, p)) if node is not None and node != DEPOT]
+
+
+def reduce_routes(matrix: np.ndarray, routes: List[List[int]], demands: Sequence[float], capacity: float,
+                  vehicles: int, closed: bool = True) -> List[List[int]]:
+    """
+    Eliminate routes until at most `vehicles` remain: the lightest route whose stops
+    all fit in the other routes' spare capacity is emptied, each stop (heaviest first)
+    going to its cheapest position on a route with room. Stops when no route can go.
+    """
+    state = _FleetState(routes, matrix_rows(matrix), demands, closed)
+    
+    while sum(1 for route in state.routes if route) > vehicles:
+        for r in sorted((r for r in range(len(state.routes)) if state.routes[r]), key=lambda r: state.loads[r]):
+            # Plan every stop's new place against tentative loads before moving any of them.
+            loads = list(state.loads)
+            moves = []
+            for stop in sorted(state.routes[r], key=lambda stop: -demands[stop]):
+                best_cost, best_target = math.inf, None
+                for target, route in enumerate(state.routes):
+                    if target == r or not route or loads[target] + demands[stop] > capacity:
+                        continue
+                    cost = min(state.insertion_cost(stop, target, gap) for gap in range(len(route) + 1))
+                    if cost < best_cost:
+                        best_cost, best_target = cost, target
+                if best_target is None:
+                    break
+                loads[best_target] += demands[stop]
+                moves.append((stop, best_target))
+            else:
+                for stop, target in moves:
+                    route = state.routes[target]
+                    gap = min(range(len(route) + 1), key=lambda gap: state.insertion_cost(stop, target, gap))
+                    state.relocate(stop, target, gap)
+                break
+        else:
+            break
+    
+    return [route for route in state.routes if route]
+
+
+def inter_route_search(matrix: np.ndarray, routes: List[List[int]], demands: Sequence[float], capacity: float,
+                       closed: bool = True, neighbors: Optional[List[List[int]]] = None,
+                       budget: Optional[SearchBudget] = None) -> List[List[int]]:
+    """
+    Relocate and exchange moves between routes, driven by neighbor lists and
+    don't-look bits: a stop is tried next to each of its nearest neighbors that
+    sits on another route, and the best capacity-feasible improving move is applied.
+    Routes left empty are dropped.
+    """
+    if neighbors is None:
+        neighbors = neighbor_lists(matrix)
+    state = _FleetState(routes, matrix_rows(matrix), demands, closed)
+    
+    queue = deque(stop for route in state.routes for stop in route)
+    queued = set(queue)
+    while queue:
+        if budget is not None and budget.tick():
+            break
+        stop = queue.popleft()
+        queued.discard(stop)
+        r, p = state.route_of[stop], state.position[stop]
+        gain = state.removal_gain(r, p)
+        demand = demands[stop]
+        
+        best_delta, best_move = -EPSILON, None
+        for other in neighbors[stop]:
+            if other == DEPOT or state.route_of[other] == r:
+                continue
+            target, q = state.route_of[other], state.position[other]
+            
+            if state.loads[target] + demand <= capacity:
+                for gap in (q, q + 1):
+                    delta = state.insertion_cost(stop, target, gap) - gain
+                    if delta < best_delta:
+                        best_delta, best_move = delta, ('relocate', target, gap)
+            
+            # Swap with the stops on either side of the neighbor, so `stop` lands next to it.
+            for s in (q - 1, q + 1):
+                if not 0 <= s < len(state.routes[target]):
+                    continue
+                swap = state.routes[target][s]
+                if (state.loads[r] - demand + demands[swap] > capacity or
+                        state.loads[target] - demands[swap] + demand > capacity):
+                    continue
+                delta = state.replacement_delta(r, p, swap) + state.replacement_delta(target, s, stop)
+                if delta < best_delta:
+                    best_delta, best_move = delta, ('exchange', swap)
+        
+        if best_move is None:
+            continue
+        
+        touched = state.neighbors_of(stop)
+        if best_move[0] == 'relocate':
+            state.relocate(stop, best_move[1], best_move[2])
+        else:
+            touched += state.neighbors_of(best_move[1])
+            state.exchange(stop, best_move[1])
+        touched += state.neighbors_of(stop)
+        for node in touched:
+            if node not in queued:
+                queue.append(node)
+                queued.add(node)
+    
+    return [route for route in state.routes if route]
+
+
+class FleetOptimizer(RouteOptimizer):
+    """
+    Capacitated multi-vehicle routing from a shared depot (the first location).
+    Stops are split across vehicles by Clarke-Wright savings or a sweep, each route is
+    improved with 2-opt/Or-opt in parallel, and relocate/exchange moves rebalance stops
+    between routes.
+    """
+    
+    def route_cost(self, route: List[int], closed: bool) -> float:
+        """Length of a depot -> stops (-> depot) route."""
+        indices = [DEPOT] + route + ([DEPOT] if closed else [])
+        return self._calculate_route_distance(indices)
+    
+    def optimize_fleet(self, capacity: float, demands: Optional[Sequence[float]] = None,
+                       vehicles: Optional[int] = None, method: str = "savings", return_to_depot: bool = True,
+                       time_limit_ms: Optional[float] = None) -> Dict:
+        """
+        Split the stops into vehicle routes. `demands` defaults to 1 per stop (the
+        depot's entry is ignored). With `vehicles`, routes beyond that many are emptied
+        into the others' spare capacity; a ValueError is raised if they still don't fit.
+        """
+        n = len(self.locations)
+        demands = [1.0] * n if demands is None else list(demands)
+        if len(demands) != n:
+            raise ValueError("demands must have one entry per location")
+        demands[DEPOT] = 0.0
+        _check_demands(demands, capacity)
+        demands = [float(d) for d in demands]
+        closed = return_to_depot
+        
+        # No split can beat the total load over the capacity, so fail before searching.
+        if vehicles is not None and math.ceil(sum(demands) / capacity - EPSILON) > vehicles:
+            raise ValueError(f"At least {math.ceil(sum(demands) / capacity - EPSILON)} vehicles are needed "
+                             f"for this capacity, only {vehicles} available")
+        
+        budget = SearchBudget(time_limit_ms)
+        if method == "sweep":
+            routes = sweep(self.locations, demands, capacity)
+        else:
+            routes = clarke_wright(self.distance_matrix, demands, capacity, closed=closed)
+        if vehicles is not None and len(routes) > vehicles:
+            routes = reduce_routes(self.distance_matrix, routes, demands, capacity, vehicles, closed=closed)
+        construction_distance = sum(self.route_cost(route, closed) for route in routes)
+        
+        symmetric = bool(np.allclose(self.distance_matrix, self.distance_matrix.T))
+        routes = self._improve_routes(routes, closed, budget, symmetric)
+        if len(routes) > 1 and not budget.expired():
+            routes = inter_route_search(self.distance_matrix, routes, demands, capacity, closed=closed,
+                                        neighbors=self._neighbors(), budget=budget)
+            routes = self._improve_routes(routes, closed, budget, symmetric)
+        
+        if vehicles is not None and len(routes) > vehicles:
+            raise ValueError(f"The stops could not be packed into {vehicles} vehicles of this capacity "
+                             f"({len(routes)} needed)")
+        
+        return self._build_fleet_response(routes, demands, capacity, closed, budget, construction_distance)
+    
+    def _improve_routes(self, routes: List[List[int]], closed: bool, budget: SearchBudget,
+                        symmetric: bool) -> List[List[int]]:
+        if budget.expired():
+            return routes
+        remaining_ms = budget.time_limit * 1000 - budget.elapsed_ms() if budget.time_limit else None
+        improved = parallel_improve_routes(self.distance_matrix, [[DEPOT] + route for route in routes],
+                                           closed=closed, time_limit_ms=remaining_ms, symmetric=symmetric)
+        return [route[1:] for route in improved]
+    
+    def _build_fleet_response(self, routes: List[List[int]], demands: List[float], capacity: float,
+                              closed: bool, budget: SearchBudget, construction_distance: float) -> Dict:
+        paths = [[DEPOT] + route + ([DEPOT] if closed else []) for route in routes]
+        
+        # One geometry request for every vehicle's legs rather than one per vehicle.
+        if self.geometry_fetcher:
+            missing_legs = list(dict.fromkeys(
+                (path[i], path[i + 1]) for path in paths for i in range(len(path) - 1)
+                if (path[i], path[i + 1]) not in self.geometry_cache
+            ))
+            if missing_legs:
+                self.geometry_cache.update(self.geometry_fetcher(missing_legs))
+        
+        vehicles = []
+        for number, (route, path) in enumerate(zip(routes, paths), start=1):
+            vehicles.append({
+                "vehicle": number,
+                "load": sum(demands[stop] for stop in route),
+                "capacity": capacity,
+                **self._build_route_response(path)
+            })
+        
+        total_distance = sum(vehicle["total_distance"] for vehicle in vehicles)
+        improvement = construction_distance - sum(self.route_cost(route, closed) for route in routes)
+        return {
+            "vehicles": vehicles,
+            "total_distance": round(total_distance, 2),
+            "stats": {
+                "vehicles_used": len(vehicles),
+                "iterations": budget.iterations,
+                "elapsed_ms": round(budget.elapsed_ms(), 1),
+                "time_limit_ms": budget.time_limit * 1000 if budget.time_limit else None,
+                "timed_out": budget.timed_out,
+                "construction_distance": round(construction_distance, 2),
+                "improvement": round(improvement, 2)
+            }
+        }
@@ -0,0 +1,115 @@
+import math
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+GEOMETRY_FORMATS = ('coordinates', 'polyline')
+
+# Web Mercator ground resolution at zoom 0 on the equator, in meters per 256 px tile pixel.
+METERS_PER_PIXEL_Z0 = 156543.03392
+METERS_PER_DEGREE = 111319.49
+
+Geometry = Union[str, Sequence[Sequence[float]]]
+
+def encode_polyline(points: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Encode [lat, lng] points in Google's encoded polyline format (what OSRM returns for geometries=polyline)."""
+    factor = 10 ** precision
+    chunks = []
+    last_lat = last_lng = 0
+    for lat, lng in points:
+        lat_e, lng_e = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (lat_e - last_lat, lng_e - last_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        last_lat, last_lng = lat_e, lng_e
+    return ''.join(chunks)
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[List[float]]:
+    """Decode a Google encoded polyline into [lat, lng] points."""
+    factor = 10 ** precision
+    points = []
+    values = [0, 0]
+    index = 0
+    length = len(encoded)
+    while index < length:
+        for axis in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append([values[0] / factor, values[1] / factor])
+    return points
+
+def as_points(geometry: Geometry) -> List[List[float]]:
+    """[lat, lng] points of a geometry given either as points or as an encoded polyline."""
+    return decode_polyline(geometry) if isinstance(geometry, str) else [list(point) for point in geometry]
+
+def as_polyline(geometry: Geometry) -> str:
+    return geometry if isinstance(geometry, str) else encode_polyline(geometry)
+
+def zoom_tolerance(zoom: float, lat: float) -> float:
+    """Half a screen pixel in meters at a web map zoom level and latitude: finer detail can't be seen."""
+    return 0.5 * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / 2 ** zoom
+
+def simplify(points: Sequence[Sequence[float]], tolerance_m: float) -> List[List[float]]:
+    """
+    Douglas-Peucker: keep the endpoints and, recursively, any point farther than
+    tolerance_m from the segment between the points kept around it. Distances are
+    measured on a local equirectangular projection of the line.
+    """
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return [list(point) for point in points]
+    
+    coords = np.asarray(points, dtype=np.float64)
+    y = coords[:, 0] * METERS_PER_DEGREE
+    x = coords[:, 1] * METERS_PER_DEGREE * math.cos(math.radians(float(coords[:, 0].mean())))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    limit = tolerance_m * tolerance_m
+    
+    # An explicit stack instead of recursion: long OSRM legs have thousands of points.
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b <= a + 1:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        length = dx * dx + dy * dy
+        if length > 0:
+            t = np.clip((px * dx + py * dy) / length, 0.0, 1.0)
+            px, py = px - t * dx, py - t * dy
+        distances = px * px + py * py
+        k = int(np.argmax(distances))
+        if distances[k] > limit:
+            split = a + 1 + k
+            keep[split] = True
+            stack.append((a, split))
+            stack.append((split, b))
+    return coords[keep].tolist()
+
+def render_geometry(geometry: Geometry, geometry_format: str = 'coordinates', tolerance_m: Optional[float] = None,
+                    zoom: Optional[float] = None) -> Geometry:
+    """
+    A leg geometry as the response asks for it: [lat, lng] points or an encoded polyline,
+    simplified to tolerance_m meters or to what is visible at map zoom level `zoom`.
+    """
+    if tolerance_m is None and zoom is None:
+        if geometry_format == 'polyline':
+            return as_polyline(geometry)
+        return as_points(geometry)
+    
+    points = as_points(geometry)
+    if points:
+        tolerance = tolerance_m if tolerance_m is not None else zoom_tolerance(zoom, points[0][0])
+        points = simplify(points, tolerance)
+    return encode_polyline(points) if geometry_format == 'polyline' else points
@@ -0,0 +1,322 @@
+import hashlib
+import heapq
+from collections import defaultdict, deque
+from typing import Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.algorithms.pathfinding import Grid, AStarPathfinder, PATHFINDERS
+
+# Algorithms GridIndex.find_path answers: the hierarchical search and every flat pathfinder.
+INDEX_ALGORITHMS = ('hpa',) + tuple(PATHFINDERS)
+
+def grid_key(grid: Grid) -> str:
+    """Content hash identifying a grid layout (walls and cell costs)."""
+    digest = hashlib.sha1(f"{grid.rows}x{grid.cols}:".encode())
+    digest.update(grid.costs)
+    return digest.hexdigest()
+
+def label_components(grid: Grid) -> np.ndarray:
+    """
+    Connected-component label per cell id (0 for walls, 1..K for open cells).
+    Works on horizontal runs of open cells: runs in neighboring rows that overlap
+    are merged with union-find, then the run labels are painted back onto cells.
+    """
+    free = ~grid.blocked.ravel()
+    edges = np.diff(free.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+    # Runs never wrap rows because every row starts and ends with a border wall.
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    run_rows = starts // grid.width
+    row_first = np.searchsorted(run_rows, np.arange(grid.rows + 3)).tolist()
+    starts_x = (starts % grid.width).tolist()
+    ends_x = (starts % grid.width + (ends - starts)).tolist()
+    
+    parent = list(range(len(starts)))
+    
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+    
+    for row in range(1, grid.rows):
+        i, i_end = row_first[row], row_first[row + 1]
+        j, j_end = row_first[row + 1], row_first[row + 2]
+        while i < i_end and j < j_end:
+            if starts_x[i] < ends_x[j] and starts_x[j] < ends_x[i]:
+                a, b = find(i), find(j)
+                if a != b:
+                    parent[b] = a
+            if ends_x[i] < ends_x[j]:
+                i += 1
+            else:
+                j += 1
+    
+    roots = np.fromiter((find(run) for run in range(len(starts))), dtype=np.int64, count=len(starts))
+    _, run_labels = np.unique(roots, return_inverse=True)
+    run_labels = run_labels.astype(np.int32) + 1
+    
+    marks = np.zeros(grid.size + 1, dtype=np.int32)
+    np.add.at(marks, starts, run_labels)
+    np.add.at(marks, ends, -run_labels)
+    return np.cumsum(marks[:-1], dtype=np.int32)
+
+
+class GridIndex:
+    """
+    Precomputed structure for answering many path queries on one grid layout.
+    
+    - Connected components: a query whose ends lie in different components is
+      rejected in O(1) instead of after flooding the start's component.
+    - An HPA*-style abstraction: the grid is cut into square clusters, and each
+      open stretch of a cluster border becomes an entrance (one transition at its
+      middle, or one at each end when it is 6+ cells long). Long queries run A* on
+      the graph of transitions and then refine each hop inside one cluster.
+      Distances between the transitions of a cluster are computed the first time a
+      query crosses it and kept for later queries.
+    
+    Hierarchical paths are near-optimal: a hop may detour slightly because it is
+    refined inside its cluster. Queries that stay within about two clusters, and
+    queries naming another algorithm, run that search on the prebuilt Grid. The
+    abstraction counts steps, so on weighted grids or with diagonal moves `hpa`
+    queries run exact A* instead (components are the same either way, since a
+    diagonal move may not cut past a wall corner).
+    """
+    
+    ENTRANCE_SPLIT = 6
+    
+    def __init__(self, cells, cluster_size: int = 16):
+        self.grid = cells if isinstance(cells, Grid) else Grid(cells)
+        self.key = grid_key(self.grid)
+        self.cluster_size = max(2, cluster_size)
+        self.labels = label_components(self.grid)
+        self.components = int(self.labels.max()) if self.labels.size else 0
+        
+        self.transitions = defaultdict(list)
+        self.cluster_nodes = defaultdict(set)
+        self._intra = {}
+        self._build_entrances()
+    
+    def cluster_of(self, cell: int) -> Tuple[int, int]:
+        y, x = divmod(cell, self.grid.width)
+        return (y - 1) // self.cluster_size, (x - 1) // self.cluster_size
+    
+    def connected(self, a: int, b: int) -> bool:
+        return self.labels[a] != 0 and self.labels[a] == self.labels[b]
+    
+    def _build_entrances(self):
+        grid, size = self.grid, self.cluster_size
+        free = ~grid.blocked[1:-1, 1:-1]
+        
+        # Vertical borders: column x on the left, x + 1 on the right.
+        for x in range(size - 1, grid.cols - 1, size):
+            both = free[:, x] & free[:, x + 1]
+            for y0 in range(0, grid.rows, size):
+                for lo, hi in self._runs(both[y0:y0 + size]):
+                    for y in self._transition_offsets(lo, hi):
+                        self._add_entrance(grid.cell_id(x, y0 + y), grid.cell_id(x + 1, y0 + y))
+        
+        # Horizontal borders: row y above, y + 1 below.
+        for y in range(size - 1, grid.rows - 1, size):
+            both = free[y, :] & free[y + 1, :]
+            for x0 in range(0, grid.cols, size):
+                for lo, hi in self._runs(both[x0:x0 + size]):
+                    for x in self._transition_offsets(lo, hi):
+                        self._add_entrance(grid.cell_id(x0 + x, y), grid.cell_id(x0 + x, y + 1))
+    
+    @staticmethod
+    def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+        """[lo, hi) ranges of consecutive True values."""
+        edges = np.diff(mask.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+    
+    def _transition_offsets(self, lo: int, hi: int) -> List[int]:
+        if hi - lo >= self.ENTRANCE_SPLIT:
+            return [lo, hi - 1]
+        return [(lo + hi - 1) // 2]
+    
+    def _add_entrance(self, a: int, b: int):
+        self.transitions[a].append(b)
+        self.transitions[b].append(a)
+        self.cluster_nodes[self.cluster_of(a)].add(a)
+        self.cluster_nodes[self.cluster_of(b)].add(b)
+    
+    def _cluster_bfs(self, source: int, target: Optional[int] = None) -> Tuple[Callable, Callable]:
+        """
+        Breadth-first search from `source` that never leaves its cluster, run on a
+        wall-padded copy of the cluster. Returns lookups `distance(cell)` (None when
+        unreachable) and `path(cell)` (cells after `source` up to `cell`) on grid ids.
+        """
+        grid, size = self.grid, self.cluster_size
+        width = grid.width
+        cy, cx = self.cluster_of(source)
+        y0, y1 = cy * size + 1, min((cy + 1) * size, grid.rows) + 1
+        x0, x1 = cx * size + 1, min((cx + 1) * size, grid.cols) + 1
+        
+        block = np.ones((y1 - y0 + 2, x1 - x0 + 2), dtype=bool)
+        block[1:-1, 1:-1] = grid.blocked[y0:y1, x0:x1]
+        walls = block.tobytes()
+        local_width = x1 - x0 + 2
+        oy, ox = y0 - 1, x0 - 1
+        
+        def to_local(cell):
+            y, x = divmod(cell, width)
+            return (y - oy) * local_width + (x - ox)
+        
+        def to_global(local):
+            y, x = divmod(local, local_width)
+            return (y + oy) * width + (x + ox)
+        
+        dist = [-1] * len(walls)
+        parent = [-1] * len(walls)
+        start = to_local(source)
+        stop = to_local(target) if target is not None else -1
+        dist[start] = 0
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            if cell == stop:
+                break
+            step = dist[cell] + 1
+            for nb in (cell + local_width, cell + 1, cell - local_width, cell - 1):
+                if dist[nb] < 0 and not walls[nb]:
+                    dist[nb] = step
+                    parent[nb] = cell
+                    queue.append(nb)
+        
+        def distance(cell):
+            value = dist[to_local(cell)]
+            return value if value >= 0 else None
+        
+        def path(cell):
+            cells = []
+            local = to_local(cell)
+            while local != start:
+                cells.append(to_global(local))
+                local = parent[local]
+            return cells[::-1]
+        
+        return distance, path
+    
+    def _links(self, source: int) -> Dict[int, int]:
+        """Distances from `source` to the transitions of its cluster it can reach inside the cluster."""
+        distance, _ = self._cluster_bfs(source)
+        links = {}
+        for node in self.cluster_nodes[self.cluster_of(source)]:
+            length = distance(node)
+            if length is not None and node != source:
+                links[node] = length
+        return links
+    
+    def _intra_edges(self, node: int) -> Dict[int, int]:
+        """Distances from a transition to the other transitions of its cluster (cached)."""
+        edges = self._intra.get(node)
+        if edges is None:
+            edges = self._intra[node] = self._links(node)
+        return edges
+    
+    def find_path(self, start: Dict[str, int], end: Dict[str, int], algorithm: str = "hpa",
+                  explored_format: str = 'cells', diagonal: bool = False) -> Dict:
+        if algorithm not in INDEX_ALGORITHMS:
+            raise ValueError(f"algorithm must be one of: {', '.join(INDEX_ALGORITHMS)}")
+        grid = self.grid
+        not_found = self._result(None, [], explored_format)
+        if not (grid.in_bounds(start['x'], start['y']) and grid.in_bounds(end['x'], end['y'])):
+            return not_found
+        
+        source, goal = grid.cell_id(start['x'], start['y']), grid.cell_id(end['x'], end['y'])
+        if not self.connected(source, goal):
+            return not_found
+        
+        if algorithm != "hpa":
+            pathfinder = PATHFINDERS[algorithm](grid, start, end, diagonal=diagonal)
+            return pathfinder.find_path(explored_format)
+        
+        exact = AStarPathfinder(grid, start, end, diagonal=diagonal)
+        short = abs(start['x'] - end['x']) + abs(start['y'] - end['y']) <= 2 * self.cluster_size
+        if short or diagonal or not grid.uniform or self.cluster_of(source) == self.cluster_of(goal):
+            return exact.find_path(explored_format)
+        
+        hops, explored = self._abstract_search(source, goal)
+        if hops is None:
+            # Only reachable by leaving and re-entering a cluster in ways the abstraction can't express.
+            return exact.find_path(explored_format)
+        return self._result(self._refine(hops), explored, explored_format)
+    
+    def _result(self, path: Optional[List[int]], explored: List[int], explored_format: str) -> Dict:
+        result = {"found": path is not None, "path": self.grid.points(path or [])}
+        if path is not None:
+            result["cost"] = self.grid.path_cost(path)
+        if explored_format != 'none':
+            result["explored"] = self.grid.encode_explored(explored, explored_format)
+        return result
+    
+    def _abstract_search(self, source: int, goal: int) -> Tuple[Optional[List[int]], List[int]]:
+        """A* over the transitions, with the start and goal linked into their clusters."""
+        width = self.grid.width
+        goal_y, goal_x = divmod(goal, width)
+        
+        start_edges = self._links(source)
+        goal_edges = self._links(goal)
+        
+        g = {source: 0}
+        parent = {source: -1}
+        closed = set()
+        explored = []
+        h = abs(source // width - goal_y) + abs(source % width - goal_x)
+        heap = [(h, h, source)]
+        
+        while heap:
+            _, h, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            explored.append(node)
+            
+            if node == goal:
+                hops = []
+                while node != -1:
+                    hops.append(node)
+                    node = parent[node]
+                return hops[::-1], explored
+            
+            links = start_edges if node == source else self._intra_edges(node)
+            edges = list(links.items()) + [(other, 1) for other in self.transitions.get(node, ())]
+            if node in goal_edges:
+                edges.append((goal, goal_edges[node]))
+            
+            cost = g[node]
+            for other, length in edges:
+                step = cost + length
+                if other not in closed and step < g.get(other, step + 1):
+                    g[other] = step
+                    parent[other] = node
+                    h = abs(other // width - goal_y) + abs(other % width - goal_x)
+                    # Ties go to the entry nearer the goal, as in the grid searches.
+                    heapq.heappush(heap, (step + h, h, other))
+        
+        return None, explored
+    
+    def _refine(self, hops: List[int]) -> List[int]:
+        """Expand abstract hops into cells: transitions are single steps, the rest BFS within a cluster."""
+        path = [hops[0]]
+        for a, b in zip(hops, hops[1:]):
+            if a == b:
+                continue
+            if self.cluster_of(a) != self.cluster_of(b):
+                path.append(b)
+                continue
+            _, segment = self._cluster_bfs(a, target=b)
+            path.extend(segment(b))
+        return path
+    
+    def stats(self) -> Dict:
+        return {
+            "grid_id": self.key,
+            "rows": self.grid.rows,
+            "cols": self.grid.cols,
+            "components": self.components,
+            "cluster_size": self.cluster_size,
+            "transitions": sum(len(nodes) for nodes in self.cluster_nodes.values())
+        }
@@ -0,0 +1,193 @@
+import time
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.algorithms.pathfinding import Grid, DijkstraPathfinder, UNREACHED
+from backend.algorithms.parallel import SharedArray, attach, get_executor, worker_count, _collect
+
+# Total cells to sweep (sources x grid size) below which the process pool isn't worth its overhead.
+PARALLEL_MIN_CELLS = 4_000_000
+
+def single_source(walls: np.ndarray, width: int, source: int, targets: np.ndarray,
+                  with_parents: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Distances from `source` to every cell of a padded grid (flat wall mask), -1 where
+    unreachable. The search grows one BFS level at a time as whole NumPy arrays and
+    stops as soon as every target is settled. Parents (cell id each cell was reached
+    from) are kept only when paths are wanted.
+    """
+    dist = np.full(walls.size, -1, dtype=np.int32)
+    parent = np.full(walls.size, -1, dtype=np.int32) if with_parents else None
+    seen = walls.copy()
+    seen[source] = True
+    dist[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    level = 0
+    
+    while frontier.size and not seen[targets].all():
+        level += 1
+        reached = []
+        for step in (width, 1, -width, -1):
+            cells = frontier + step
+            cells = cells[~seen[cells]]
+            seen[cells] = True
+            dist[cells] = level
+            if parent is not None:
+                parent[cells] = cells - step
+            reached.append(cells)
+        frontier = np.concatenate(reached)
+    return dist, parent
+
+
+def _walk_back(parent: np.ndarray, source: int, target: int) -> List[int]:
+    path = [target]
+    while path[-1] != source:
+        path.append(int(parent[path[-1]]))
+    path.reverse()
+    return path
+
+
+def _rows(grid: Grid, sources: Sequence[int], targets: Sequence[int],
+          path_targets: Optional[Sequence[Sequence[int]]], diagonal: bool = False) -> List[Tuple[List[float], Dict]]:
+    """
+    One row of distances (-1 where unreachable) per source, plus cell-id paths to the
+    target positions listed for that source in `path_targets` (None for no paths).
+    Uniform 4-connected grids use the array BFS; weighted grids or diagonal moves
+    run the Dijkstra pathfinder until every target is settled.
+    """
+    rows = []
+    if grid.uniform and not diagonal:
+        walls = np.frombuffer(grid.walls, dtype=bool)
+        targets = np.asarray(targets, dtype=np.int64)
+        for k, source in enumerate(sources):
+            wanted = path_targets[k] if path_targets is not None else ()
+            dist, parent = single_source(walls, grid.width, source, targets, with_parents=bool(wanted))
+            row = dist[targets].tolist()
+            paths = {j: _walk_back(parent, source, int(targets[j])) for j in wanted if row[j] >= 0}
+            rows.append((row, paths))
+        return rows
+    
+    anywhere = {'x': 0, 'y': 0}
+    search = DijkstraPathfinder(grid, anywhere, anywhere, diagonal=diagonal)
+    # Walls are never settled, so waiting for them would sweep the whole grid.
+    open_targets = [target for target in targets if not grid.walls[target]]
+    for k, source in enumerate(sources):
+        wanted = path_targets[k] if path_targets is not None else ()
+        g, parent, _ = search.expand(source, open_targets or [source], [])
+        row = []
+        for target in targets:
+            known = 0 if target == source else g[target]
+            row.append(-1 if known in (UNREACHED, -1) else known / search.unit)
+        paths = {j: _walk_back(parent, source, int(targets[j])) for j in wanted if row[j] >= 0}
+        rows.append((row, paths))
+    return rows
+
+
+def _xy(grid: Grid, path: List[int]) -> List[List[int]]:
+    flat = grid.indices(path)
+    return np.stack([flat % grid.cols, flat // grid.cols], axis=1).tolist()
+
+
+def grid_paths(grid: Grid, points: List[Dict[str, int]], legs: List[Tuple[int, int]],
+               diagonal: bool = False) -> Dict[Tuple[int, int], List[List[int]]]:
+    """
+    [[x, y], ...] paths for the given (i, j) legs only, one search per distinct start.
+    Fits RouteOptimizer's geometry_fetcher, so only the legs of the final tour are walked.
+    """
+    cells = [grid.cell_id(point['x'], point['y']) for point in points]
+    by_source = {}
+    for i, j in legs:
+        by_source.setdefault(i, []).append(j)
+    
+    result = {}
+    for i, ends in by_source.items():
+        (row, paths), = _rows(grid, [cells[i]], [cells[j] for j in ends], [list(range(len(ends)))], diagonal)
+        for position, j in enumerate(ends):
+            if position in paths:
+                result[(i, j)] = _xy(grid, paths[position])
+    return result
+
+
+# Worker side: the Grid rebuilt from the shared cell values of the run being served.
+_worker_grid: Dict[str, Grid] = {}
+
+def _rows_worker(values: Tuple, sources: List[int], targets: List[int],
+                 path_targets: Optional[List[List[int]]], diagonal: bool) -> List[Tuple[List[float], Dict]]:
+    if values[0] not in _worker_grid:
+        _worker_grid.clear()
+        _worker_grid[values[0]] = Grid(attach(values))
+    return _rows(_worker_grid[values[0]], sources, targets, path_targets, diagonal)
+
+
+def grid_distance_matrix(grid: Grid, points: List[Dict[str, int]], paths=False, parallel: Optional[bool] = None,
+                         diagonal: bool = False) -> Tuple[np.ndarray, Dict[Tuple[int, int], List[List[int]]], Dict]:
+    """
+    Shortest path costs between every pair of `points` ({"x", "y"}) on a grid (see
+    Grid for cell costs; `diagonal` allows 8-connected moves), from one expansion per
+    distinct point rather than one search per pair.
+    
+    Returns (matrix, legs, stats). The matrix is K x K float64 with inf for unreachable
+    pairs, usable as a RouteOptimizer distance_matrix. `paths` is False, True (every pair)
+    or a list of (i, j) legs; `legs` maps each requested reachable (i, j) to its [[x, y], ...]
+    cells, the shape RouteOptimizer takes as a geometry cache. `parallel` None decides
+    from the amount of work; sources are split across the shared process pool.
+    """
+    start = time.time()
+    for point in points:
+        if not grid.in_bounds(point['x'], point['y']):
+            raise ValueError(f"Point ({point['x']}, {point['y']}) is outside the grid")
+    
+    k = len(points)
+    cells = [grid.cell_id(point['x'], point['y']) for point in points]
+    # Repeated points share one search.
+    sources = list(dict.fromkeys(cells))
+    
+    if paths is True:
+        paths = [(i, j) for i in range(k) for j in range(k) if i != j]
+    wanted = {}
+    for i, j in (paths or ()):
+        wanted.setdefault(cells[i], set()).add(cells[j])
+    
+    # Each search targets the distinct cells; results are expanded back to positions below.
+    position = {cell: p for p, cell in enumerate(sources)}
+    path_targets = [sorted(position[cell] for cell in wanted.get(source, ())) for source in sources] if paths else None
+    
+    workers = worker_count()
+    if parallel is None:
+        parallel = len(sources) * grid.size >= PARALLEL_MIN_CELLS
+    chunks = min(len(sources), workers * 2) if parallel and workers > 1 else 1
+    
+    if chunks <= 1:
+        rows = _rows(grid, sources, sources, path_targets, diagonal)
+    else:
+        bounds = np.linspace(0, len(sources), chunks + 1).astype(int)
+        with SharedArray(grid.values()) as shared_values:
+            executor = get_executor()
+            futures = [
+                executor.submit(_rows_worker, shared_values.descriptor, sources[lo:hi], sources,
+                                path_targets[lo:hi] if path_targets is not None else None, diagonal)
+                for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+            ]
+            rows = [row for chunk in _collect(futures) for row in chunk]
+    
+    distinct = np.array([row for row, _ in rows], dtype=np.float64).reshape(len(sources), len(sources))
+    distinct[distinct < 0] = np.inf
+    index = np.array([position[cell] for cell in cells], dtype=np.int64)
+    matrix = distinct[np.ix_(index, index)]
+    
+    legs = {}
+    for i, j in (paths or ()):
+        if i == j:
+            continue
+        row_paths = rows[position[cells[i]]][1]
+        path = row_paths.get(position[cells[j]])
+        if path is not None:
+            legs[(i, j)] = _xy(grid, path)
+    
+    stats = {
+        "searches": len(sources),
+        "workers": min(workers, chunks),
+        "elapsed_ms": round((time.time() - start) * 1000, 1)
+    }
+    return matrix, legs, stats
@@ -0,0 +1,139 @@
+import heapq
+from typing import List, Dict, Optional, Tuple
+
+from backend.algorithms.local_search import SearchBudget, Tour, two_opt, or_opt
+
+class _NearestStops:
+    """
+    neighbor_lists() for a route that changes between searches: each stop's k
+    closest routed stops, worked out the first time a search asks for them.
+    A local repair only looks at the few stops around an edit, so building the
+    full lists (O(N²)) for every edit would cost more than the repair itself.
+    """
+    
+    def __init__(self, D: List[List[float]], stops: List[int], k: int):
+        self.D = D
+        self.stops = stops
+        self.k = k
+        self.cache: Dict[int, List[int]] = {}
+    
+    def __getitem__(self, a: int) -> List[int]:
+        nearest = self.cache.get(a)
+        if nearest is None:
+            D = self.D
+            row = D[a]
+            nearest = heapq.nsmallest(self.k, (b for b in self.stops if b != a),
+                                      key=lambda b: min(row[b], D[b][a]))
+            self.cache[a] = nearest
+        return nearest
+
+
+class IncrementalRoute:
+    """
+    An open route that is edited one stop at a time. Stops live in slots of a
+    nested-list distance matrix that grows by one row and column per new stop
+    (removed stops free their slot for the next one), so an edit never rebuilds
+    the matrix. A new stop goes to its cheapest insertion position, then 2-opt
+    and Or-opt run only from the stops around the change. route[0] is the start.
+    """
+    
+    def __init__(self, locations: List[Dict], matrix, route: List[int], neighbor_count: int = 10):
+        self.D: List[List[float]] = [list(map(float, row)) for row in matrix]
+        self.locations: List[Optional[Dict]] = list(locations)
+        self.route = list(route)
+        routed = set(self.route)
+        self.free: List[int] = [slot for slot in range(len(self.locations)) if slot not in routed]
+        self.neighbor_count = neighbor_count
+    
+    def distance(self) -> float:
+        route, D = self.route, self.D
+        return sum(D[route[p]][route[p + 1]] for p in range(len(route) - 1))
+    
+    def legs(self) -> List[Tuple[int, int]]:
+        return list(zip(self.route[:-1], self.route[1:]))
+    
+    def _place(self, location: Dict, to_stop: Dict[int, float], from_stop: Dict[int, float]) -> int:
+        """Put a stop in a free slot (or a new one) and fill in its matrix row and column."""
+        if self.free:
+            k = self.free.pop()
+            self.locations[k] = location
+        else:
+            k = len(self.locations)
+            self.locations.append(location)
+            for row in self.D:
+                row.append(0.0)
+            self.D.append([0.0] * (k + 1))
+        row = self.D[k]
+        for j in self.route:
+            row[j] = from_stop[j]
+            self.D[j][k] = to_stop[j]
+        row[k] = 0.0
+        return k
+    
+    def _repair(self, active: List[int], budget: Optional[SearchBudget]) -> int:
+        """2-opt then Or-opt started only from `active` stops; returns the moves applied."""
+        if len(self.route) < 3:
+            return 0
+        tour = Tour(self.route, self.D, symmetric=False)
+        neighbors = _NearestStops(self.D, self.route, self.neighbor_count)
+        improvements = two_opt(tour, neighbors, budget=budget, active=active)
+        improvements += or_opt(tour, neighbors, budget=budget, active=active)
+        self.route = tour.route
+        return improvements
+    
+    def add_stop(self, location: Dict, to_stop: Dict[int, float], from_stop: Dict[int, float],
+                 budget: Optional[SearchBudget] = None) -> Dict:
+        """
+        Insert a stop given its distances from (`to_stop[slot]`) and to (`from_stop[slot]`)
+        every routed stop, then repair the route around it. Returns the new slot, where it
+        went and what the insertion cost before the repair.
+        """
+        k = self._place(location, to_stop, from_stop)
+        if not self.route:
+            self.route = [k]
+            return {"slot": k, "position": 0, "insertion_cost": 0.0, "improvements": 0}
+        
+        D, route = self.D, self.route
+        best_cost, best_after = float('inf'), 0
+        for p, u in enumerate(route):
+            cost = D[u][k]
+            if p + 1 < len(route):
+                v = route[p + 1]
+                cost += D[k][v] - D[u][v]
+            if cost < best_cost:
+                best_cost, best_after = cost, p
+        route.insert(best_after + 1, k)
+        
+        active = route[best_after:best_after + 3]
+        improvements = self._repair(active, budget)
+        return {
+            "slot": k,
+            "position": self.route.index(k),
+            "insertion_cost": best_cost,
+            "improvements": improvements
+        }
+    
+    def remove_stop(self, slot: int, budget: Optional[SearchBudget] = None) -> Dict:
+        """
+        Take a stop out, joining its neighbors, then repair the route around the gap.
+        The start (route[0]) stays fixed, like in a full optimization: removing it
+        raises ValueError.
+        """
+        route, D = self.route, self.D
+        p = route.index(slot)
+        if p == 0:
+            raise ValueError("The route's start stop cannot be removed")
+        saving = 0.0
+        if p > 0:
+            saving += D[route[p - 1]][slot]
+        if p + 1 < len(route):
+            saving += D[slot][route[p + 1]]
+            if p > 0:
+                saving -= D[route[p - 1]][route[p + 1]]
+        del route[p]
+        self.locations[slot] = None
+        self.free.append(slot)
+        
+        active = route[max(0, p - 1):p + 1]
+        improvements = self._repair(active, budget)
+        return {"slot": slot, "position": p, "saving": saving, "improvements": improvements}
@@ -0,0 +1,553 @@
+import math
+import random
+import sys
+import time
+from collections import deque
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Below this size the matrix is copied to nested lists: scalar reads from Python
+# lists are several times faster than from a NumPy array in the move loops.
+LIST_MATRIX_MAX_SIZE = 1000
+
+EPSILON = 1e-9
+
+# Seconds between best-so-far reports to a SearchBudget's on_progress callback.
+PROGRESS_INTERVAL = 0.5
+
+def matrix_rows(matrix: np.ndarray):
+    """Row-indexable view of the matrix that is fast for scalar D[a][b] reads."""
+    if isinstance(matrix, np.ndarray) and len(matrix) <= LIST_MATRIX_MAX_SIZE:
+        return matrix.tolist()
+    return matrix
+
+def neighbor_lists(matrix: np.ndarray, k: int = 10) -> List[List[int]]:
+    """The k closest other stops for every stop, nearest first."""
+    n = len(matrix)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    
+    # Use the cheaper direction of each pair so asymmetric matrices still get sensible candidates.
+    closeness = np.minimum(matrix, matrix.T)
+    closeness = closeness + np.diag(np.full(n, np.inf))
+    candidates = np.argpartition(closeness, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(closeness, candidates, axis=1).argsort(axis=1)
+    return np.take_along_axis(candidates, order, axis=1).tolist()
+
+
+class SearchBudget:
+    """
+    Wall-clock deadline and iteration counter shared by the solvers of one run.
+    Solvers call tick() once per unit of work and stop as soon as it returns True.
+    
+    With `on_progress`, solvers that track() their best route have it passed to
+    on_progress(budget, route) every PROGRESS_INTERVAL seconds while they run.
+    """
+    
+    # Annealing moves are cheap enough that reading the clock on each one would show up.
+    CHECK_EVERY = 64
+    # Ticks between looks at the clock for a progress report.
+    REPORT_EVERY = 256
+    
+    def __init__(self, time_limit_ms: Optional[float] = None,
+                 on_progress: Optional[Callable[['SearchBudget', List[int]], None]] = None):
+        self.started = time.perf_counter()
+        self.time_limit = time_limit_ms / 1000 if time_limit_ms else None
+        self.deadline = self.started + self.time_limit if self.time_limit else None
+        self.iterations = 0
+        self.timed_out = False
+        self.on_progress = on_progress
+        self.best_route: Optional[Callable[[], Sequence[int]]] = None
+        self.next_report = self.started + PROGRESS_INTERVAL
+    
+    def track(self, best_route: Callable[[], Sequence[int]]):
+        """Tell progress reports where the best route so far is (a callable returning it)."""
+        self.best_route = best_route
+    
+    def report(self):
+        """Send the tracked best route to on_progress now."""
+        if self.on_progress is not None and self.best_route is not None:
+            self.next_report = time.perf_counter() + PROGRESS_INTERVAL
+            self.on_progress(self, list(self.best_route()))
+    
+    def tick(self, stride: int = 1) -> bool:
+        """Count one iteration; the clock is read every `stride` iterations."""
+        self.iterations += 1
+        if self.on_progress is not None and self.iterations % self.REPORT_EVERY == 0:
+            if time.perf_counter() >= self.next_report:
+                self.report()
+        if self.deadline is None or self.timed_out:
+            return self.timed_out
+        if self.iterations % stride == 0 and time.perf_counter() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
+    
+    def expired(self) -> bool:
+        if self.deadline is not None and not self.timed_out and time.perf_counter() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
+    
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+    
+    def elapsed_fraction(self) -> float:
+        """Share of the time limit used so far (0 when there is no limit)."""
+        if self.time_limit is None:
+            return 0.0
+        return min(1.0, (time.perf_counter() - self.started) / self.time_limit)
+
+
+class Tour:
+    """
+    A route over matrix indices with its first stop fixed in place.
+    Open tours end at the last stop; closed tours return to the first one.
+    
+    Prefix sums of the forward and reversed edge costs make every 2-opt and
+    Or-opt delta O(1), including on asymmetric matrices where reversing a
+    segment changes the cost of the edges inside it.
+    """
+    
+    def __init__(self, route: Sequence[int], matrix, closed: bool = False, symmetric: Optional[bool] = None):
+        self.route = list(route)
+        self.n = len(self.route)
+        self.D = matrix_rows(matrix)
+        self.closed = closed
+        if symmetric is None:
+            symmetric = isinstance(matrix, np.ndarray) and bool(np.allclose(matrix, matrix.T))
+        self.symmetric = symmetric
+        self.pos = {}
+        self.fwd = [0.0] * self.n
+        self.rev = [0.0] * self.n
+        self._reindex(0, self.n - 1)
+    
+    def _reindex(self, start: int, end: int):
+        """Refresh positions in [start, end] and the prefix sums from `start` onward."""
+        route, D = self.route, self.D
+        for p in range(start, end + 1):
+            self.pos[route[p]] = p
+        if self.symmetric:
+            return
+        fwd, rev = self.fwd, self.rev
+        for p in range(max(start, 1), self.n):
+            a, b = route[p - 1], route[p]
+            fwd[p] = fwd[p - 1] + D[a][b]
+            rev[p] = rev[p - 1] + D[b][a]
+    
+    def succ(self, p: int) -> Optional[int]:
+        """Stop after position p, or None past the end of an open tour."""
+        if p + 1 < self.n:
+            return self.route[p + 1]
+        return self.route[0] if self.closed else None
+    
+    def length(self) -> float:
+        route, D = self.route, self.D
+        total = sum(D[route[p]][route[p + 1]] for p in range(self.n - 1))
+        if self.closed and self.n > 1:
+            total += D[route[-1]][route[0]]
+        return total
+    
+    def _reversal_delta(self, i: int, j: int) -> float:
+        """Change in the internal cost of positions i..j when that segment is reversed."""
+        if self.symmetric:
+            return 0.0
+        return (self.rev[j] - self.rev[i]) - (self.fwd[j] - self.fwd[i])
+    
+    def two_opt_delta(self, i: int, j: int) -> float:
+        """Cost change of reversing positions i+1..j (0 <= i, i+1 < j < n)."""
+        D, route = self.D, self.route
+        a, b, c = route[i], route[i + 1], route[j]
+        d = self.succ(j)
+        delta = D[a][c] - D[a][b] + self._reversal_delta(i + 1, j)
+        if d is not None:
+            delta += D[b][d] - D[c][d]
+        return delta
+    
+    def apply_two_opt(self, i: int, j: int):
+        self.route[i + 1:j + 1] = self.route[i + 1:j + 1][::-1]
+        self._reindex(i + 1, j)
+    
+    def or_opt_delta(self, s: int, e: int, t: int, reverse: bool) -> float:
+        """
+        Cost change of moving positions s..e (1 <= s <= e) to sit between position t
+        and its successor, optionally reversed. t must lie outside s-1..e.
+        """
+        D, route = self.D, self.route
+        p, first, last = route[s - 1], route[s], route[e]
+        nx = self.succ(e)
+        u = route[t]
+        v = self.succ(t)
+        
+        delta = -D[p][first]
+        if nx is not None:
+            delta += D[p][nx] - D[last][nx]
+        if v is not None:
+            delta -= D[u][v]
+        
+        if reverse:
+            delta += D[u][last] + self._reversal_delta(s, e)
+            if v is not None:
+                delta += D[first][v]
+        else:
+            delta += D[u][first]
+            if v is not None:
+                delta += D[last][v]
+        return delta
+    
+    def allows_or_opt(self, s: int, e: int, t: int, reverse: bool) -> bool:
+        """Whether an Or-opt move keeps the tour feasible; subclasses with side constraints override this."""
+        return True
+    
+    def apply_or_opt(self, s: int, e: int, t: int, reverse: bool):
+        segment = self.route[s:e + 1]
+        if reverse:
+            segment.reverse()
+        del self.route[s:e + 1]
+        insert_at = t + 1 if t < s else t + 1 - len(segment)
+        self.route[insert_at:insert_at] = segment
+        self._reindex(min(s, insert_at), max(e, t))
+
+
+def two_opt(tour: Tour, neighbors: List[List[int]], budget: Optional[SearchBudget] = None,
+            active: Optional[Iterable[int]] = None) -> int:
+    """
+    2-opt local search driven by neighbor lists and don't-look bits.
+    Only `active` stops (default: all) start with their don't-look bit cleared.
+    Returns the number of improving moves applied.
+    """
+    n = tour.n
+    if n < 3:
+        return 0
+    
+    queue = deque(tour.route if active is None else active)
+    queued = set(queue)
+    improvements = 0
+    
+    while queue:
+        if budget is not None and budget.tick():
+            break
+        a = queue.popleft()
+        queued.discard(a)
+        pos = tour.pos
+        p = pos[a]
+        
+        best_delta, best_move = -EPSILON, None
+        for c in neighbors[a]:
+            q = pos[c]
+            # Each candidate move adds an edge between a and its neighbor c.
+            for i, j in ((p, q), (q, p), (p - 1, q - 1), (q - 1, p - 1)):
+                if i >= 0 and j > i + 1 and j < n:
+                    delta = tour.two_opt_delta(i, j)
+                    if delta < best_delta:
+                        best_delta, best_move = delta, (i, j)
+        
+        if best_move is None:
+            continue
+        
+        i, j = best_move
+        touched = (tour.route[i], tour.route[i + 1], tour.route[j], tour.succ(j))
+        tour.apply_two_opt(i, j)
+        improvements += 1
+        for node in touched:
+            if node is not None and node not in queued:
+                queue.append(node)
+                queued.add(node)
+    
+    return improvements
+
+def or_opt(tour: Tour, neighbors: List[List[int]], max_segment: int = 3,
+           budget: Optional[SearchBudget] = None, active: Optional[Iterable[int]] = None) -> int:
+    """
+    Or-opt local search: move segments of 1..max_segment stops, possibly reversed,
+    next to one of their neighbors. Returns the number of improving moves applied.
+    """
+    n = tour.n
+    if n < 3:
+        return 0
+    
+    queue = deque(node for node in (tour.route if active is None else active) if node != tour.route[0])
+    queued = set(queue)
+    improvements = 0
+    
+    while queue:
+        if budget is not None and budget.tick():
+            break
+        a = queue.popleft()
+        queued.discard(a)
+        pos = tour.pos
+        
+        best_delta, best_move = -EPSILON, None
+        for length in range(1, max_segment + 1):
+            # Segments that start or end at a.
+            for s in {pos[a], pos[a] - length + 1}:
+                e = s + length - 1
+                if s < 1 or e >= n:
+                    continue
+                first, last = tour.route[s], tour.route[e]
+                targets = set()
+                for c in neighbors[first]:
+                    targets.add((pos[c], False))
+                    targets.add((pos[c] - 1, True))
+                for c in neighbors[last]:
+                    targets.add((pos[c] - 1, False))
+                    targets.add((pos[c], True))
+                
+                for t, reverse in targets:
+                    if t < 0 or s - 1 <= t <= e or (reverse and length == 1):
+                        continue
+                    delta = tour.or_opt_delta(s, e, t, reverse)
+                    if delta < best_delta and tour.allows_or_opt(s, e, t, reverse):
+                        best_delta, best_move = delta, (s, e, t, reverse)
+        
+        if best_move is None:
+            continue
+        
+        s, e, t, reverse = best_move
+        route = tour.route
+        touched = {route[s - 1], route[s], route[e], route[t], tour.succ(e), tour.succ(t)}
+        tour.apply_or_opt(s, e, t, reverse)
+        improvements += 1
+        for node in touched:
+            if node is not None and node != route[0] and node not in queued:
+                queue.append(node)
+                queued.add(node)
+    
+    return improvements
+
+def local_search(tour: Tour, neighbors: List[List[int]], budget: Optional[SearchBudget] = None) -> int:
+    """Alternate 2-opt and Or-opt until neither improves the tour or the budget runs out."""
+    improvements = 0
+    while budget is None or not budget.expired():
+        found = two_opt(tour, neighbors, budget=budget) + or_opt(tour, neighbors, budget=budget)
+        improvements += found
+        if not found:
+            break
+    return improvements
+
+def double_bridge(tour: Tour, rng: random.Random) -> List[int]:
+    """
+    Kick the tour by swapping two random consecutive segments after the fixed start
+    (A B C D -> A C B D), a change 2-opt and Or-opt can't undo in one move.
+    Returns the stops next to the cut points.
+    """
+    n = tour.n
+    a, b, c = sorted(rng.sample(range(1, n), 3))
+    route = tour.route
+    tour.route = route[:a] + route[b:c] + route[a:b] + route[c:]
+    tour._reindex(a, c - 1)
+    return [route[p] for p in (a - 1, a, b - 1, b, c - 1, min(c, n - 1))]
+
+def iterated_local_search(tour: Tour, neighbors: List[List[int]], rng: random.Random,
+                          kicks: Optional[int] = 100, budget: Optional[SearchBudget] = None) -> Tour:
+    """
+    Local search, then repeated double-bridge kicks each followed by 2-opt/Or-opt
+    around the cut points, keeping a kicked tour only when it is shorter.
+    With kicks=None it keeps kicking until the budget's deadline.
+    """
+    local_search(tour, neighbors, budget=budget)
+    if tour.n < 5:
+        return tour
+    if kicks is None and (budget is None or budget.deadline is None):
+        kicks = 100
+    
+    best_route, best_length = list(tour.route), tour.length()
+    kick = 0
+    while kicks is None or kick < kicks:
+        if budget is not None and budget.expired():
+            break
+        kick += 1
+        touched = double_bridge(tour, rng)
+        two_opt(tour, neighbors, budget=budget, active=touched)
+        or_opt(tour, neighbors, budget=budget, active=touched)
+        length = tour.length()
+        if length < best_length - EPSILON:
+            best_route, best_length = list(tour.route), length
+        else:
+            tour.route = list(best_route)
+            tour._reindex(0, tour.n - 1)
+    
+    return tour
+
+def improve_route(matrix: np.ndarray, route: Sequence[int], closed: bool = False, neighbor_count: int = 10,
+                  budget: Optional[SearchBudget] = None, symmetric: Optional[bool] = None) -> List[int]:
+    """
+    2-opt/Or-opt over the stops of one route of a larger matrix, searching the
+    route's own submatrix. route[0] stays first; returns the improved stop order.
+    """
+    if len(route) < 3:
+        return list(route)
+    index = np.asarray(route)
+    sub = np.asarray(matrix)[np.ix_(index, index)]
+    tour = Tour(range(len(route)), sub, closed=closed, symmetric=symmetric)
+    local_search(tour, neighbor_lists(sub, neighbor_count), budget=budget)
+    return [route[p] for p in tour.route]
+
+
+def cheapest_insertion(matrix: np.ndarray, start: int = 0, closed: bool = False,
+                       budget: Optional[SearchBudget] = None) -> List[int]:
+    """
+    Greedy (cheapest) insertion: repeatedly insert the stop whose cheapest insertion
+    position costs least. Each stop's best position is cached and only refreshed for
+    the two edges a step creates, plus a full rescan for stops whose cached edge was split.
+    If the budget runs out, the remaining stops go straight to their cached positions.
+    """
+    n = len(matrix)
+    if n <= 2:
+        return [start] + [k for k in range(n) if k != start]
+    
+    END = -1
+    succ = np.full(n, start if closed else END)
+    in_route = np.zeros(n, dtype=bool)
+    in_route[start] = True
+    
+    def insertion_costs(u: int, v: int, nodes: np.ndarray) -> np.ndarray:
+        costs = matrix[u, nodes].copy()
+        if v != END:
+            costs += matrix[nodes, v] - matrix[u, v]
+        return costs
+    
+    all_nodes = np.arange(n)
+    best_cost = insertion_costs(start, succ[start], all_nodes)
+    best_cost[start] = np.inf
+    best_after = np.full(n, start)
+    
+    for _ in range(n - 1):
+        if budget is not None and budget.tick():
+            for k in np.flatnonzero(~in_route)[np.argsort(best_cost[~in_route])]:
+                u = int(best_after[k])
+                succ[k] = succ[u]
+                succ[u] = k
+            break
+        
+        k = int(np.argmin(best_cost))
+        u = int(best_after[k])
+        v = int(succ[u])
+        succ[k] = v
+        succ[u] = k
+        in_route[k] = True
+        best_cost[k] = np.inf
+        
+        outside = np.flatnonzero(~in_route)
+        if len(outside) == 0:
+            break
+        
+        stale = outside[best_after[outside] == u]
+        fresh = outside[best_after[outside] != u]
+        
+        for after, before in ((u, k), (k, v)):
+            costs = insertion_costs(after, before, fresh)
+            better = costs < best_cost[fresh]
+            best_cost[fresh[better]] = costs[better]
+            best_after[fresh[better]] = after
+        
+        if len(stale):
+            froms = np.flatnonzero(in_route)
+            tos = succ[froms]
+            costs = matrix[np.ix_(froms, stale)].copy()
+            open_end = tos == END
+            linked = ~open_end
+            costs[linked] += matrix[np.ix_(stale, tos[linked])].T - matrix[froms[linked], tos[linked]][:, None]
+            best = costs.argmin(axis=0)
+            best_cost[stale] = costs[best, np.arange(len(stale))]
+            best_after[stale] = froms[best]
+    
+    route = [start]
+    node = int(succ[start])
+    while node != END and node != start:
+        route.append(node)
+        node = int(succ[node])
+    return route
+
+
+def simulated_annealing(tour: Tour, neighbors: List[List[int]], iterations: Optional[int] = None,
+                        initial_temperature: Optional[float] = None, cooling_rate: Optional[float] = None,
+                        cooling_schedule: str = "geometric", seed: Optional[int] = None,
+                        budget: Optional[SearchBudget] = None) -> Tour:
+    """
+    Simulated annealing over neighbor-guided 2-opt and single-stop relocate moves.
+    Cooling schedules: "geometric" (T *= cooling_rate), "linear" (T falls to 0 over
+    the run) and "lundy_mees" (T /= 1 + beta * T, with beta = 1 - cooling_rate).
+    
+    Without `iterations` the run is 200 moves per stop, cooling to ~1% of the start
+    temperature. With a time-limited budget and no `iterations`, it runs until the
+    deadline and cools by the share of the time limit used instead.
+    Returns the best tour seen.
+    """
+    n = tour.n
+    best = Tour(tour.route, tour.D, tour.closed, tour.symmetric)
+    if n < 4:
+        return best
+    
+    rng = random.Random(seed)
+    movable = tour.route[1:]
+    if budget is not None:
+        budget.track(lambda: best.route)
+    
+    if initial_temperature is None:
+        # Start hot enough to accept a typical uphill neighbor move about half the time.
+        samples = []
+        for _ in range(min(200, 10 * n)):
+            a = rng.choice(movable)
+            c = rng.choice(neighbors[a])
+            p, q = sorted((tour.pos[a], tour.pos[c]))
+            if q > p + 1:
+                samples.append(abs(tour.two_opt_delta(p, q)))
+        initial_temperature = (sum(samples) / len(samples)) / math.log(2) if samples else 1.0
+    
+    time_driven = iterations is None and budget is not None and budget.deadline is not None
+    if iterations is None:
+        iterations = sys.maxsize if time_driven else max(20000, 200 * n)
+    if cooling_rate is None:
+        cooling_rate = 0.01 ** (1 / min(iterations, 10 ** 7))
+    
+    temperature = initial_temperature
+    current = tour.length()
+    best_length = current
+    beta = 1.0 - cooling_rate
+    
+    for step in range(iterations):
+        if budget is not None and budget.tick(SearchBudget.CHECK_EVERY):
+            break
+        
+        if time_driven and cooling_schedule != "lundy_mees":
+            if step % SearchBudget.CHECK_EVERY == 0:
+                progress = budget.elapsed_fraction()
+                if cooling_schedule == "linear":
+                    temperature = initial_temperature * (1 - progress)
+                else:
+                    temperature = initial_temperature * 0.01 ** progress
+        elif cooling_schedule == "linear":
+            temperature = initial_temperature * (1 - step / iterations)
+        elif cooling_schedule == "lundy_mees":
+            temperature = temperature / (1 + beta * temperature)
+        else:
+            temperature *= cooling_rate
+        
+        a = rng.choice(movable)
+        c = rng.choice(neighbors[a])
+        pos = tour.pos
+        p, q = pos[a], pos[c]
+        
+        if rng.random() < 0.5:
+            i, j = (p, q) if p < q else (q, p)
+            if j <= i + 1:
+                continue
+            delta = tour.two_opt_delta(i, j)
+            move = (tour.apply_two_opt, (i, j))
+        else:
+            # Relocate a to sit right after c.
+            if q == p - 1 or q == p:
+                continue
+            delta = tour.or_opt_delta(p, p, q, False)
+            move = (tour.apply_or_opt, (p, p, q, False))
+        
+        if delta < 0 or (temperature > 0 and rng.random() < math.exp(-delta / temperature)):
+            move[0](*move[1])
+            current += delta
+            if current < best_length - EPSILON:
+                best_length = current
+                best.route = list(tour.route)
+    
+    best._reindex(0, n - 1)
+    return best
@@ -0,0 +1,285 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.algorithms.local_search import (
+    SearchBudget, Tour, local_search, iterated_local_search, simulated_annealing, improve_route
+)
+
+ANNEALING_OPTIONS = ('iterations', 'initial_temperature', 'cooling_rate', 'cooling_schedule')
+
+# Below this many stops in total, per-route improvement is cheaper in-process than the IPC round trip.
+PARALLEL_MIN_STOPS = 200
+
+class SharedArray:
+    """
+    A NumPy array copied once into a named shared memory block. Worker processes
+    attach to it by `descriptor` instead of receiving a pickled copy with every task.
+    The creating process owns the block and must close() it when done.
+    """
+    
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)
+        self.array[...] = array
+        self.descriptor = (self.shm.name, array.shape, array.dtype.str)
+    
+    def close(self):
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side: blocks attached by this process, by name. A worker keeps the blocks of
+# the run it is serving and drops the others once a task from a newer run arrives.
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+def attach(descriptor: Tuple, keep: Tuple[str, ...] = ()) -> np.ndarray:
+    """Read-only view of a SharedArray from another process."""
+    name, shape, dtype = descriptor
+    if name not in _attached:
+        for stale in [key for key in _attached if key != name and key not in keep]:
+            _attached.pop(stale)[0].close()
+        shm = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        _attached[name] = (shm, array)
+    return _attached[name][1]
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_warm_up_thread: Optional[threading.Thread] = None
+# Set once every worker of the current pool is up and has answered a ping.
+_pool_ready = threading.Event()
+# Cold start (forkserver plus workers) assumed until one has been measured, and the
+# time spent shipping tasks and merging results around the workers' own runs.
+POOL_STARTUP_MS = float(os.environ.get('POOL_STARTUP_MS', '1000'))
+_measured = {"startup_ms": POOL_STARTUP_MS, "overhead_ms": 10.0}
+
+def worker_count() -> int:
+    """Size of the restart pool: OPTIMIZER_WORKERS, or one worker per CPU."""
+    return max(1, int(os.environ.get('OPTIMIZER_WORKERS') or os.cpu_count() or 1))
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the process-wide restart pool, starting it (and warming its workers up) on first use."""
+    global _executor, _warm_up_thread
+    with _executor_lock:
+        if _executor is None:
+            # Forking a threaded Flask server is unsafe, so workers come from a clean process.
+            # The fork server loads only this module (and NumPy with it), so each worker
+            # starts from a copy of it instead of importing everything again.
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _executor = ProcessPoolExecutor(max_workers=worker_count(), mp_context=context)
+            _warm_up_thread = threading.Thread(target=_warm_up, args=(_executor,), daemon=True, name='pool-warm-up')
+            _warm_up_thread.start()
+        return _executor
+
+def _ping() -> int:
+    return os.getpid()
+
+def _warm_up(executor: ProcessPoolExecutor):
+    """Start every worker now, and time it, instead of leaving that to the first tasks."""
+    started = time.time()
+    try:
+        # Tasks submitted before any worker is idle each start a worker of their own.
+        for future in [executor.submit(_ping) for _ in range(worker_count())]:
+            future.result()
+    except Exception:
+        return
+    with _executor_lock:
+        if executor is _executor:
+            _measured["startup_ms"] = (time.time() - started) * 1000
+            _pool_ready.set()
+
+def start_executor(wait: bool = False):
+    """Start the pool ahead of the first request that needs it; with `wait`, block until its workers are up."""
+    get_executor()
+    if wait:
+        _warm_up_thread.join()
+
+def pool_ready() -> bool:
+    return _pool_ready.is_set()
+
+def use_pool(time_limit_ms: Optional[float]) -> bool:
+    """
+    Whether a run with this time limit should go to the pool. A cold pool is started
+    in the background, but a run whose limit isn't at least twice the expected
+    startup stays in-process rather than spend most of it waiting for workers.
+    """
+    if worker_count() < 2:
+        return False
+    if pool_ready():
+        return True
+    start_executor()
+    return not time_limit_ms or time_limit_ms > 2 * _measured["startup_ms"]
+
+def reset_executor():
+    """Shut the pool down (e.g. after a worker crashed); the next run starts a new one."""
+    global _executor
+    with _executor_lock:
+        _pool_ready.clear()
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def _collect(futures: List) -> List:
+    """Results in submission order; a crashed worker takes the pool down with it."""
+    try:
+        return [future.result() for future in futures]
+    except Exception:
+        reset_executor()
+        raise
+
+def _worker_deadline(started: float, time_limit_ms: Optional[float]) -> Optional[float]:
+    """
+    Absolute deadline for work in the pool: the caller's limit counted from `started`,
+    less the dispatch and merge overhead measured on earlier runs and a 5% margin.
+    """
+    if not time_limit_ms:
+        return None
+    reserve_ms = time_limit_ms * 0.05 + min(_measured["overhead_ms"], time_limit_ms * 0.25)
+    return started + (time_limit_ms - reserve_ms) / 1000
+
+def _record_overhead(started: float, results: List[Dict]):
+    """Time not spent inside any worker: task dispatch before the first one started and merging after the last."""
+    first = min(result.pop("started_at") for result in results)
+    last = max(result.pop("finished_at") for result in results)
+    _measured["overhead_ms"] = max(0.0, (time.time() - started) - (last - first)) * 1000
+
+
+def _restart_worker(matrix: Tuple, neighbors: Tuple, route: List[int], symmetric: bool, algorithm: str,
+                    seed: int, deadline: Optional[float], options: Dict) -> Dict:
+    """One seeded search in a worker process, on the shared matrix and neighbor lists."""
+    started_at = time.time()
+    D = attach(matrix, keep=(neighbors[0],))
+    neighbor_rows = attach(neighbors, keep=(matrix[0],)).tolist()
+    result = _restart(D, neighbor_rows, route, symmetric, algorithm, seed, deadline, options)
+    result.update(started_at=started_at, finished_at=time.time())
+    return result
+
+def _restart(D, neighbor_rows: List[List[int]], route: List[int], symmetric: bool, algorithm: str,
+             seed: int, deadline: Optional[float], options: Dict) -> Dict:
+    """One seeded search from `route`. `deadline` is an absolute time.time() value."""
+    time_limit_ms = max(1.0, (deadline - time.time()) * 1000) if deadline is not None else None
+    budget = SearchBudget(time_limit_ms)
+    tour = Tour(route, D, symmetric=symmetric)
+    
+    if algorithm == 'simulated_annealing':
+        annealing = {key: options[key] for key in ANNEALING_OPTIONS if options.get(key) is not None}
+        if time_limit_ms and 'iterations' not in annealing:
+            anneal_budget = SearchBudget(max(1.0, time_limit_ms * 0.9 - budget.elapsed_ms()))
+            tour = simulated_annealing(tour, neighbor_rows, seed=seed, budget=anneal_budget, **annealing)
+            budget.iterations += anneal_budget.iterations
+            budget.timed_out = anneal_budget.timed_out
+        else:
+            tour = simulated_annealing(tour, neighbor_rows, seed=seed, budget=budget, **annealing)
+        local_search(tour, neighbor_rows, budget=budget)
+    else:
+        kicks = options.get('kicks')
+        if kicks is None:
+            kicks = None if deadline is not None else 100
+        iterated_local_search(tour, neighbor_rows, random.Random(seed), kicks=kicks, budget=budget)
+    
+    return {
+        "route": tour.route,
+        "distance": tour.length(),
+        "iterations": budget.iterations,
+        "timed_out": budget.timed_out or budget.expired(),
+        "pid": os.getpid()
+    }
+
+
+def parallel_restarts(matrix: np.ndarray, neighbors: List[List[int]], route: List[int], algorithm: str,
+                      restarts: int, seed: Optional[int] = None, time_limit_ms: Optional[float] = None,
+                      symmetric: Optional[bool] = None, options: Optional[Dict] = None) -> List[Dict]:
+    """
+    Run `restarts` independently seeded searches from `route` on the process pool and
+    return their results, best first. The matrix and neighbor lists are placed in shared
+    memory once per call; each task only carries the seed route and its options.
+    
+    `time_limit_ms` covers the whole call, pool startup and merging included. When the
+    pool is cold and the limit can't absorb starting it, the restarts run one after
+    another in this process instead, each with an equal share of the limit.
+    """
+    started = time.time()
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    if symmetric is None:
+        symmetric = bool(np.allclose(matrix, matrix.T))
+    options = options or {}
+    
+    if not use_pool(time_limit_ms):
+        share = time_limit_ms * 0.95 / 1000 / restarts if time_limit_ms else None
+        results = [_restart(matrix, neighbors, route, symmetric, algorithm, seed + k,
+                            started + (k + 1) * share if share else None, options)
+                   for k in range(restarts)]
+    else:
+        deadline = _worker_deadline(started, time_limit_ms)
+        with SharedArray(matrix) as shared_matrix, SharedArray(np.asarray(neighbors, dtype=np.int32)) as shared_neighbors:
+            executor = get_executor()
+            futures = [
+                executor.submit(_restart_worker, shared_matrix.descriptor, shared_neighbors.descriptor, route,
+                                symmetric, algorithm, seed + k, deadline, options)
+                for k in range(restarts)
+            ]
+            results = _collect(futures)
+        _record_overhead(started, results)
+    
+    for k, result in enumerate(results):
+        result["seed"] = seed + k
+    return sorted(results, key=lambda result: result["distance"])
+
+
+def _improve_route_worker(matrix: Tuple, route: List[int], closed: bool, symmetric: bool,
+                          deadline: Optional[float]) -> List[int]:
+    D = attach(matrix)
+    time_limit_ms = max(1.0, (deadline - time.time()) * 1000) if deadline is not None else None
+    return improve_route(D, route, closed=closed, budget=SearchBudget(time_limit_ms), symmetric=symmetric)
+
+def parallel_improve_routes(matrix: np.ndarray, routes: List[List[int]], closed: bool = False,
+                            time_limit_ms: Optional[float] = None, symmetric: Optional[bool] = None) -> List[List[int]]:
+    """
+    Improve each route with 2-opt/Or-opt, one route per task on the process pool,
+    all reading the same shared distance matrix. Small fleets, and limits too short to
+    start a cold pool in, run in-process.
+    """
+    started = time.time()
+    if symmetric is None:
+        symmetric = bool(np.allclose(matrix, matrix.T))
+    
+    if len(routes) < 2 or sum(len(route) for route in routes) < PARALLEL_MIN_STOPS or not use_pool(time_limit_ms):
+        budget = SearchBudget(time_limit_ms)
+        return [improve_route(matrix, route, closed=closed, budget=budget, symmetric=symmetric) for route in routes]
+    
+    deadline = _worker_deadline(started, time_limit_ms)
+    with SharedArray(matrix) as shared_matrix:
+        executor = get_executor()
+        # Longest routes first so they don't end up queued behind the short ones.
+        order = sorted(range(len(routes)), key=lambda r: -len(routes[r]))
+        futures = [executor.submit(_improve_route_worker, shared_matrix.descriptor, routes[r], closed,
+                                   symmetric, deadline) for r in order]
+        improved = _collect(futures)
+    
+    result = [None] * len(routes)
+    for r, route in zip(order, improved):
+        result[r] = route
+    return result
@@ -1,257 +1,622 @@
+import base64
 import heapq
-from typing import List, Tuple, Dict, Optional
+import threading
+from array import array
+from typing import Iterator, List, Dict, Optional, Tuple
 
-class Node:
-    def __init__(self, x: int, y: int, g: float = float('inf'), h: float = 0, parent: Optional['Node'] = None):
-        self.x = x
-        self.y = y
-        self.g = g
-        self.h = h
-        self.f = g + h
-        self.parent = parent
-    
-    def __lt__(self, other):
-        if hasattr(self, 'f') and hasattr(other, 'f'):
-            return self.f < other.f
-        return self.g < other.g
-    
-    def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
-    
-    def __hash__(self):
-        return hash((self.x, self.y))
+import numpy as np
 
-class AStarPathfinder:
-    def __init__(self, grid: List[List[int]], start: Dict[str, int], end: Dict[str, int]):
-        self.grid = grid
-        self.rows = len(grid)
-        self.cols = len(grid[0]) if self.rows > 0 else 0
+WALL = 1
+# g-score of a cell no path has reached yet.
+UNREACHED = 1 << 62
+# Cell values above 1 are traversal costs; they are stored one byte per cell.
+MAX_CELL_COST = 255
+# With diagonal moves, step costs are scaled so the diagonal/straight ratio
+# (99/70 = 1.4143) is close to sqrt(2) while priorities stay integers.
+STRAIGHT_STEP = 70
+DIAGONAL_STEP = 99
+
+# How `explored` is returned: a list of {"x", "y"} dicts, base64 of little-endian
+# uint32 cell indices (y * cols + x), or left out of the response.
+EXPLORED_FORMATS = ('cells', 'packed', 'none')
+
+class Grid:
+    """
+    A grid prepared for searching: flat byte arrays of walls and entry costs framed
+    by a one-cell wall border, so cells are integer ids and a cell's neighbors are
+    id +/- 1 and id +/- width with no bounds checks. Build it once to run many
+    searches on one map.
+    
+    Cell values: 0 is open ground (cost 1 to enter), 1 is a wall, and 2..255 are
+    open cells that cost that much to enter (slow zones, congested aisles).
+    """
+    
+    def __init__(self, cells):
+        """`cells` is a list of rows of cell values, or a 2-D array (boolean for walls only)."""
+        values = np.asarray(cells)
+        if values.ndim != 2:
+            values = values.reshape(0, 0)
+        if values.dtype == bool:
+            blocked = values
+            costs = np.ones(values.shape, dtype=np.uint8)
+        else:
+            if not np.issubdtype(values.dtype, np.number) or (values.size and not np.all(np.mod(values, 1) == 0)):
+                raise ValueError("Cell values must be integers")
+            if values.size and (values.min() < 0 or values.max() > MAX_CELL_COST):
+                raise ValueError(f"Cell values must be between 0 and {MAX_CELL_COST}")
+            blocked = values == WALL
+            costs = np.where(values == 0, 1, values).astype(np.uint8)
+        self.rows, self.cols = blocked.shape
+        self.width = self.cols + 2
+        
+        padded = np.ones((self.rows + 2, self.width), dtype=bool)
+        padded[1:-1, 1:-1] = blocked
+        self.blocked = padded
+        self.walls = padded.tobytes()
+        self.size = len(self.walls)
+        
+        entry = np.zeros(padded.shape, dtype=np.uint8)
+        entry[1:-1, 1:-1] = np.where(blocked, 0, costs)
+        self.costs = entry.tobytes()
+        open_costs = costs[~blocked]
+        self.min_cost = int(open_costs.min()) if open_costs.size else 1
+        self.max_cost = int(open_costs.max()) if open_costs.size else 1
+        # Every open cell costs 1: plain BFS distances, and the only case JPS and HPA* handle.
+        self.uniform = self.max_cost == 1
+        
+        # Initial g-scores: walls are -1, so a single "shorter than known" comparison also rejects them.
+        self.initial_g = np.where(padded, -1, UNREACHED).astype(np.int64).tobytes()
+    
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.cols and 0 <= y < self.rows
+    
+    def cell_id(self, x: int, y: int) -> int:
+        return (y + 1) * self.width + x + 1
+    
+    def cell_xy(self, cell: int) -> Tuple[int, int]:
+        y, x = divmod(cell, self.width)
+        return x - 1, y - 1
+    
+    def values(self) -> np.ndarray:
+        """Cell values (rows x cols, uint8) in the input convention; Grid(values) rebuilds this grid."""
+        entry = np.frombuffer(self.costs, dtype=np.uint8).reshape(self.blocked.shape)[1:-1, 1:-1]
+        return np.where(self.blocked[1:-1, 1:-1], WALL, np.where(entry == 1, 0, entry)).astype(np.uint8)
+    
+    @classmethod
+    def from_bitset(cls, rows: int, cols: int, data: str) -> 'Grid':
+        """Decode base64 of one bit per cell, row-major, most significant bit first (1 = wall)."""
+        packed = np.frombuffer(base64.b64decode(data, validate=True), dtype=np.uint8)
+        if packed.size * 8 < rows * cols:
+            raise ValueError(f"Bitset holds {packed.size * 8} cells, expected {rows * cols}")
+        return cls(np.unpackbits(packed, count=rows * cols).reshape(rows, cols).astype(bool))
+    
+    @classmethod
+    def from_runs(cls, rows: int, cols: int, runs: List[int]) -> 'Grid':
+        """Decode run lengths of alternating open and wall cells, row-major, starting with open."""
+        runs = np.asarray(runs, dtype=np.int64)
+        if runs.ndim != 1 or (runs < 0).any() or runs.sum() != rows * cols:
+            raise ValueError(f"Run lengths must be non-negative and add up to {rows * cols}")
+        values = np.arange(len(runs)) % 2 == 1
+        return cls(np.repeat(values, runs).reshape(rows, cols))
+    
+    @classmethod
+    def from_bytes(cls, rows: int, cols: int, data: str) -> 'Grid':
+        """Decode base64 of one byte per cell, row-major, holding the cell values (costs)."""
+        values = np.frombuffer(base64.b64decode(data, validate=True), dtype=np.uint8)
+        if values.size != rows * cols:
+            raise ValueError(f"Data holds {values.size} cells, expected {rows * cols}")
+        return cls(values.reshape(rows, cols))
+    
+    def points(self, cells: List[int]) -> List[Dict[str, int]]:
+        """Cell ids as {"x", "y"} dicts."""
+        ys, xs = np.divmod(np.asarray(cells, dtype=np.int64), self.width)
+        return [{"x": x, "y": y} for x, y in zip((xs - 1).tolist(), (ys - 1).tolist())]
+    
+    def indices(self, cells: List[int]) -> np.ndarray:
+        """Cell ids as unpadded row-major indices y * cols + x."""
+        ys, xs = np.divmod(np.asarray(cells, dtype=np.int64), self.width)
+        return (ys - 1) * self.cols + (xs - 1)
+    
+    def encode_explored(self, cells: List[int], fmt: str = 'cells'):
+        if fmt == 'packed':
+            return base64.b64encode(self.indices(cells).astype('<u4').tobytes()).decode('ascii')
+        return self.points(cells)
+    
+    def path_cost(self, path: List[int]):
+        """Cost of walking a path of cell ids, counting a straight step onto open ground as 1."""
+        costs, width = self.costs, self.width
+        straight = diagonal = 0
+        for a, b in zip(path, path[1:]):
+            if abs(b - a) in (1, width):
+                straight += costs[b]
+            else:
+                diagonal += costs[b]
+        if not diagonal:
+            return straight
+        return round(straight + diagonal * DIAGONAL_STEP / STRAIGHT_STEP, 3)
+
+
+def decode_grid(payload) -> Grid:
+    """
+    Build a Grid from a request: a list of rows of cell values, or a compact
+    {"rows", "cols", "encoding": "bitset" | "rle" | "bytes", "data"} object.
+    """
+    if isinstance(payload, Grid):
+        return payload
+    if isinstance(payload, list):
+        if not payload or not all(isinstance(row, list) for row in payload):
+            raise ValueError("Grid must be a non-empty list of rows")
+        if len({len(row) for row in payload}) != 1:
+            raise ValueError("Grid rows must all have the same length")
+        return Grid(payload)
+    if not isinstance(payload, dict):
+        raise ValueError("Grid must be a list of rows or an encoded grid object")
+    
+    rows, cols = payload.get('rows'), payload.get('cols')
+    if not all(isinstance(n, int) and not isinstance(n, bool) and n > 0 for n in (rows, cols)):
+        raise ValueError("Encoded grids need positive integer rows and cols")
+    encoding, data = payload.get('encoding'), payload.get('data')
+    if encoding == 'bitset' and isinstance(data, str):
+        return Grid.from_bitset(rows, cols, data)
+    if encoding == 'rle' and isinstance(data, list):
+        return Grid.from_runs(rows, cols, data)
+    if encoding == 'bytes' and isinstance(data, str):
+        return Grid.from_bytes(rows, cols, data)
+    raise ValueError("encoding must be 'bitset' or 'bytes' (base64 string data) or 'rle' (list of run lengths)")
+
+
+class GridSearch:
+    """
+    Best-first search over a Grid, shared by the pathfinders below. Entering a cell
+    costs its value; with `diagonal` on, the 8-neighborhood is searched (no cutting
+    past wall corners) and step costs are scaled by STRAIGHT_STEP / DIAGONAL_STEP.
+    
+    Each pathfinder plugs in its priority f = g_weight * g + h_weight * h, where h
+    is the Manhattan (or, with diagonals, octile) distance to the goal times the
+    cheapest cell cost, so it never overestimates. g-scores and parents live in
+    preallocated arrays, and since all priorities are small integers the open list
+    is a bucket queue: a ring of lists indexed by priority, where push and pop are
+    a list append and pop. The newest entry of a bucket comes out first, which
+    breaks ties in favor of the cell the search just reached.
+    """
+    
+    g_weight = 1
+    h_weight = 1
+    # Whether a cell already on the open list is queued again when a shorter path to it turns up.
+    reopen = True
+    
+    def __init__(self, grid, start: Dict[str, int], end: Dict[str, int], diagonal: bool = False):
+        """`grid` is a list of rows (see Grid for cell values) or a prebuilt Grid."""
+        self.grid = grid if isinstance(grid, Grid) else Grid(grid)
+        self.rows, self.cols = self.grid.rows, self.grid.cols
+        self.width = self.grid.width
+        self.walls = self.grid.walls
+        self.size = self.grid.size
+        self.in_bounds = self.grid.in_bounds
+        self.cell_id = self.grid.cell_id
+        self.cell_xy = self.grid.cell_xy
+        self.diagonal = diagonal
+        # g-score of one straight step onto open ground.
+        self.unit = STRAIGHT_STEP if diagonal else 1
+        
         self.start = (start['x'], start['y'])
         self.end = (end['x'], end['y'])
+        # Cells expanded by the last find_path call.
+        self.expanded = 0
     
     def heuristic(self, x1: int, y1: int, x2: int, y2: int) -> float:
-        return abs(x1 - x2) + abs(y1 - y2)
+        dx, dy = abs(x1 - x2), abs(y1 - y2)
+        if self.diagonal:
+            return (dx + dy) + (DIAGONAL_STEP / STRAIGHT_STEP - 2) * min(dx, dy)
+        return dx + dy
+    
+    def _moves(self) -> List[Tuple[int, int, int, int]]:
+        """(offset, step cost, side, side) per move; diagonal moves need both sides open."""
+        width = self.width
+        if not self.diagonal:
+            return [(width, 1, 0, 0), (1, 1, 0, 0), (-width, 1, 0, 0), (-1, 1, 0, 0)]
+        straight = [(step, STRAIGHT_STEP, 0, 0) for step in (width, 1, -width, -1)]
+        diagonal = [(dy + dx, DIAGONAL_STEP, dy, dx) for dy in (width, -width) for dx in (1, -1)]
+        return straight + diagonal
+    
+    def _endpoints(self) -> Optional[Tuple[int, int]]:
+        """Start and goal cell ids, or None when either is off the grid or the goal is a wall."""
+        if not (self.in_bounds(*self.start) and self.in_bounds(*self.end)):
+            return None
+        source, goal = self.cell_id(*self.start), self.cell_id(*self.end)
+        if self.walls[goal]:
+            return None
+        return source, goal
+    
+    def _fresh_g(self) -> array:
+        g = array('q')
+        g.frombytes(self.grid.initial_g)
+        return g
     
-    def get_neighbors(self, x: int, y: int) -> List[Tuple[int, int]]:
+    def find_path(self, explored_format: str = 'cells') -> Dict:
+        """Run the search and return found/path/cost/explored, with `explored` in one of EXPLORED_FORMATS."""
+        explored = []
+        path = self.search(explored)
+        self.expanded = len(explored)
+        return self._result(path, explored, explored_format)
+    
+    def _result(self, path: Optional[List[int]], explored: List[int], explored_format: str) -> Dict:
+        result = {"found": path is not None, "path": self.grid.points(path or [])}
+        if path is not None:
+            result["cost"] = self.grid.path_cost(path)
+        if explored_format != 'none':
+            result["explored"] = self.grid.encode_explored(explored, explored_format)
+        return result
+    
+    def stream_path(self, interval: float = 0.05) -> Iterator[Dict]:
         """
-        Get valid neighboring cells for pathfinding.
-        Only returns neighbors that are:
-        1. Within grid bounds
-        2. Not walls (grid value != 1)
+        Run the search on a background thread and yield {"explored": [indices]} chunks
+        (y * cols + x) every `interval` seconds while it runs, then {"found", "path", "cost"}.
+        The search appends to a plain list that this generator reads behind it, so
+        streaming adds nothing to the search loop itself.
         """
-        neighbors = []
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.cols and 0 <= ny < self.rows:
-                if self.grid[ny][nx] != 1:
-                    neighbors.append((nx, ny))
-        
-        return neighbors
+        explored = []
+        outcome = {}
+        worker = threading.Thread(target=lambda: outcome.update(path=self.search(explored)), daemon=True)
+        worker.start()
+        sent = 0
+        while True:
+            worker.join(interval)
+            done = not worker.is_alive()
+            count = len(explored)
+            if count > sent:
+                yield {"explored": self.grid.indices(explored[sent:count]).tolist()}
+                sent = count
+            if done:
+                break
+        self.expanded = len(explored)
+        yield self._result(outcome.get("path"), [], 'none')
+    
+    def search(self, explored: List[int]) -> Optional[List[int]]:
+        """
+        Search from start to end, appending each expanded cell id to `explored`.
+        Returns the path as cell ids, or None when there is none.
+        """
+        endpoints = self._endpoints()
+        if endpoints is None:
+            return None
+        source, goal = endpoints
+        _, parent, reached = self.expand(source, [goal], explored)
+        return self._walk_back(parent, goal) if reached else None
     
-    def find_path(self) -> Dict:
-        start_node = Node(self.start[0], self.start[1], g=0, h=self.heuristic(self.start[0], self.start[1], self.end[0], self.end[1]))
+    def expand(self, source: int, targets: List[int], explored: List[int]) -> Tuple[array, array, bool]:
+        """
+        Expand cells from `source` until every cell in `targets` is closed or the open
+        list runs out, appending expanded cells to `explored`. h aims at targets[0], so
+        several targets only make sense with h_weight = 0. Returns the g-scores (in
+        units of self.unit), the parents and whether all targets were reached.
+        """
+        width, walls, costs = self.width, self.walls, self.grid.costs
+        g_weight, h_weight, reopen = self.g_weight, self.h_weight, self.reopen
+        diagonal, moves = self.diagonal, self._moves()
+        goal_y, goal_x = divmod(targets[0], width)
+        # h = h_straight * (dx + dy) + h_diagonal * min(dx, dy)
+        if g_weight:
+            h_straight = h_weight * self.grid.min_cost * self.unit
+            h_diagonal = h_weight * self.grid.min_cost * (DIAGONAL_STEP - 2 * STRAIGHT_STEP) if diagonal else 0
+        else:
+            # Greedy order depends on h alone, so coarse 5:7 octile steps keep its ring short.
+            h_straight, h_diagonal = (5 * h_weight, -3 * h_weight) if diagonal else (h_weight, 0)
         
-        open_set = [start_node]
-        closed_set = set()
-        explored = []
+        # Live priorities never spread over more than `span` values, so they share a ring of buckets.
+        max_step = self.grid.max_cost * (DIAGONAL_STEP if diagonal else 1)
+        if g_weight:
+            span = (g_weight + h_weight) * max_step + 1
+        else:
+            # Greedy priorities are h alone, which can also fall, so the ring covers every h.
+            span = h_straight * (self.rows + self.cols) + 1
         
-        nodes_dict = {(start_node.x, start_node.y): start_node}
+        g = self._fresh_g()
+        parent = array('q', [-1]) * self.size
+        closed = bytearray(self.size)
+        pending = bytearray(self.size)
+        for target in targets:
+            pending[target] = 1
+        remaining = sum(pending)
         
-        while open_set:
-            current = heapq.heappop(open_set)
-            
-            if (current.x, current.y) in closed_set:
+        g[source] = 0
+        dy, dx = abs(source // width - goal_y), abs(source % width - goal_x)
+        current = h_straight * (dx + dy) + h_diagonal * (dx if dx < dy else dy)
+        ring = [[] for _ in range(span)]
+        ring[current % span].append(source)
+        queued = 1
+        
+        while queued:
+            bucket = ring[current % span]
+            while not bucket:
+                current += 1
+                bucket = ring[current % span]
+            cell = bucket.pop()
+            queued -= 1
+            if closed[cell]:
                 continue
+            closed[cell] = 1
+            explored.append(cell)
             
-            closed_set.add((current.x, current.y))
-            explored.append({"x": current.x, "y": current.y})
+            if pending[cell]:
+                remaining -= 1
+                if not remaining:
+                    return g, parent, True
             
-            if (current.x, current.y) == self.end:
-                path = []
-                node = current
-                while node:
-                    path.append({"x": node.x, "y": node.y})
-                    node = node.parent
-                path.reverse()
-                
-                return {
-                    "found": True,
-                    "path": path,
-                    "explored": explored
-                }
-            
-            for nx, ny in self.get_neighbors(current.x, current.y):
-                if (nx, ny) in closed_set:
-                    continue
-                
-                tentative_g = current.g + 1
-                
-                if (nx, ny) not in nodes_dict:
-                    neighbor = Node(nx, ny, g=tentative_g, h=self.heuristic(nx, ny, self.end[0], self.end[1]), parent=current)
-                    nodes_dict[(nx, ny)] = neighbor
-                    heapq.heappush(open_set, neighbor)
-                else:
-                    neighbor = nodes_dict[(nx, ny)]
-                    if tentative_g < neighbor.g:
-                        neighbor.g = tentative_g
-                        neighbor.f = neighbor.g + neighbor.h
-                        neighbor.parent = current
-                        heapq.heappush(open_set, neighbor)
+            base = g[cell]
+            if diagonal:
+                for offset, step_cost, side_a, side_b in moves:
+                    if side_a and (walls[cell + side_a] or walls[cell + side_b]):
+                        continue
+                    nb = cell + offset
+                    step = base + step_cost * costs[nb]
+                    known = g[nb]
+                    if step < known and (reopen or known == UNREACHED):
+                        g[nb] = step
+                        parent[nb] = cell
+                        dy, dx = abs(nb // width - goal_y), abs(nb % width - goal_x)
+                        f = g_weight * step + h_straight * (dx + dy) + h_diagonal * (dx if dx < dy else dy)
+                        if f < current:
+                            current = f
+                        ring[f % span].append(nb)
+                        queued += 1
+            else:
+                for nb in (cell + width, cell + 1, cell - width, cell - 1):
+                    # Walls hold g = -1 and closed cells their final g-score, so neither passes.
+                    step = base + costs[nb]
+                    known = g[nb]
+                    if step < known and (reopen or known == UNREACHED):
+                        g[nb] = step
+                        parent[nb] = cell
+                        f = g_weight * step
+                        if h_straight:
+                            f += h_straight * (abs(nb // width - goal_y) + abs(nb % width - goal_x))
+                        if f < current:
+                            current = f
+                        ring[f % span].append(nb)
+                        queued += 1
         
-        return {
-            "found": False,
-            "path": [],
-            "explored": explored
-        }
+        return g, parent, False
+    
+    @staticmethod
+    def _walk_back(parent, cell: int) -> List[int]:
+        path = []
+        while cell != -1:
+            path.append(cell)
+            cell = parent[cell]
+        path.reverse()
+        return path
 
 
-class DijkstraPathfinder:
-    def __init__(self, grid: List[List[int]], start: Dict[str, int], end: Dict[str, int]):
-        self.grid = grid
-        self.rows = len(grid)
-        self.cols = len(grid[0]) if self.rows > 0 else 0
-        self.start = (start['x'], start['y'])
-        self.end = (end['x'], end['y'])
+class AStarPathfinder(GridSearch):
+    """A*: f = g + h with the Manhattan (or octile) heuristic; shortest paths, few expansions."""
+    g_weight = 1
+    h_weight = 1
+
+
+class DijkstraPathfinder(GridSearch):
+    """Dijkstra: f = g; shortest paths, expands uniformly in all directions."""
+    g_weight = 1
+    h_weight = 0
+
+
+class GreedyPathfinder(GridSearch):
+    """Greedy best-first: f = h; fast but not always shortest. Cells keep their first parent."""
+    g_weight = 0
+    h_weight = 1
+    reopen = False
+
+
+class JumpPointPathfinder(GridSearch):
+    """
+    Jump Point Search for 4-connected grids: A* over "jump points" only.
+    
+    Shortest paths are taken in a canonical form that moves vertically first and
+    only turns back to vertical after a horizontal run when an obstacle forces it.
+    A horizontal scan therefore continues until it hits the goal or a cell with a
+    forced vertical neighbor (open, while the cell behind it is blocked). A vertical
+    scan stops wherever a horizontal scan from it would find a jump point. Open
+    areas are crossed without queueing the cells in between, and `explored` lists
+    only the jump points expanded.
     
-    def get_neighbors(self, x: int, y: int) -> List[Tuple[int, int]]:
-        neighbors = []
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    The pruning rules assume every step costs the same, so on weighted grids or
+    with diagonal moves the search runs as plain A*.
+    """
+    
+    def search(self, explored: List[int]) -> Optional[List[int]]:
+        if self.diagonal or not self.grid.uniform:
+            return super().search(explored)
+        endpoints = self._endpoints()
+        if endpoints is None:
+            return None
         
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.cols and 0 <= ny < self.rows:
-                if self.grid[ny][nx] != 1:
-                    neighbors.append((nx, ny))
+        width = self.width
+        source, goal = endpoints
+        goal_y, goal_x = divmod(goal, width)
         
-        return neighbors
-    
-    def find_path(self) -> Dict:
-        start_node = Node(self.start[0], self.start[1], g=0)
+        g = self._fresh_g()
+        parent = array('q', [-1]) * self.size
+        # Step (+/-1 or +/-width) each jump point was reached with; 0 for the start.
+        arrival = array('q', [0]) * self.size
+        closed = bytearray(self.size)
         
-        open_set = [start_node]
-        closed_set = set()
-        explored = []
+        cell_bits = self.size.bit_length()
+        cell_mask = (1 << cell_bits) - 1
+        h_bits = (self.rows + self.cols + 2).bit_length()
         
-        nodes_dict = {(start_node.x, start_node.y): start_node}
+        g[source] = 0
+        h = abs(source // width - goal_y) + abs(source % width - goal_x)
+        heap = [((h << h_bits | h) << cell_bits) | source]
         
-        while open_set:
-            current = heapq.heappop(open_set)
-            
-            if (current.x, current.y) in closed_set:
+        while heap:
+            cell = heapq.heappop(heap) & cell_mask
+            if closed[cell]:
                 continue
+            closed[cell] = 1
+            explored.append(cell)
             
-            closed_set.add((current.x, current.y))
-            explored.append({"x": current.x, "y": current.y})
-            
-            if (current.x, current.y) == self.end:
-                path = []
-                node = current
-                while node:
-                    path.append({"x": node.x, "y": node.y})
-                    node = node.parent
-                path.reverse()
-                
-                return {
-                    "found": True,
-                    "path": path,
-                    "explored": explored
-                }
+            if cell == goal:
+                return self._expand(self._walk_back(parent, goal))
             
-            for nx, ny in self.get_neighbors(current.x, current.y):
-                if (nx, ny) in closed_set:
+            for step in self._directions(cell, arrival[cell]):
+                jump = self._jump(cell, step, goal)
+                if jump < 0 or closed[jump]:
                     continue
-                
-                tentative_g = current.g + 1
-                
-                if (nx, ny) not in nodes_dict:
-                    neighbor = Node(nx, ny, g=tentative_g, parent=current)
-                    nodes_dict[(nx, ny)] = neighbor
-                    heapq.heappush(open_set, neighbor)
-                else:
-                    neighbor = nodes_dict[(nx, ny)]
-                    if tentative_g < neighbor.g:
-                        neighbor.g = tentative_g
-                        neighbor.parent = current
-                        heapq.heappush(open_set, neighbor)
+                cost = g[cell] + (abs(jump - cell) if step in (1, -1) else abs(jump - cell) // width)
+                if cost < g[jump]:
+                    g[jump] = cost
+                    parent[jump] = cell
+                    arrival[jump] = step
+                    h = abs(jump // width - goal_y) + abs(jump % width - goal_x)
+                    heapq.heappush(heap, (((cost + h) << h_bits | h) << cell_bits) | jump)
         
-        return {
-            "found": False,
-            "path": [],
-            "explored": explored
-        }
+        return None
+    
+    def _directions(self, cell: int, step: int) -> List[int]:
+        """Pruned successor directions of a jump point reached by `step`."""
+        width, walls = self.width, self.walls
+        if step == 0:
+            return [width, 1, -width, -1]
+        if step in (1, -1):
+            directions = [step]
+            for vertical in (-width, width):
+                if not walls[cell + vertical] and walls[cell + vertical - step]:
+                    directions.append(vertical)
+            return directions
+        return [step, 1, -1]
+    
+    def _jump_horizontal(self, cell: int, step: int, goal: int) -> int:
+        walls, width = self.walls, self.width
+        while True:
+            cell += step
+            if walls[cell]:
+                return -1
+            if cell == goal:
+                return cell
+            up, down = cell - width, cell + width
+            if (not walls[up] and walls[up - step]) or (not walls[down] and walls[down - step]):
+                return cell
+    
+    def _jump(self, cell: int, step: int, goal: int) -> int:
+        """Next jump point from `cell` in direction `step`, or -1 if the scan hits a wall."""
+        if step in (1, -1):
+            return self._jump_horizontal(cell, step, goal)
+        walls = self.walls
+        while True:
+            cell += step
+            if walls[cell]:
+                return -1
+            if cell == goal:
+                return cell
+            if self._jump_horizontal(cell, 1, goal) >= 0 or self._jump_horizontal(cell, -1, goal) >= 0:
+                return cell
+    
+    def _expand(self, jump_points: List[int]) -> List[int]:
+        """Fill in the straight runs between consecutive jump points."""
+        if not jump_points:
+            return []
+        width = self.width
+        path = [jump_points[0]]
+        for a, b in zip(jump_points, jump_points[1:]):
+            step = (1 if b > a else -1) if a // width == b // width else (width if b > a else -width)
+            path.extend(range(a + step, b + step, step))
+        return path
 
 
-class GreedyPathfinder:
-    def __init__(self, grid: List[List[int]], start: Dict[str, int], end: Dict[str, int]):
-        self.grid = grid
-        self.rows = len(grid)
-        self.cols = len(grid[0]) if self.rows > 0 else 0
-        self.start = (start['x'], start['y'])
-        self.end = (end['x'], end['y'])
+class BidirectionalAStarPathfinder(GridSearch):
+    """
+    A* from both ends at once, always expanding the side with the smaller open list.
+    The search stops once the best path through a cell reached by both sides is no
+    longer than the lowest f on either open list, which on large open maps happens
+    after each side has covered roughly half the distance.
+    """
     
-    def heuristic(self, x1: int, y1: int, x2: int, y2: int) -> float:
-        return abs(x1 - x2) + abs(y1 - y2)
-    
-    def get_neighbors(self, x: int, y: int) -> List[Tuple[int, int]]:
-        neighbors = []
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    def search(self, explored: List[int]) -> Optional[List[int]]:
+        endpoints = self._endpoints()
+        if endpoints is None:
+            return None
         
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.cols and 0 <= ny < self.rows:
-                if self.grid[ny][nx] != 1:
-                    neighbors.append((nx, ny))
+        width = self.width
+        source, goal = endpoints
+        if source == goal:
+            explored.append(source)
+            return [source]
         
-        return neighbors
-    
-    def find_path(self) -> Dict:
-        start_node = Node(self.start[0], self.start[1], g=0, h=self.heuristic(self.start[0], self.start[1], self.end[0], self.end[1]))
-        start_node.f = start_node.h
+        walls, costs, moves = self.walls, self.grid.costs, self._moves()
+        h_straight = self.grid.min_cost * self.unit
+        h_diagonal = self.grid.min_cost * (DIAGONAL_STEP - 2 * STRAIGHT_STEP) if self.diagonal else 0
         
-        open_set = [start_node]
-        closed_set = set()
-        explored = []
+        cell_bits = self.size.bit_length()
+        cell_mask = (1 << cell_bits) - 1
+        h_bits = (h_straight * (self.rows + self.cols + 2)).bit_length()
+        key_shift = h_bits + cell_bits
         
-        nodes_dict = {(start_node.x, start_node.y): start_node}
+        sides = []
+        for origin, target in ((source, goal), (goal, source)):
+            g = self._fresh_g()
+            g[origin] = 0
+            target_y, target_x = divmod(target, width)
+            dy, dx = abs(origin // width - target_y), abs(origin % width - target_x)
+            h = h_straight * (dx + dy) + h_diagonal * (dx if dx < dy else dy)
+            sides.append({
+                "g": g,
+                "parent": array('q', [-1]) * self.size,
+                "closed": bytearray(self.size),
+                "heap": [((h << h_bits | h) << cell_bits) | origin],
+                "target": (target_y, target_x),
+                "forward": origin == source
+            })
+        forward, backward = sides
         
-        while open_set:
-            current = heapq.heappop(open_set)
+        best, meeting = UNREACHED, -1
+        push, pop = heapq.heappush, heapq.heappop
+        
+        while forward["heap"] and backward["heap"]:
+            if max(forward["heap"][0], backward["heap"][0]) >> key_shift >= best:
+                break
+            side, other = ((forward, backward) if len(forward["heap"]) <= len(backward["heap"])
+                           else (backward, forward))
+            g, parent, closed, heap = side["g"], side["parent"], side["closed"], side["heap"]
+            other_g = other["g"]
+            target_y, target_x = side["target"]
             
-            if (current.x, current.y) in closed_set:
+            cell = pop(heap) & cell_mask
+            if closed[cell]:
                 continue
+            closed[cell] = 1
+            explored.append(cell)
             
-            closed_set.add((current.x, current.y))
-            explored.append({"x": current.x, "y": current.y})
-            
-            if (current.x, current.y) == self.end:
-                path = []
-                node = current
-                while node:
-                    path.append({"x": node.x, "y": node.y})
-                    node = node.parent
-                path.reverse()
-                
-                return {
-                    "found": True,
-                    "path": path,
-                    "explored": explored
-                }
-            
-            for nx, ny in self.get_neighbors(current.x, current.y):
-                if (nx, ny) in closed_set:
+            base, entering = g[cell], side["forward"]
+            for offset, step_cost, side_a, side_b in moves:
+                if side_a and (walls[cell + side_a] or walls[cell + side_b]):
                     continue
-                
-                if (nx, ny) not in nodes_dict:
-                    h = self.heuristic(nx, ny, self.end[0], self.end[1])
-                    neighbor = Node(nx, ny, g=current.g + 1, h=h, parent=current)
-                    neighbor.f = h
-                    nodes_dict[(nx, ny)] = neighbor
-                    heapq.heappush(open_set, neighbor)
+                nb = cell + offset
+                # Going backward, the step pays for the cell being left: the one entered on the forward path.
+                step = base + step_cost * costs[nb if entering else cell]
+                if step < g[nb]:
+                    g[nb] = step
+                    parent[nb] = cell
+                    dy, dx = abs(nb // width - target_y), abs(nb % width - target_x)
+                    h = h_straight * (dx + dy) + h_diagonal * (dx if dx < dy else dy)
+                    push(heap, (((step + h) << h_bits | h) << cell_bits) | nb)
+                    if other_g[nb] != UNREACHED and step + other_g[nb] < best:
+                        best, meeting = step + other_g[nb], nb
+        
+        if meeting < 0:
+            return None
         
-        return {
-            "found": False,
-            "path": [],
-            "explored": explored
-        }
+        path = self._walk_back(forward["parent"], meeting)
+        cell = backward["parent"][meeting]
+        while cell != -1:
+            path.append(cell)
+            cell = backward["parent"][cell]
+        return path
+
+
+PATHFINDERS = {
+    'astar': AStarPathfinder,
+    'dijkstra': DijkstraPathfinder,
+    'greedy': GreedyPathfinder,
+    'jps': JumpPointPathfinder,
+    'bidirectional': BidirectionalAStarPathfinder
+}
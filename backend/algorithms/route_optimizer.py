@@ -1,58 +1,103 @@
-import math
-from typing import List, Dict, Tuple, Optional
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Callable
+from backend.algorithms.distance_matrix import haversine_distance, haversine_matrix, as_distance_matrix
+from backend.algorithms.local_search import (
+    SearchBudget, Tour, neighbor_lists, two_opt, or_opt, local_search, cheapest_insertion, simulated_annealing
+)
+from backend.algorithms.parallel import ANNEALING_OPTIONS, parallel_restarts
+from backend.algorithms.spatial import DENSE_MATRIX_MAX_STOPS, SparseDistances
+from backend.algorithms.time_windows import TimeWindowTour, time_window_insertion, parse_windows, travel_time_matrix
+
+# Keyword options each algorithm takes besides time_limit_ms.
+ALGORITHM_OPTIONS = {
+    'nearest_neighbor': (),
+    'two_opt': (),
+    'or_opt': (),
+    'greedy_insertion': (),
+    'simulated_annealing': ANNEALING_OPTIONS + ('seed',),
+    'time_windows': ('time_windows', 'service_times', 'start_time')
+}
+ROUTE_ALGORITHMS = tuple(ALGORITHM_OPTIONS)
+
+# Algorithms that run as parallel multi-starts with restarts > 1, and the options their restarts take.
+RESTART_OPTIONS = {
+    'two_opt': ('seed', 'kicks'),
+    'or_opt': ('seed', 'kicks'),
+    'simulated_annealing': ANNEALING_OPTIONS + ('seed',)
+}
+
+def check_algorithm(algorithm: str, restarts: int = 1, options: Optional[Dict] = None):
+    """Raise ValueError for an unknown algorithm, an option it doesn't take or restarts it can't run."""
+    if not isinstance(algorithm, str) or algorithm not in ALGORITHM_OPTIONS:
+        raise ValueError(f"algorithm must be one of {', '.join(ROUTE_ALGORITHMS)}")
+    if restarts > 1 and algorithm not in RESTART_OPTIONS:
+        raise ValueError(f"restarts need {', '.join(RESTART_OPTIONS)}, not {algorithm}")
+    allowed = RESTART_OPTIONS[algorithm] if restarts > 1 else ALGORITHM_OPTIONS[algorithm]
+    unknown = sorted(set(options or {}) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown options for {algorithm}: {', '.join(unknown)}"
+                         + (f" (it takes {', '.join(allowed)})" if allowed else ""))
+    if algorithm == 'time_windows' and 'time_windows' not in (options or {}):
+        raise ValueError("time_windows needs a list of time windows")
+
+
+# Algorithms that need every pair's distance up front, so not a SparseDistances matrix.
+DENSE_ONLY_ALGORITHMS = ('greedy_insertion', 'time_windows')
 
 class RouteOptimizer:
     def __init__(self, locations: List[Dict], distance_matrix: Optional[List[List[float]]] = None, 
-                 geometry_cache: Optional[Dict] = None):
+                 geometry_cache: Optional[Dict] = None,
+                 geometry_fetcher: Optional[Callable[[List[Tuple[int, int]]], Dict]] = None,
+                 neighbor_count: int = 10, duration_matrix: Optional[List[List[float]]] = None,
+                 on_progress: Optional[Callable[[SearchBudget, List[int]], None]] = None):
         self.locations = [loc for loc in locations if loc.get('success', True)]
-        self.distance_matrix = distance_matrix
+        if isinstance(distance_matrix, SparseDistances) or distance_matrix is None:
+            self.distance_matrix = distance_matrix
+        else:
+            self.distance_matrix = as_distance_matrix(distance_matrix)
+        self.duration_matrix = as_distance_matrix(duration_matrix) if duration_matrix is not None else None
         self.geometry_cache = geometry_cache or {}
+        self.geometry_fetcher = geometry_fetcher
+        self.neighbor_count = neighbor_count
+        # Called with the best route so far while a search runs (see SearchBudget).
+        self.on_progress = on_progress
+        self._neighbor_lists = None
+        self._seed_route = None
+        # Location indices of the last route built, in order.
+        self.route_indices: List[int] = []
         
         if self.distance_matrix is None:
             self._build_distance_matrix()
+        # Large instances search a k-nearest candidate graph instead of a dense matrix.
+        self.sparse = isinstance(self.distance_matrix, SparseDistances)
     
     def _build_distance_matrix(self):
         """Build distance matrix using haversine if no routing service provided."""
-        n = len(self.locations)
-        self.distance_matrix = [[0.0 for _ in range(n)] for _ in range(n)]
-        
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    self.distance_matrix[i][j] = self.calculate_distance(
-                        self.locations[i], self.locations[j]
-                    )
+        if len(self.locations) > DENSE_MATRIX_MAX_STOPS:
+            self.distance_matrix = SparseDistances(self.locations, self.neighbor_count)
+        else:
+            self.distance_matrix = haversine_matrix(self.locations)
     
     def calculate_distance(self, loc1: Dict, loc2: Dict) -> float:
         """Calculate haversine distance between two locations."""
-        lat1, lng1 = loc1['lat'], loc1['lng']
-        lat2, lng2 = loc2['lat'], loc2['lng']
-        
-        R = 6371
-        
-        dlat = math.radians(lat2 - lat1)
-        dlng = math.radians(lng2 - lng1)
-        
-        a = (math.sin(dlat / 2) ** 2 +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlng / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return haversine_distance(loc1, loc2)
     
     def _get_distance(self, i: int, j: int) -> float:
         """Get distance between locations at index i and j."""
-        return self.distance_matrix[i][j]
+        return float(self.distance_matrix[i][j])
     
     def _calculate_route_distance(self, route_indices: List[int]) -> float:
         """Calculate total distance for a route given by location indices."""
-        total = 0.0
-        for i in range(len(route_indices) - 1):
-            total += self._get_distance(route_indices[i], route_indices[i + 1])
-        return total
+        if len(route_indices) < 2:
+            return 0.0
+        if self.sparse:
+            D = self.distance_matrix
+            return sum(D[a][b] for a, b in zip(route_indices[:-1], route_indices[1:]))
+        return float(self.distance_matrix[route_indices[:-1], route_indices[1:]].sum())
     
-    def _build_route_response(self, route_indices: List[int]) -> Dict:
+    def _build_route_response(self, route_indices: List[int], budget: Optional[SearchBudget] = None) -> Dict:
         """Build the response with route order and geometries."""
+        self.route_indices = list(route_indices)
         route = []
         total_distance = 0.0
         geometries = []
@@ -63,6 +108,13 @@ class RouteOptimizer:
                 "order": order
             })
         
+        if self.geometry_fetcher:
+            missing_legs = [(route_indices[i], route_indices[i + 1])
+                            for i in range(len(route_indices) - 1)
+                            if (route_indices[i], route_indices[i + 1]) not in self.geometry_cache]
+            if missing_legs:
+                self.geometry_cache.update(self.geometry_fetcher(missing_legs))
+        
         for i in range(len(route_indices) - 1):
             idx1, idx2 = route_indices[i], route_indices[i + 1]
             total_distance += self._get_distance(idx1, idx2)
@@ -75,14 +127,52 @@ class RouteOptimizer:
                     [self.locations[idx2]['lat'], self.locations[idx2]['lng']]
                 ])
         
-        return {
+        response = {
             "route": route,
             "total_distance": round(total_distance, 2),
             "geometries": geometries
         }
+        if budget is not None:
+            response["stats"] = self._search_stats(route_indices, budget)
+        return response
     
-    def nearest_neighbor(self) -> Dict:
-        """Nearest neighbor algorithm (greedy approach)."""
+    def route_summary(self, route_indices: List[int]) -> Dict:
+        """Stops in order and the total distance, without geometries (for progress reports)."""
+        return {
+            "route": [{**self.locations[idx], "order": order} for order, idx in enumerate(route_indices, start=1)],
+            "total_distance": round(self._calculate_route_distance(route_indices), 2)
+        }
+    
+    def _budget(self, time_limit_ms: Optional[float]) -> SearchBudget:
+        """A budget wired to on_progress, which hears about the nearest neighbor seed right away."""
+        budget = SearchBudget(time_limit_ms, on_progress=self.on_progress)
+        if self.on_progress is not None:
+            budget.track(self._nearest_neighbor_indices)
+            budget.report()
+        return budget
+    
+    def _search_stats(self, route_indices: List[int], budget: SearchBudget) -> Dict:
+        """Iterations run, time used and improvement over the nearest neighbor seed."""
+        seed_distance = self._calculate_route_distance(self._nearest_neighbor_indices())
+        improvement = seed_distance - self._calculate_route_distance(route_indices)
+        stats = {
+            "iterations": budget.iterations,
+            "elapsed_ms": round(budget.elapsed_ms(), 1),
+            "time_limit_ms": budget.time_limit * 1000 if budget.time_limit else None,
+            "timed_out": budget.timed_out,
+            "seed_distance": round(seed_distance, 2),
+            "improvement": round(improvement, 2),
+            "improvement_pct": round(100 * improvement / seed_distance, 2) if seed_distance > 0 else 0.0
+        }
+        if self.sparse:
+            # Legs off the candidate graph are priced at the straight-line distance times the detour factor.
+            D = self.distance_matrix
+            stats["estimated_legs"] = sum(not D.is_stored(a, b) for a, b in zip(route_indices[:-1], route_indices[1:]))
+        return stats
+    
+    def _trivial_response(self) -> Optional[Dict]:
+        """Response for routes with nothing to optimize, or None if there are 2+ locations."""
+        self.route_indices = list(range(len(self.locations)))
         if not self.locations:
             return {"route": [], "total_distance": 0, "geometries": []}
         
@@ -93,27 +183,221 @@ class RouteOptimizer:
                 "geometries": []
             }
         
+        return None
+    
+    def _nearest_neighbor_indices(self) -> List[int]:
+        if self._seed_route is not None:
+            return list(self._seed_route)
+        
+        if self.sparse:
+            self._seed_route = self.distance_matrix.index.nearest_neighbor_route(0)
+            return list(self._seed_route)
+        
         n = len(self.locations)
-        unvisited = set(range(1, n))
+        visited = np.zeros(n, dtype=bool)
+        visited[0] = True
         route_indices = [0]
         
         current_idx = 0
         
-        while unvisited:
-            nearest_idx = None
-            nearest_distance = float('inf')
-            
-            for idx in unvisited:
-                distance = self._get_distance(current_idx, idx)
-                if distance < nearest_distance:
-                    nearest_distance = distance
-                    nearest_idx = idx
+        for _ in range(n - 1):
+            # One vectorized scan of the current row replaces the inner loop over unvisited stops.
+            distances = np.where(visited, np.inf, self.distance_matrix[current_idx])
+            nearest_idx = int(np.argmin(distances))
             
             route_indices.append(nearest_idx)
-            unvisited.remove(nearest_idx)
+            visited[nearest_idx] = True
             current_idx = nearest_idx
         
-        return self._build_route_response(route_indices)
+        self._seed_route = route_indices
+        return list(route_indices)
     
-    def optimize(self, algorithm: str = "nearest_neighbor") -> Dict:
-        return self.nearest_neighbor()
\ No newline at end of file
+    def _neighbors(self) -> List[List[int]]:
+        if self._neighbor_lists is None:
+            if self.sparse:
+                self._neighbor_lists = self.distance_matrix.neighbors
+            else:
+                self._neighbor_lists = neighbor_lists(self.distance_matrix, self.neighbor_count)
+        return self._neighbor_lists
+    
+    def _tour(self, route_indices: List[int]) -> Tour:
+        if self.sparse:
+            # Sparse distances are symmetric by construction; the row list skips a layer of indexing.
+            return Tour(route_indices, self.distance_matrix.rows, symmetric=True)
+        return Tour(route_indices, self.distance_matrix)
+    
+    def nearest_neighbor(self, time_limit_ms: Optional[float] = None) -> Dict:
+        """Nearest neighbor algorithm (greedy approach)."""
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        return self._build_route_response(self._nearest_neighbor_indices(), budget)
+    
+    def two_opt(self, time_limit_ms: Optional[float] = None) -> Dict:
+        """2-opt local search from the nearest neighbor route."""
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        tour = self._tour(self._nearest_neighbor_indices())
+        budget.track(lambda: tour.route)
+        two_opt(tour, self._neighbors(), budget=budget)
+        return self._build_route_response(tour.route, budget)
+    
+    def or_opt(self, time_limit_ms: Optional[float] = None) -> Dict:
+        """Or-opt segment moves from the nearest neighbor route."""
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        tour = self._tour(self._nearest_neighbor_indices())
+        budget.track(lambda: tour.route)
+        or_opt(tour, self._neighbors(), budget=budget)
+        return self._build_route_response(tour.route, budget)
+    
+    def greedy_insertion(self, time_limit_ms: Optional[float] = None) -> Dict:
+        """
+        Cheapest insertion: grow the route by the stop that is cheapest to insert anywhere,
+        keeping the nearest neighbor route instead if that one is shorter.
+        """
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        route_indices = cheapest_insertion(self.distance_matrix, budget=budget)
+        # Insertion is no better than nearest neighbor on every instance (and worse when the
+        # deadline cuts it short), so the nearest neighbor route wins whenever it is shorter.
+        seed = self._nearest_neighbor_indices()
+        if self._calculate_route_distance(seed) < self._calculate_route_distance(route_indices):
+            route_indices = seed
+        return self._build_route_response(route_indices, budget)
+    
+    def simulated_annealing(self, time_limit_ms: Optional[float] = None, iterations: Optional[int] = None,
+                            initial_temperature: Optional[float] = None, cooling_rate: Optional[float] = None,
+                            cooling_schedule: str = "geometric", seed: Optional[int] = None) -> Dict:
+        """
+        Simulated annealing from the nearest neighbor route, finished with 2-opt/Or-opt.
+        With a time limit and no iteration count it anneals until the deadline.
+        """
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        tour = self._tour(self._nearest_neighbor_indices())
+        if time_limit_ms and iterations is None:
+            # Leave a slice of the budget for the final local search.
+            anneal_budget = SearchBudget(max(1.0, time_limit_ms * 0.9 - budget.elapsed_ms()),
+                                         on_progress=self.on_progress)
+            best = simulated_annealing(tour, self._neighbors(), initial_temperature=initial_temperature,
+                                       cooling_rate=cooling_rate, cooling_schedule=cooling_schedule,
+                                       seed=seed, budget=anneal_budget)
+            budget.iterations += anneal_budget.iterations
+        else:
+            best = simulated_annealing(tour, self._neighbors(), iterations=iterations,
+                                       initial_temperature=initial_temperature, cooling_rate=cooling_rate,
+                                       cooling_schedule=cooling_schedule, seed=seed, budget=budget)
+        budget.track(lambda: best.route)
+        local_search(best, self._neighbors(), budget=budget)
+        if time_limit_ms and iterations is None:
+            budget.timed_out = budget.timed_out or anneal_budget.timed_out
+        return self._build_route_response(best.route, budget)
+    
+    def time_windows(self, time_windows: List[Optional[List[float]]], service_times=None,
+                     start_time: float = 0.0, time_limit_ms: Optional[float] = None) -> Dict:
+        """
+        Shortest route that starts service at every stop inside its [earliest, latest]
+        window (seconds from the route start), with optional per-stop service times.
+        Stops are inserted by closing time at their cheapest feasible position, then
+        improved with feasibility-checked Or-opt moves. Stops that fit nowhere are
+        returned under "unscheduled".
+        """
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        n = len(self.locations)
+        earliest, latest, service = parse_windows(time_windows, service_times, n)
+        if self.duration_matrix is None:
+            self.duration_matrix = travel_time_matrix(self.distance_matrix)
+        
+        # The nearest neighbor seed ignores the windows, so progress starts from the inserted route.
+        budget = SearchBudget(time_limit_ms, on_progress=self.on_progress)
+        tour = TimeWindowTour([0], self.distance_matrix, self.duration_matrix, earliest, latest, service,
+                              start_time=start_time)
+        unscheduled = time_window_insertion(tour, range(1, n), budget=budget)
+        budget.track(lambda: tour.route)
+        budget.report()
+        
+        # Or-opt only sees scheduled stops; then retry the rest against the improved route.
+        routed = set(tour.route)
+        neighbors = [[c for c in row if c in routed] for row in self._neighbors()]
+        or_opt(tour, neighbors, budget=budget)
+        if unscheduled and not budget.expired():
+            unscheduled = time_window_insertion(tour, unscheduled, budget=budget)
+        
+        response = self._build_route_response(tour.route, budget)
+        for stop, row in zip(response["route"], tour.schedule()):
+            stop.update(row)
+        response["unscheduled"] = [{**self.locations[idx], "index": idx} for idx in unscheduled]
+        return response
+    
+    def multi_start(self, algorithm: str, restarts: int, time_limit_ms: Optional[float] = None,
+                    seed: Optional[int] = None, **options) -> Dict:
+        """
+        Run `restarts` seeded searches in parallel worker processes and keep the best
+        (in this process when the pool is cold and the time limit too short to start it).
+        simulated_annealing restarts anneal with seeds seed, seed+1, ...; two_opt and
+        or_opt restarts run iterated local search with random double-bridge kicks.
+        """
+        trivial = self._trivial_response()
+        if trivial:
+            return trivial
+        
+        budget = self._budget(time_limit_ms)
+        remaining_ms = max(1.0, time_limit_ms - budget.elapsed_ms()) if time_limit_ms else None
+        results = parallel_restarts(self.distance_matrix, self._neighbors(), self._nearest_neighbor_indices(),
+                                    algorithm, restarts, seed=seed, time_limit_ms=remaining_ms, options=options)
+        budget.iterations = sum(result["iterations"] for result in results)
+        budget.timed_out = any(result["timed_out"] for result in results)
+        
+        response = self._build_route_response(results[0]["route"], budget)
+        response["stats"].update({
+            "restarts": restarts,
+            "workers": len({result["pid"] for result in results}),
+            "best_seed": results[0]["seed"],
+            "restart_distances": [round(result["distance"], 2) for result in results]
+        })
+        return response
+    
+    def optimize(self, algorithm: str = "nearest_neighbor", time_limit_ms: Optional[float] = None,
+                 restarts: int = 1, **options) -> Dict:
+        """
+        Run the named algorithm. With time_limit_ms the search stops at the deadline
+        and returns the best route found so far; the response's "stats" report the
+        iterations run and the improvement over the nearest neighbor seed.
+        With restarts > 1 the randomized algorithms run as parallel multi-starts.
+        Raises ValueError for unknown algorithms or options (see check_algorithm).
+        """
+        check_algorithm(algorithm, restarts, options)
+        if self.sparse and (algorithm in DENSE_ONLY_ALGORITHMS or restarts > 1):
+            raise ValueError(f"{algorithm if restarts == 1 else 'restarts'} needs a dense distance matrix "
+                             f"(at most {DENSE_MATRIX_MAX_STOPS} stops)")
+        if restarts > 1:
+            return self.multi_start(algorithm, restarts, time_limit_ms=time_limit_ms, **options)
+        
+        algorithms = {
+            'nearest_neighbor': self.nearest_neighbor,
+            'two_opt': self.two_opt,
+            'or_opt': self.or_opt,
+            'greedy_insertion': self.greedy_insertion,
+            'simulated_annealing': self.simulated_annealing,
+            'time_windows': self.time_windows
+        }
+        
+        return algorithms[algorithm](time_limit_ms=time_limit_ms, **options)
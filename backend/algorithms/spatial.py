@@ -0,0 +1,244 @@
+import math
+import statistics
+from typing import List, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from backend.algorithms.distance_matrix import EARTH_RADIUS_KM, coordinates, haversine_pairs
+
+# Above this many stops the optimizer searches a sparse candidate graph instead of
+# a dense matrix (2000² float64 is 32 MB; 10,000² would be 800 MB).
+DENSE_MATRIX_MAX_STOPS = 2000
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+class SpatialIndex:
+    """
+    Uniform grid of buckets over the stops, projected to kilometers around their mean
+    latitude (within a fraction of a percent of great-circle distance across a metro
+    area). Buckets hold about `bucket_size` stops, so a nearest-stop query looks at
+    the few buckets around a point instead of at every stop.
+    """
+    
+    def __init__(self, locations: List[Dict], bucket_size: int = 4):
+        self.n = len(locations)
+        lats, lngs = coordinates(locations)
+        mean_lat = math.radians(float(lats.mean())) if self.n else 0.0
+        self.x = lngs * KM_PER_DEGREE * math.cos(mean_lat)
+        self.y = lats * KM_PER_DEGREE
+        if not self.n:
+            self.cell, self.cols, self.rows = 1.0, 0, 0
+            self.cx = self.cy = np.zeros(0, dtype=np.int64)
+            self.buckets: Dict[int, np.ndarray] = {}
+            self.order = np.zeros(0, dtype=np.int64)
+            return
+        
+        width = float(self.x.max() - self.x.min())
+        height = float(self.y.max() - self.y.min())
+        # The second term keeps stops along a line (zero area) from getting millions of cells.
+        self.cell = max(math.sqrt(width * height * bucket_size / self.n),
+                        max(width, height) * bucket_size / self.n, 1e-6)
+        self.cx = ((self.x - self.x.min()) / self.cell).astype(np.int64)
+        self.cy = ((self.y - self.y.min()) / self.cell).astype(np.int64)
+        self.cols = int(self.cx.max()) + 1
+        self.rows = int(self.cy.max()) + 1
+        
+        keys = self.cy * self.cols + self.cx
+        # Stops bucket by bucket, row-major: consecutive stops are mostly close together.
+        self.order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[self.order], return_index=True)
+        ends = list(starts[1:]) + [self.n]
+        self.buckets = {int(key): self.order[start:end] for key, start, end in zip(unique, starts, ends)}
+    
+    def _ring(self, cx: int, cy: int, r: int) -> Iterator[int]:
+        """Keys of the buckets at Chebyshev distance r from bucket (cx, cy)."""
+        if r == 0:
+            yield cy * self.cols + cx
+            return
+        for y in range(max(0, cy - r), min(self.rows, cy + r + 1)):
+            if y in (cy - r, cy + r):
+                xs = range(max(0, cx - r), min(self.cols, cx + r + 1))
+            else:
+                xs = [x for x in (cx - r, cx + r) if 0 <= x < self.cols]
+            for x in xs:
+                yield y * self.cols + x
+    
+    def knn(self, k: int) -> List[List[int]]:
+        """The k nearest other stops of every stop, nearest first."""
+        k = min(k, self.n - 1)
+        if k <= 0:
+            return [[] for _ in range(self.n)]
+        
+        max_ring = max(self.rows, self.cols)
+        x, y = self.x, self.y
+        neighbors = []
+        for i in range(self.n):
+            cx, cy = int(self.cx[i]), int(self.cy[i])
+            found = []
+            for r in range(max_ring + 1):
+                found += [self.buckets[key] for key in self._ring(cx, cy, r) if key in self.buckets]
+                candidates = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+                if len(candidates) <= k:
+                    continue
+                d = (x[candidates] - x[i]) ** 2 + (y[candidates] - y[i]) ** 2
+                d[candidates == i] = np.inf
+                nearest = np.argpartition(d, k - 1)[:k]
+                # Stops outside the rings searched so far are at least r cells away.
+                if d[nearest].max() <= (r * self.cell) ** 2 or r == max_ring:
+                    nearest = nearest[np.argsort(d[nearest])]
+                    neighbors.append(candidates[nearest].tolist())
+                    break
+        return neighbors
+    
+    def nearest_neighbor_route(self, start: int = 0) -> List[int]:
+        """
+        Nearest neighbor tour from `start`: each step takes the closest unvisited stop,
+        found by searching outward ring by ring from the current stop's bucket.
+        """
+        if not self.n:
+            return []
+        remaining = {key: set(bucket.tolist()) for key, bucket in self.buckets.items()}
+        x, y = self.x.tolist(), self.y.tolist()
+        cxs, cys = self.cx.tolist(), self.cy.tolist()
+        x0, y0, cell, cols = float(self.x.min()), float(self.y.min()), self.cell, self.cols
+        max_ring = max(self.rows, self.cols)
+        
+        def take(i: int):
+            key = cys[i] * cols + cxs[i]
+            remaining[key].discard(i)
+            if not remaining[key]:
+                del remaining[key]
+        
+        route = [start]
+        take(start)
+        current = start
+        for _ in range(self.n - 1):
+            best, best_d = None, math.inf
+            px, py = x[current], y[current]
+            cx, cy = cxs[current], cys[current]
+            # Unsearched stops lie beyond ring r: at least r cells plus the way to the
+            # nearest edge of the current stop's own cell.
+            fx, fy = (px - x0) / cell - cx, (py - y0) / cell - cy
+            margin = max(0.0, min(fx, 1 - fx, fy, 1 - fy))
+            for r in range(max_ring + 1):
+                if 8 * r > len(remaining):
+                    # Late in the tour most of a wide ring is empty: scan the buckets
+                    # still holding stops instead of walking every cell key.
+                    for key, bucket in remaining.items():
+                        if max(abs(key % cols - cx), abs(key // cols - cy)) < r:
+                            continue
+                        for j in bucket:
+                            d = (x[j] - px) ** 2 + (y[j] - py) ** 2
+                            if d < best_d:
+                                best, best_d = j, d
+                    break
+                for key in self._ring(cx, cy, r):
+                    for j in remaining.get(key, ()):
+                        d = (x[j] - px) ** 2 + (y[j] - py) ** 2
+                        if d < best_d:
+                            best, best_d = j, d
+                if best is not None and best_d <= ((r + margin) * cell) ** 2:
+                    break
+            route.append(best)
+            take(best)
+            current = best
+        return route
+
+
+class _SparseRow(dict):
+    """
+    One row of a SparseDistances matrix: a dict of the stored distances, so reads of
+    candidate edges stay a plain dict lookup, with the estimate for any other stop.
+    """
+    
+    __slots__ = ('owner', 'i')
+    
+    def __init__(self, owner: 'SparseDistances', i: int):
+        super().__init__()
+        self.owner = owner
+        self.i = i
+    
+    def __missing__(self, j: int) -> float:
+        return self.owner.estimate(self.i, j)
+
+
+class SparseDistances:
+    """
+    D[i][j] reads for instances too large for a dense matrix. Each stop stores the
+    distances to its k nearest stops (the candidate graph that construction and local
+    search move along); any other pair is the straight-line distance times `detour`,
+    the typical road/straight-line ratio of the stored edges. Distances are symmetric.
+    Memory and build time grow with N * k instead of N².
+    """
+    
+    def __init__(self, locations: List[Dict], k: int = 10, index: Optional[SpatialIndex] = None):
+        self.index = index or SpatialIndex(locations)
+        self.neighbors = self.index.knn(k)
+        self.detour = 1.0
+        lats, lngs = coordinates(locations)
+        self.lat = np.radians(lats).tolist()
+        self.lng = np.radians(lngs).tolist()
+        self.cos_lat = np.cos(np.radians(lats)).tolist()
+        self.rows = [_SparseRow(self, i) for i in range(len(locations))]
+        
+        pairs = self.candidate_pairs()
+        if pairs:
+            a, b = np.array(pairs).T
+            straight = haversine_pairs(lats[a], lngs[a], lats[b], lngs[b]).tolist()
+            self._store(zip(pairs, straight))
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __getitem__(self, i: int) -> _SparseRow:
+        return self.rows[i]
+    
+    def candidate_pairs(self) -> List[Tuple[int, int]]:
+        """Candidate edges once each as (i, j) with i < j, grouped by the spatial order of i."""
+        pairs = set()
+        for i, row in enumerate(self.neighbors):
+            for j in row:
+                pairs.add((i, j) if i < j else (j, i))
+        rank = np.empty(len(self.rows), dtype=np.int64)
+        rank[self.index.order] = np.arange(len(self.rows))
+        return sorted(pairs, key=lambda pair: (rank[pair[0]], pair[1]))
+    
+    def _store(self, items):
+        rows = self.rows
+        for (i, j), d in items:
+            rows[i][j] = d
+            rows[j][i] = d
+    
+    def estimate(self, i: int, j: int) -> float:
+        """Great-circle distance between stops i and j, scaled by the detour factor."""
+        if i == j:
+            return 0.0
+        a = (math.sin((self.lat[j] - self.lat[i]) / 2) ** 2 +
+             self.cos_lat[i] * self.cos_lat[j] * math.sin((self.lng[j] - self.lng[i]) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))) * self.detour
+    
+    def set_distances(self, distances: Dict[Tuple[int, int], float]):
+        """
+        Replace candidate edge distances with measured ones (e.g. road distances keyed
+        by directed pair). Both directions of a pair are averaged, and the median
+        measured/straight-line ratio becomes the detour factor for unstored pairs.
+        """
+        merged: Dict[Tuple[int, int], List[float]] = {}
+        for (i, j), d in distances.items():
+            if d is not None and i != j:
+                merged.setdefault((i, j) if i < j else (j, i), []).append(d)
+        
+        ratios = []
+        averaged = []
+        for (i, j), values in merged.items():
+            d = sum(values) / len(values)
+            straight = self.estimate(i, j) / self.detour
+            if straight > 0:
+                ratios.append(d / straight)
+            averaged.append(((i, j), d))
+        self._store(averaged)
+        if ratios:
+            self.detour = max(1.0, statistics.median(ratios))
+    
+    def is_stored(self, i: int, j: int) -> bool:
+        return j in self.rows[i]
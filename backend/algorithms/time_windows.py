@@ -0,0 +1,185 @@
+import os
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.algorithms.local_search import SearchBudget, Tour, matrix_rows
+
+# Average road speed used to turn straight-line (or road) kilometers into seconds
+# when no travel time is known for a pair.
+FALLBACK_SPEED_KMH = float(os.environ.get('FALLBACK_SPEED_KMH', '40'))
+
+def travel_time_matrix(distance_matrix: np.ndarray, speed_kmh: float = FALLBACK_SPEED_KMH) -> np.ndarray:
+    """Seconds to cover each distance (km) at a constant speed."""
+    return np.asarray(distance_matrix, dtype=np.float64) * (3600.0 / speed_kmh)
+
+
+class TimeWindowTour(Tour):
+    """
+    An open tour with a service window [earliest, latest] and a service time per stop,
+    driven from the first stop at `start_time`. Vehicles may wait for a window to open.
+    
+    Alongside the distance prefix sums it keeps, per position, the forward service
+    start time and the backward latest start that still keeps every later stop on
+    time. Together they decide in O(1) whether a stop (or a short segment) fits
+    between two neighbors, without re-simulating the route.
+    
+    Travel times are assumed to satisfy the triangle inequality (as shortest-path
+    durations do), so taking stops out of a route never delays the rest of it.
+    """
+    
+    def __init__(self, route: Sequence[int], matrix, durations, earliest: Sequence[float],
+                 latest: Sequence[float], service: Sequence[float], start_time: float = 0.0,
+                 symmetric: Optional[bool] = None):
+        self.T = matrix_rows(durations)
+        self.earliest = earliest
+        self.latest = latest
+        self.service = service
+        self.start_time = start_time
+        self.starts = []
+        self.latest_starts = []
+        super().__init__(route, matrix, closed=False, symmetric=symmetric)
+    
+    def _reindex(self, start: int, end: int):
+        super()._reindex(start, end)
+        self._schedule()
+    
+    def _schedule(self):
+        """Recompute forward service starts and backward latest starts."""
+        route, T, service = self.route, self.T, self.service
+        n = len(route)
+        starts = [0.0] * n
+        latest_starts = [0.0] * n
+        
+        if n:
+            starts[0] = max(self.earliest[route[0]], self.start_time)
+        for p in range(1, n):
+            a, b = route[p - 1], route[p]
+            starts[p] = max(self.earliest[b], starts[p - 1] + service[a] + T[a][b])
+        
+        if n:
+            latest_starts[-1] = self.latest[route[-1]]
+        for p in range(n - 2, -1, -1):
+            a, b = route[p], route[p + 1]
+            latest_starts[p] = min(self.latest[a], latest_starts[p + 1] - service[a] - T[a][b])
+        
+        self.starts = starts
+        self.latest_starts = latest_starts
+    
+    def feasible(self) -> bool:
+        return all(start <= self.latest[stop] for stop, start in zip(self.route, self.starts))
+    
+    def fits(self, t: int, stops: Sequence[int]) -> bool:
+        """Whether `stops` can be served, in order, between positions t and t + 1."""
+        T, service, earliest, latest = self.T, self.service, self.earliest, self.latest
+        prev, time = self.route[t], self.starts[t]
+        for stop in stops:
+            time = max(earliest[stop], time + service[prev] + T[prev][stop])
+            if time > latest[stop]:
+                return False
+            prev = stop
+        
+        if t + 1 < self.n:
+            nxt = self.route[t + 1]
+            return max(earliest[nxt], time + service[prev] + T[prev][nxt]) <= self.latest_starts[t + 1]
+        return True
+    
+    def insertion_delta(self, stop: int, t: int) -> float:
+        """Distance added by serving `stop` between positions t and t + 1."""
+        D, a = self.D, self.route[t]
+        if t + 1 < self.n:
+            b = self.route[t + 1]
+            return D[a][stop] + D[stop][b] - D[a][b]
+        return D[a][stop]
+    
+    def insert(self, stop: int, t: int):
+        self.route.insert(t + 1, stop)
+        self.n += 1
+        self.fwd.append(0.0)
+        self.rev.append(0.0)
+        self._reindex(t + 1, self.n - 1)
+    
+    def allows_or_opt(self, s: int, e: int, t: int, reverse: bool) -> bool:
+        segment = self.route[s:e + 1]
+        if reverse:
+            segment.reverse()
+        # The stops between the old and new place of the segment can only get earlier
+        # once it is gone, so only the segment and its new successor need checking.
+        return self.fits(t, segment)
+    
+    def schedule(self) -> List[Dict]:
+        """Arrival, service start, wait and departure (seconds) for each position."""
+        rows = []
+        for p, stop in enumerate(self.route):
+            if p == 0:
+                arrival = self.starts[0]
+            else:
+                prev = self.route[p - 1]
+                arrival = self.starts[p - 1] + self.service[prev] + self.T[prev][stop]
+            rows.append({
+                "arrival": round(arrival, 1),
+                "service_start": round(self.starts[p], 1),
+                "wait": round(self.starts[p] - arrival, 1),
+                "departure": round(self.starts[p] + self.service[stop], 1),
+                "on_time": self.starts[p] <= self.latest[stop]
+            })
+        return rows
+
+
+def time_window_insertion(tour: TimeWindowTour, stops: Sequence[int],
+                          budget: Optional[SearchBudget] = None) -> List[int]:
+    """
+    Insert stops in order of closing time, each at its cheapest feasible position.
+    Returns the stops that fit nowhere.
+    """
+    order = sorted(stops, key=lambda stop: (tour.latest[stop], tour.earliest[stop]))
+    unscheduled = []
+    
+    for k, stop in enumerate(order):
+        if budget is not None and budget.tick():
+            unscheduled.extend(order[k:])
+            break
+        best_delta, best_t = None, None
+        for t in range(tour.n):
+            if tour.fits(t, (stop,)):
+                delta = tour.insertion_delta(stop, t)
+                if best_delta is None or delta < best_delta:
+                    best_delta, best_t = delta, t
+        if best_t is None:
+            unscheduled.append(stop)
+        else:
+            tour.insert(stop, best_t)
+    
+    return unscheduled
+
+
+def parse_windows(time_windows: Sequence[Optional[Sequence[float]]], service_times,
+                  n: int) -> Tuple[List[float], List[float], List[float]]:
+    """
+    Per-stop earliest/latest service starts and service times. A missing window
+    (None) leaves the stop unconstrained; `service_times` is one number for every
+    stop or a list with one per stop.
+    """
+    if len(time_windows) != n:
+        raise ValueError("time_windows must have one entry per location")
+    earliest, latest = [], []
+    for window in time_windows:
+        if window is None:
+            earliest.append(0.0)
+            latest.append(float('inf'))
+            continue
+        lo, hi = float(window[0]), float(window[1])
+        if lo > hi:
+            raise ValueError(f"Time window {list(window)} closes before it opens")
+        earliest.append(lo)
+        latest.append(hi)
+    
+    if service_times is None:
+        service = [0.0] * n
+    elif isinstance(service_times, (int, float)):
+        service = [float(service_times)] * n
+    else:
+        if len(service_times) != n:
+            raise ValueError("service_times must have one entry per location")
+        service = [float(value) for value in service_times]
+    return earliest, latest, service
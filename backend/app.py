@@ -1,9 +1,26 @@
-from flask import Flask, render_template, request, jsonify
+import json
+import math
+import os
+import numpy as np
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
 from backend.utils.geocoding import GeocodingService
 from backend.utils.routing import RoutingService
-from backend.algorithms.route_optimizer import RouteOptimizer
-from backend.algorithms.pathfinding import AStarPathfinder, DijkstraPathfinder, GreedyPathfinder
+from backend.algorithms.route_optimizer import DENSE_ONLY_ALGORITHMS, ROUTE_ALGORITHMS, RouteOptimizer, check_algorithm
+from backend.algorithms.spatial import DENSE_MATRIX_MAX_STOPS
+from backend.algorithms.geometry import GEOMETRY_FORMATS, render_geometry
+from backend.algorithms.fleet import FLEET_METHODS, FleetOptimizer
+from backend.algorithms.pathfinding import PATHFINDERS, EXPLORED_FORMATS, decode_grid
+from backend.algorithms.grid_matrix import grid_distance_matrix, grid_paths
+from backend.algorithms.grid_index import INDEX_ALGORITHMS
+from backend.utils.grid_index_cache import get_grid_index_cache
+from backend.utils.jobs import JobError, get_job_queue, request_key
+from backend.utils.batch import MAX_BATCH_ROUTES, RouteBatch
+from backend.utils.sessions import REPAIR_TIME_LIMIT_MS, RouteSession, get_session_store
+from backend.utils.metrics import (
+    SamplingProfiler, get_metrics, start_request, finish_request, finish_streamed_request, current_timer,
+    stage, tag, count
+)
 
 app = Flask(__name__, 
             template_folder='../frontend/templates',
@@ -12,22 +29,331 @@ CORS(app)
 
 geocoding_service = GeocodingService()
 routing_service = RoutingService()
+grid_indexes = get_grid_index_cache()
+job_queue = get_job_queue()
+route_sessions = get_session_store()
+metrics = get_metrics()
+# Lets a request ask for a sampling profile with ?profile=1 or an "X-Profile: 1" header.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_timing():
+    start_request(request.endpoint or 'unknown')
+    if PROFILING_ENABLED and '1' in (request.args.get('profile'), request.headers.get('X-Profile')):
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def finish_timing(response):
+    profiler = g.pop('profiler', None)
+    if response.is_streamed:
+        # The body hasn't run yet; the request is recorded once it has.
+        timer = current_timer()
+        if timer is not None:
+            response.response = finish_streamed_request(response.response, request.method, response.status_code)
+    else:
+        timer = finish_request(request.method, response.status_code)
+    if timer is None:
+        return response
+    if profiler is not None:
+        timer.profile = profiler.stop().report()
+        body = response.get_json(silent=True) if response.is_json and not response.is_streamed else None
+        if isinstance(body, dict):
+            body["profile"] = timer.profile
+            response.set_data(json.dumps(body))
+    response.headers['Server-Timing'] = timer.server_timing()
+    response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+def fetch_geometries(locations, legs):
+    with stage('geometry'):
+        return routing_service.get_route_geometries(locations, legs)
+
+def geometry_options(data) -> dict:
+    """
+    Road geometry output options from a JSON body or a query string: geometry_format and
+    simplification to simplify_zoom (a web map zoom level) or simplify_tolerance_m.
+    Raises ValueError for invalid values.
+    """
+    def number(name):
+        value = data.get(name)
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a number")
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"{name} must be a number")
+        return value
+    
+    geometry_format = data.get('geometry_format', 'coordinates')
+    if geometry_format not in GEOMETRY_FORMATS:
+        raise ValueError(f"geometry_format must be one of {', '.join(GEOMETRY_FORMATS)}")
+    zoom = number('simplify_zoom')
+    if zoom is not None and not 0 <= zoom <= 22:
+        raise ValueError("simplify_zoom must be between 0 and 22")
+    tolerance_m = number('simplify_tolerance_m')
+    if tolerance_m is not None and tolerance_m <= 0:
+        raise ValueError("simplify_tolerance_m must be a positive number")
+    return {"geometry_format": geometry_format, "zoom": zoom, "tolerance_m": tolerance_m}
+
+def algorithm_label(algorithm, known=ROUTE_ALGORITHMS, fallback: str = 'other') -> str:
+    """Metric label for an algorithm named in a request: unknown names share `fallback`, so series stay bounded."""
+    return algorithm if isinstance(algorithm, str) and algorithm in known else fallback
+
+def render_geometries(result: dict, options: dict) -> dict:
+    """Convert a route (or fleet) response's leg geometries to the requested format and detail."""
+    with stage('serialize'):
+        for holder in [result] + result.get('vehicles', []):
+            if holder.get('geometries'):
+                holder['geometries'] = [
+                    render_geometry(geometry, options['geometry_format'], options['tolerance_m'], options['zoom'])
+                    for geometry in holder['geometries']
+                ]
+    return result
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def plan_route(request_data: dict, job=None) -> dict:
+    """
+    Geocode, build the matrices and optimize one /api/optimize-route request. In async
+    mode `job` is told each stage and receives the best route so far while the search runs.
+    Raises JobError for problems with the request itself.
+    """
+    addresses = request_data['addresses']
+    time_windows = request_data['time_windows']
+    
+    if job is not None:
+        job.update(stage='geocoding')
+    with stage('geocode'):
+        geocoded_locations = geocoding_service.geocode_addresses(addresses)
+    
+    failed_locations = [loc for loc in geocoded_locations if not loc.get('success', False)]
+    if failed_locations:
+        raise JobError("Some addresses could not be geocoded", failed=failed_locations)
+    
+    # Too many stops for a dense matrix: search a k-nearest candidate graph and draw straight legs.
+    sparse = len(geocoded_locations) > DENSE_MATRIX_MAX_STOPS
+    if sparse and (time_windows or request_data['algorithm'] in DENSE_ONLY_ALGORITHMS or request_data['restarts'] > 1):
+        raise JobError(f"Routes with more than {DENSE_MATRIX_MAX_STOPS} stops support nearest_neighbor, "
+                       "two_opt, or_opt and simulated_annealing without restarts or time windows")
+    
+    if job is not None:
+        job.update(stage='matrix')
+    with stage('matrix'):
+        if sparse:
+            distance_matrix, geometry_cache = routing_service.get_candidate_matrix(geocoded_locations), {}
+        else:
+            distance_matrix, geometry_cache = routing_service.get_route_matrix(geocoded_locations,
+                                                                               mode=request_data['matrix_mode'])
+        duration_matrix = routing_service.get_duration_matrix(geocoded_locations) if time_windows else None
+    
+    on_progress = None
+    if job is not None:
+        job.update(stage='optimizing')
+        on_progress = lambda budget, route: job.report_best(
+            optimizer.route_summary(route), iterations=budget.iterations,
+            fraction=round(budget.elapsed_fraction(), 3) if budget.time_limit else None
+        )
+    optimizer = RouteOptimizer(
+        geocoded_locations, distance_matrix, geometry_cache,
+        geometry_fetcher=None if sparse else lambda legs: fetch_geometries(geocoded_locations, legs),
+        duration_matrix=duration_matrix, on_progress=on_progress
+    )
+    with stage('optimize'):
+        if time_windows:
+            try:
+                result = optimizer.optimize('time_windows', time_limit_ms=request_data['time_limit_ms'],
+                                            time_windows=time_windows, service_times=request_data['service_times'],
+                                            start_time=request_data['start_time'])
+            except (ValueError, TypeError, IndexError) as e:
+                raise JobError(f"Invalid time windows: {e}")
+        else:
+            result = optimizer.optimize(request_data['algorithm'], time_limit_ms=request_data['time_limit_ms'],
+                                        restarts=request_data['restarts'], **request_data['options'])
+    count('expansions', result.get('stats', {}).get('iterations', 0))
+    return render_geometries(result, request_data['geometry'])
+
+def time_limit_option(data: dict, default=None):
+    """
+    time_limit_ms from a request body: None (no limit) or a positive, finite number of
+    milliseconds. Raises ValueError for anything else, booleans, infinity and NaN included.
+    """
+    time_limit_ms = data.get('time_limit_ms', default)
+    if time_limit_ms is not None and (isinstance(time_limit_ms, bool) or not isinstance(time_limit_ms, (int, float))
+                                      or not 0 < time_limit_ms < math.inf):
+        raise ValueError("time_limit_ms must be a positive, finite number")
+    return time_limit_ms
+
+def route_request(data: dict) -> dict:
+    """
+    Validate one /api/optimize-route body and return the request_data plan_route takes.
+    Raises ValueError for invalid options.
+    """
+    addresses = data.get('addresses', [])
+    algorithm = data.get('algorithm', 'nearest_neighbor')
+    time_limit_ms = time_limit_option(data)
+    options = data.get('options', {})
+    restarts = data.get('restarts', 1)
+    time_windows = data.get('time_windows')
+    
+    if not addresses:
+        raise ValueError("No addresses provided")
+    
+    if not isinstance(restarts, int) or isinstance(restarts, bool) or restarts < 1:
+        raise ValueError("restarts must be a positive integer")
+    
+    if time_windows is not None and (not isinstance(time_windows, list) or len(time_windows) != len(addresses)):
+        raise ValueError("time_windows must list one [earliest, latest] window (or null) per address")
+    
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    
+    # With time_windows the route is planned by the time_windows algorithm whatever `algorithm` says.
+    if not time_windows:
+        check_algorithm(algorithm, restarts, options)
+    
+    return {
+        "addresses": addresses,
+        "algorithm": algorithm,
+        "matrix_mode": data.get('matrix_mode', 'table'),
+        "options": options,
+        "time_limit_ms": time_limit_ms,
+        "restarts": restarts,
+        "time_windows": time_windows,
+        "service_times": data.get('service_times'),
+        "start_time": data.get('start_time', 0),
+        "geometry": geometry_options(data)
+    }
+
 @app.route('/api/optimize-route', methods=['POST'])
 def optimize_route():
+    try:
+        data = request.get_json()
+        run_async = data.get('async', False)
+        
+        try:
+            request_data = route_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if not isinstance(run_async, bool):
+            return jsonify({"error": "async must be a boolean"}), 400
+        
+        tag(algorithm='time_windows' if request_data['time_windows'] else algorithm_label(request_data['algorithm']))
+        
+        if run_async:
+            job, deduplicated = job_queue.submit(request_key(request_data), lambda job: plan_route(request_data, job))
+            response = jsonify({"job_id": job.id, "status": job.status, "deduplicated": deduplicated})
+            response.headers['Location'] = f"/api/jobs/{job.id}"
+            return response, 202
+        
+        try:
+            result = plan_route(request_data)
+        except JobError as e:
+            return jsonify({"error": str(e), **e.details}), 400
+        
+        with stage('serialize'):
+            response = jsonify(result)
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/optimize-routes', methods=['POST'])
+def optimize_routes():
+    try:
+        data = request.get_json()
+        routes = data.get('routes')
+        # Everything but "routes" is a default for every route, e.g. a shared algorithm or time limit.
+        defaults = {name: value for name, value in data.items() if name != 'routes'}
+        
+        if not isinstance(routes, list) or not routes:
+            return jsonify({"error": "routes must be a non-empty list of route requests"}), 400
+        
+        if len(routes) > MAX_BATCH_ROUTES:
+            return jsonify({"error": f"At most {MAX_BATCH_ROUTES} routes per batch"}), 400
+        
+        batch_routes = []
+        for index, route in enumerate(routes):
+            if not isinstance(route, dict):
+                return jsonify({"error": f"routes[{index}] must be an object"}), 400
+            merged = {**defaults, **route}
+            try:
+                request_data = route_request(merged)
+            except ValueError as e:
+                return jsonify({"error": f"routes[{index}]: {e}"}), 400
+            # Each route is already one task on the process pool.
+            if request_data['restarts'] > 1:
+                return jsonify({"error": f"routes[{index}]: restarts are not supported in batches"}), 400
+            batch_routes.append({**request_data, "id": merged.get('id', index)})
+        
+        tag(algorithm=algorithm_label(defaults['algorithm']) if 'algorithm' in defaults else 'batch')
+        batch = RouteBatch(batch_routes, geocoding_service, routing_service)
+        
+        def lines():
+            for outcome in batch.results():
+                yield json.dumps(outcome) + "\n"
+            yield json.dumps({"summary": batch.summary}) + "\n"
+        
+        return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def job_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    lines = (json.dumps(snapshot) + "\n" for snapshot in job.events())
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+@app.route('/api/route-sessions', methods=['POST'])
+def create_route_session():
     try:
         data = request.get_json()
         addresses = data.get('addresses', [])
-        algorithm = data.get('algorithm', 'nearest_neighbor')
+        algorithm = data.get('algorithm', 'two_opt')
+        matrix_mode = data.get('matrix_mode', 'table')
+        options = data.get('options', {})
         
         if not addresses:
             return jsonify({"error": "No addresses provided"}), 400
         
-        geocoded_locations = geocoding_service.geocode_addresses(addresses)
+        if not isinstance(options, dict):
+            return jsonify({"error": "options must be an object"}), 400
+        
+        try:
+            time_limit_ms = time_limit_option(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        try:
+            geometry = geometry_options(data)
+            check_algorithm(algorithm, options=options)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        tag(algorithm=algorithm_label(algorithm))
+        with stage('geocode'):
+            geocoded_locations = geocoding_service.geocode_addresses(addresses)
         
         failed_locations = [loc for loc in geocoded_locations if not loc.get('success', False)]
         if failed_locations:
@@ -36,16 +362,197 @@ def optimize_route():
                 "failed": failed_locations
             }), 400
         
-        distance_matrix, geometry_cache = routing_service.get_route_matrix(geocoded_locations)
+        with stage('matrix'):
+            distance_matrix, geometry_cache = routing_service.get_route_matrix(geocoded_locations, mode=matrix_mode)
         
-        optimizer = RouteOptimizer(geocoded_locations, distance_matrix, geometry_cache)
-        result = optimizer.optimize(algorithm)
+        optimizer = RouteOptimizer(
+            geocoded_locations, distance_matrix, geometry_cache,
+            geometry_fetcher=lambda legs: fetch_geometries(geocoded_locations, legs)
+        )
+        with stage('optimize'):
+            result = optimizer.optimize(algorithm, time_limit_ms=time_limit_ms, **options)
+        count('expansions', result.get('stats', {}).get('iterations', 0))
         
-        return jsonify(result)
+        session = route_sessions.add(RouteSession(geocoded_locations, optimizer.distance_matrix,
+                                                  optimizer.route_indices, optimizer.geometry_cache,
+                                                  routing_service))
+        response = render_geometries(session.response(), geometry)
+        if "stats" in result:
+            response["stats"] = result["stats"]
+        with stage('serialize'):
+            response = jsonify(response)
+        return response, 201
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/route-sessions/<session_id>', methods=['GET', 'DELETE'])
+def route_session(session_id):
+    if request.method == 'DELETE':
+        if not route_sessions.delete(session_id):
+            return jsonify({"error": "Unknown session_id"}), 404
+        return jsonify({"deleted": session_id})
+    
+    session = route_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session_id"}), 404
+    try:
+        geometry = geometry_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with session.lock:
+        return jsonify(render_geometries(session.response(), geometry))
+
+@app.route('/api/route-sessions/<session_id>/stops', methods=['POST'])
+def add_session_stop(session_id):
+    try:
+        session = route_sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": "Unknown session_id"}), 404
+        
+        data = request.get_json()
+        address = data.get('address')
+        
+        if not isinstance(address, str) or not address.strip():
+            return jsonify({"error": "address must be a non-empty string"}), 400
+        
+        try:
+            time_limit_ms = time_limit_option(data, default=REPAIR_TIME_LIMIT_MS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        try:
+            geometry = geometry_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        tag(algorithm='incremental')
+        with stage('geocode'):
+            location = geocoding_service.geocode_addresses([address])[0]
+        if not location.get('success', False):
+            return jsonify({"error": "Address could not be geocoded", "failed": [location]}), 400
+        
+        with session.lock:
+            result = session.add_stop(location, time_limit_ms=time_limit_ms)
+        count('expansions', result["edit"]["iterations"])
+        return jsonify(render_geometries(result, geometry)), 201
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/route-sessions/<session_id>/stops/<int:stop_id>', methods=['DELETE'])
+def remove_session_stop(session_id, stop_id):
+    try:
+        session = route_sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": "Unknown session_id"}), 404
+        
+        try:
+            geometry = geometry_options(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        tag(algorithm='incremental')
+        try:
+            with session.lock:
+                result = session.remove_stop(stop_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if result is None:
+            return jsonify({"error": "Unknown stop_id"}), 404
+        count('expansions', result["edit"]["iterations"])
+        return jsonify(render_geometries(result, geometry))
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/optimize-fleet', methods=['POST'])
+def optimize_fleet():
+    try:
+        data = request.get_json()
+        addresses = data.get('addresses', [])
+        capacity = data.get('capacity')
+        demands = data.get('demands')
+        vehicles = data.get('vehicles')
+        method = data.get('method', 'savings')
+        return_to_depot = data.get('return_to_depot', True)
+        matrix_mode = data.get('matrix_mode', 'table')
+        
+        if not addresses:
+            return jsonify({"error": "No addresses provided"}), 400
+        
+        if isinstance(capacity, bool) or not isinstance(capacity, (int, float)) or not 0 < capacity < math.inf:
+            return jsonify({"error": "capacity must be a positive number"}), 400
+        
+        if demands is not None and (not isinstance(demands, list) or len(demands) != len(addresses)):
+            return jsonify({"error": "demands must list one number per address"}), 400
+        
+        # The depot's entry is ignored; every stop needs a real, non-negative demand.
+        if demands is not None and not all(isinstance(d, (int, float)) and not isinstance(d, bool) and 0 <= d < math.inf
+                                           for d in demands[1:]):
+            return jsonify({"error": "demands must be finite, non-negative numbers"}), 400
+        
+        if vehicles is not None and (isinstance(vehicles, bool) or not isinstance(vehicles, int) or vehicles < 1):
+            return jsonify({"error": "vehicles must be a positive integer"}), 400
+        
+        if not isinstance(return_to_depot, bool):
+            return jsonify({"error": "return_to_depot must be true or false"}), 400
+        
+        if method not in FLEET_METHODS:
+            return jsonify({"error": "method must be 'savings' or 'sweep'"}), 400
+        
+        try:
+            time_limit_ms = time_limit_option(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        try:
+            geometry = geometry_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        tag(algorithm=algorithm_label(method, FLEET_METHODS))
+        with stage('geocode'):
+            geocoded_locations = geocoding_service.geocode_addresses(addresses)
+        
+        failed_locations = [loc for loc in geocoded_locations if not loc.get('success', False)]
+        if failed_locations:
+            return jsonify({
+                "error": "Some addresses could not be geocoded",
+                "failed": failed_locations
+            }), 400
+        
+        with stage('matrix'):
+            distance_matrix, geometry_cache = routing_service.get_route_matrix(geocoded_locations, mode=matrix_mode)
+        
+        optimizer = FleetOptimizer(
+            geocoded_locations, distance_matrix, geometry_cache,
+            geometry_fetcher=lambda legs: fetch_geometries(geocoded_locations, legs)
+        )
+        with stage('optimize'):
+            try:
+                result = optimizer.optimize_fleet(capacity, demands=demands, vehicles=vehicles, method=method,
+                                                  return_to_depot=return_to_depot, time_limit_ms=time_limit_ms)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        count('expansions', result.get('stats', {}).get('iterations', 0))
+        
+        render_geometries(result, geometry)
+        with stage('serialize'):
+            response = jsonify(result)
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "geocode": geocoding_service.cache.stats(),
+        "legs": routing_service.leg_cache.stats(),
+        "grid_indexes": grid_indexes.stats()
+    })
+
 @app.route('/api/find-path', methods=['POST'])
 def find_path():
     try:
@@ -54,24 +561,177 @@ def find_path():
         start = data.get('start', {})
         end = data.get('end', {})
         algorithm = data.get('algorithm', 'astar')
+        explored = data.get('explored', 'cells')
+        diagonal = data.get('diagonal', False)
         
         if not grid or not start or not end:
             return jsonify({"error": "Invalid input data"}), 400
+        if explored not in EXPLORED_FORMATS + ('stream',):
+            return jsonify({"error": "explored must be one of: cells, packed, none, stream"}), 400
+        if not isinstance(diagonal, bool):
+            return jsonify({"error": "diagonal must be a boolean"}), 400
+        if not isinstance(algorithm, str) or algorithm not in PATHFINDERS:
+            return jsonify({"error": f"algorithm must be one of: {', '.join(PATHFINDERS)}"}), 400
+        
+        tag(algorithm=algorithm)
+        try:
+            with stage('decode'):
+                grid = decode_grid(grid)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid grid: {e}"}), 400
+        
+        pathfinder = PATHFINDERS[algorithm](grid, start, end, diagonal=diagonal)
+        
+        if explored == 'stream':
+            def lines():
+                for chunk in pathfinder.stream_path():
+                    yield json.dumps(chunk) + "\n"
+                count('expansions', pathfinder.expanded)
+            
+            return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+        
+        with stage('search'):
+            result = pathfinder.find_path(explored)
+        count('expansions', pathfinder.expanded)
+        
+        with stage('serialize'):
+            response = jsonify(result)
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/grids', methods=['POST'])
+def upload_grid():
+    try:
+        data = request.get_json()
+        grid = data.get('grid', [])
+        cluster_size = data.get('cluster_size', 16)
+        
+        if not grid:
+            return jsonify({"error": "Invalid grid"}), 400
+        if not isinstance(cluster_size, int) or isinstance(cluster_size, bool) or cluster_size < 2:
+            return jsonify({"error": "cluster_size must be an integer of at least 2"}), 400
+        
+        try:
+            with stage('decode'):
+                grid = decode_grid(grid)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid grid: {e}"}), 400
+        
+        index = grid_indexes.add(grid, cluster_size=cluster_size)
+        return jsonify(index.stats())
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/grids/<grid_id>/find-path', methods=['POST'])
+def find_path_on_grid(grid_id):
+    try:
+        data = request.get_json()
+        start = data.get('start', {})
+        end = data.get('end', {})
+        algorithm = data.get('algorithm', 'hpa')
+        explored = data.get('explored', 'cells')
+        diagonal = data.get('diagonal', False)
+        
+        if not start or not end:
+            return jsonify({"error": "Invalid input data"}), 400
+        if explored not in EXPLORED_FORMATS:
+            return jsonify({"error": "explored must be one of: cells, packed, none"}), 400
+        if not isinstance(diagonal, bool):
+            return jsonify({"error": "diagonal must be a boolean"}), 400
+        if not isinstance(algorithm, str) or algorithm not in INDEX_ALGORITHMS:
+            return jsonify({"error": f"algorithm must be one of: {', '.join(INDEX_ALGORITHMS)}"}), 400
+        
+        index = grid_indexes.get(grid_id)
+        if index is None:
+            return jsonify({"error": "Unknown grid_id; upload the grid to /api/grids first"}), 404
+        
+        tag(algorithm=algorithm)
+        with stage('search'):
+            result = index.find_path(start, end, algorithm, explored, diagonal=diagonal)
+        
+        with stage('serialize'):
+            response = jsonify(result)
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/grid-distance-matrix', methods=['POST'])
+def grid_matrix():
+    try:
+        data = request.get_json()
+        grid = data.get('grid')
+        grid_id = data.get('grid_id')
+        points = data.get('points', [])
+        paths = data.get('paths', False)
+        parallel = data.get('parallel')
+        algorithm = data.get('algorithm')
+        diagonal = data.get('diagonal', False)
+        
+        if not points or not isinstance(points, list):
+            return jsonify({"error": "No points provided"}), 400
+        if not all(isinstance(p, dict) and isinstance(p.get('x'), int) and isinstance(p.get('y'), int) for p in points):
+            return jsonify({"error": "points must be {x, y} objects with integer coordinates"}), 400
+        if parallel is not None and not isinstance(parallel, bool):
+            return jsonify({"error": "parallel must be a boolean"}), 400
+        if not isinstance(diagonal, bool):
+            return jsonify({"error": "diagonal must be a boolean"}), 400
+        try:
+            time_limit_ms = time_limit_option(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if algorithm:
+            try:
+                check_algorithm(algorithm)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        
+        if grid_id is not None:
+            index = grid_indexes.get(grid_id)
+            if index is None:
+                return jsonify({"error": "Unknown grid_id; upload the grid to /api/grids first"}), 404
+            grid = index.grid
+        elif not grid:
+            return jsonify({"error": "Provide a grid or a grid_id"}), 400
+        
+        tag(algorithm=algorithm_label(algorithm) if algorithm else 'none')
+        try:
+            with stage('decode'):
+                grid = decode_grid(grid)
+            with stage('matrix'):
+                matrix, legs, stats = grid_distance_matrix(grid, points, paths=bool(paths), parallel=parallel,
+                                                           diagonal=diagonal)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        pathfinders = {
-            'astar': AStarPathfinder,
-            'dijkstra': DijkstraPathfinder,
-            'greedy': GreedyPathfinder
+        reachable = bool(np.isfinite(matrix).all())
+        result = {
+            "matrix": [[value if math.isfinite(value) else None for value in row] for row in matrix.tolist()],
+            "reachable": reachable,
+            "stats": stats
         }
+        if paths:
+            result["paths"] = [[legs.get((i, j)) for j in range(len(points))] for i in range(len(points))]
         
-        pathfinder_class = pathfinders.get(algorithm, AStarPathfinder)
-        pathfinder = pathfinder_class(grid, start, end)
-        result = pathfinder.find_path()
+        if algorithm:
+            if not reachable:
+                return jsonify({"error": "Some points cannot reach each other", **result}), 400
+            optimizer = RouteOptimizer(points, matrix, legs,
+                                       geometry_fetcher=lambda tour_legs: grid_paths(grid, points, tour_legs, diagonal))
+            with stage('optimize'):
+                result["tour"] = optimizer.optimize(algorithm, time_limit_ms=time_limit_ms)
+            count('expansions', result["tour"].get('stats', {}).get('iterations', 0))
         
-        return jsonify(result)
+        with stage('serialize'):
+            response = jsonify(result)
+        return response
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=3000)
+    # Started from this module, every optimizer pool worker would import it again.
+    raise SystemExit("Start the server with: python -m backend")
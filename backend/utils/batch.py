@@ -0,0 +1,179 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List
+
+from backend.algorithms.geometry import render_geometry
+from backend.algorithms.parallel import get_executor, reset_executor, worker_count
+from backend.algorithms.route_optimizer import RouteOptimizer
+from backend.algorithms.spatial import DENSE_MATRIX_MAX_STOPS
+from backend.utils.jobs import JobError, request_key
+from backend.utils.metrics import stage
+
+# Routes accepted in one /api/optimize-routes request.
+MAX_BATCH_ROUTES = 1000
+
+def solve_route(locations: List[Dict], distance_matrix, duration_matrix, request: Dict) -> Dict:
+    """
+    Optimize one geocoded route on matrices built beforehand, leaving road geometries
+    to the caller. Runs in a pool worker, so it takes and returns only plain data;
+    the route's location indices come back as "route_indices".
+    """
+    optimizer = RouteOptimizer(locations, distance_matrix, duration_matrix=duration_matrix)
+    if request["time_windows"]:
+        try:
+            result = optimizer.optimize('time_windows', time_limit_ms=request["time_limit_ms"],
+                                        time_windows=request["time_windows"],
+                                        service_times=request["service_times"], start_time=request["start_time"])
+        except (ValueError, TypeError, IndexError) as e:
+            raise JobError(f"Invalid time windows: {e}")
+    else:
+        result = optimizer.optimize(request["algorithm"], time_limit_ms=request["time_limit_ms"], **request["options"])
+    result["route_indices"] = optimizer.route_indices
+    return result
+
+
+def _finished(fn: Callable, *args) -> Future:
+    """fn(*args) run here and now, as a completed future."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _failed(error: Exception) -> Future:
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+class RouteBatch:
+    """
+    Many independent routes (each an /api/optimize-route request) planned together.
+    All their addresses are geocoded in one pass, so a depot shared by every route is
+    looked up once; identical routes are solved once; matrices are built one route at
+    a time so legs shared between routes come out of the leg cache instead of OSRM;
+    and the searches run in parallel on the optimizer process pool.
+    """
+    
+    def __init__(self, routes: List[Dict], geocoding_service, routing_service):
+        self.routes = routes
+        self.geocoding_service = geocoding_service
+        self.routing_service = routing_service
+        self.summary: Dict = {}
+    
+    def results(self) -> Iterator[Dict]:
+        """
+        Each route's outcome as soon as it is ready, in completion order:
+        {"index", "id", "result"} or {"index", "id", "error", ...}. Afterwards
+        `summary` holds counts for the whole batch.
+        """
+        started = time.time()
+        leg_hits = self.routing_service.leg_cache.stats()["hits"]
+        addresses = [address for route in self.routes for address in route["addresses"]]
+        with stage('geocode'):
+            geocoded = self.geocoding_service.geocode_addresses(addresses)
+        
+        groups: Dict[str, List[int]] = {}
+        tasks = []
+        offset = 0
+        for index, route in enumerate(self.routes):
+            locations = geocoded[offset:offset + len(route["addresses"])]
+            offset += len(route["addresses"])
+            key = request_key({name: value for name, value in route.items() if name != 'id'})
+            if key not in groups:
+                groups[key] = []
+                tasks.append((key, route, locations))
+            groups[key].append(index)
+        
+        done: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+        futures: List[Future] = []
+        threading.Thread(target=self._submit, args=(tasks, done, cancelled, futures), daemon=True).start()
+        
+        failed = 0
+        try:
+            for _ in range(len(tasks)):
+                key, *solved = done.get()
+                outcome = self._outcome(*solved)
+                failed += len(groups[key]) if "error" in outcome else 0
+                for index in groups[key]:
+                    yield {"index": index, "id": self.routes[index].get("id"), **outcome}
+        finally:
+            # Also reached when the client goes away: stop building routes and drop queued searches.
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+        
+        self.summary = {
+            "routes": len(self.routes),
+            "solved": len(self.routes) - failed,
+            "failed": failed,
+            "deduplicated_routes": len(self.routes) - len(tasks),
+            "addresses": len(addresses),
+            "unique_addresses": len({self.geocoding_service.cache.normalize(address) for address in addresses}),
+            "leg_cache_hits": self.routing_service.leg_cache.stats()["hits"] - leg_hits,
+            "workers": worker_count(),
+            "elapsed_ms": round((time.time() - started) * 1000, 1)
+        }
+    
+    def _submit(self, tasks: List, done: queue.Queue, cancelled: threading.Event, futures: List[Future]):
+        """
+        Build each route's matrices in turn and hand it to the pool; every task ends up
+        on `done` as (key, route, locations, geometry_cache, future) once it finishes.
+        """
+        for key, route, locations in tasks:
+            if cancelled.is_set():
+                return
+            geometry_cache: Dict = {}
+            failed_locations = [loc for loc in locations if not loc.get('success', False)]
+            if failed_locations:
+                future = _failed(JobError("Some addresses could not be geocoded", failed=failed_locations))
+            elif len(locations) > DENSE_MATRIX_MAX_STOPS:
+                future = _failed(JobError(f"Routes with more than {DENSE_MATRIX_MAX_STOPS} stops "
+                                          "must use /api/optimize-route"))
+            else:
+                try:
+                    distance_matrix, geometry_cache = self.routing_service.get_route_matrix(
+                        locations, mode=route["matrix_mode"]
+                    )
+                    duration_matrix = (self.routing_service.get_duration_matrix(locations)
+                                       if route["time_windows"] else None)
+                    args = (locations, distance_matrix, duration_matrix, route)
+                    if worker_count() > 1:
+                        future = get_executor().submit(solve_route, *args)
+                    else:
+                        future = _finished(solve_route, *args)
+                except Exception as e:
+                    future = _failed(e)
+            futures.append(future)
+            future.add_done_callback(
+                lambda future, key=key, route=route, locations=locations, geometry_cache=geometry_cache:
+                    done.put((key, route, locations, geometry_cache, future))
+            )
+    
+    def _outcome(self, route: Dict, locations: List[Dict], geometry_cache: Dict, future: Future) -> Dict:
+        """A finished task's result with road geometries in the route's format, or its error."""
+        try:
+            result = future.result()
+        except JobError as e:
+            return {"error": str(e), **e.details}
+        except BrokenProcessPool as e:
+            reset_executor()
+            return {"error": f"Optimizer worker crashed: {e}"}
+        except Exception as e:
+            return {"error": str(e)}
+        
+        indices = result.pop("route_indices")
+        legs = list(zip(indices[:-1], indices[1:]))
+        missing = [leg for leg in legs if leg not in geometry_cache]
+        if missing:
+            with stage('geometry'):
+                geometry_cache.update(self.routing_service.get_route_geometries(locations, missing))
+        with stage('serialize'):
+            result["geometries"] = [render_geometry(geometry_cache[leg], **route["geometry"]) for leg in legs]
+        return {"result": result}
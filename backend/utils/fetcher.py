@@ -0,0 +1,133 @@
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.utils.metrics import record_upstream
+
+class TokenBucket:
+    """Thread-safe token bucket. A rate of 0 or less disables limiting."""
+    
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token up front; a negative balance is the caller's wait time.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RetryableHTTPError(Exception):
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitedFetcher:
+    """
+    Concurrent access to one upstream service: a token-bucket rate limit,
+    a pooled keep-alive session, bounded concurrency and retries with jittered backoff.
+    """
+    
+    def __init__(self, name: str, rate: float, burst: float = 1.0, max_concurrency: int = 4,
+                 retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0):
+        self.name = name
+        # Metrics label: the service part of names like "osrm:<url>".
+        self.upstream = name.split(':', 1)[0]
+        self.limiter = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=name)
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def call(self, fn: Callable, *args, retry_on: Tuple[Type[BaseException], ...] = (requests.RequestException,),
+             **kwargs) -> Any:
+        """Run fn under the rate limit, retrying `retry_on` errors with full-jitter exponential backoff."""
+        attempt = 0
+        while True:
+            with self.semaphore:
+                self.limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                    record_upstream(self.upstream, 'ok', time.perf_counter() - started)
+                    return result
+                except retry_on as e:
+                    final = attempt >= self.retries
+                    record_upstream(self.upstream, 'error' if final else 'retry', time.perf_counter() - started)
+                    if final:
+                        raise
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+                    retry_after = getattr(e, 'retry_after', None)
+                    if retry_after:
+                        delay = max(delay, float(retry_after))
+                except Exception:
+                    record_upstream(self.upstream, 'error', time.perf_counter() - started)
+                    raise
+            attempt += 1
+            time.sleep(delay)
+    
+    def get_json(self, url: str, params: Optional[Dict] = None, timeout: float = 10) -> Optional[Any]:
+        """GET a JSON document. Retries on connection errors, 429 and 5xx; returns None on other statuses."""
+        return self.call(self._get_json, url, params, timeout,
+                         retry_on=(requests.ConnectionError, requests.Timeout, RetryableHTTPError))
+    
+    def _get_json(self, url: str, params: Optional[Dict], timeout: float) -> Optional[Any]:
+        response = self.session.get(url, params=params, timeout=timeout)
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After')
+            raise RetryableHTTPError(
+                response.status_code,
+                float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        if response.status_code != 200:
+            return None
+        return response.json()
+    
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """Apply fn to every item on the worker pool, preserving order."""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        # Each call runs in a copy of the caller's context, so per-request metrics follow it onto the pool.
+        contexts = [contextvars.copy_context() for _ in items]
+        return list(self.executor.map(lambda context, item: context.run(fn, item), contexts, items))
+
+
+_fetchers: Dict[str, RateLimitedFetcher] = {}
+_fetchers_lock = threading.Lock()
+
+def get_fetcher(name: str, **options) -> RateLimitedFetcher:
+    """Return the process-wide fetcher for an upstream, creating it with `options` on first use."""
+    with _fetchers_lock:
+        if name not in _fetchers:
+            _fetchers[name] = RateLimitedFetcher(name, **options)
+        return _fetchers[name]
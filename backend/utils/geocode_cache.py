@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from backend.utils.metrics import record_cache
+
+class GeocodeCache:
+    """
+    Geocode results keyed on the normalized address.
+    An in-memory LRU sits in front of a SQLite table; entries expire after `ttl` seconds.
+    """
+    
+    def __init__(self, path: Optional[str] = None, ttl: float = 30 * 24 * 3600,
+                 max_memory_entries: int = 10000):
+        self.path = path or os.environ.get('GEOCODE_CACHE_PATH', 'geocode_cache.sqlite3')
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "key TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.db.commit()
+    
+    @staticmethod
+    def normalize(address: str) -> str:
+        """Case-fold and collapse whitespace so trivially different spellings share an entry."""
+        return ' '.join(address.replace(',', ', ').lower().split()).strip(' ,')
+    
+    def get(self, address: str) -> Optional[Dict]:
+        return self.get_many([address]).get(self.normalize(address))
+    
+    def get_many(self, addresses: List[str]) -> Dict[str, Dict]:
+        """Look up several addresses at once. Returns {normalized_address: {"lat", "lng"}} for hits."""
+        now = time.time()
+        keys = list(dict.fromkeys(self.normalize(addr) for addr in addresses))
+        found = {}
+        
+        with self.lock:
+            disk_keys = []
+            for key in keys:
+                entry = self.memory.get(key)
+                if entry is not None and entry['expires_at'] > now:
+                    self.memory.move_to_end(key)
+                    found[key] = entry
+                else:
+                    if entry is not None:
+                        del self.memory[key]
+                    disk_keys.append(key)
+            
+            # SQLite caps bound parameters per statement, so query the disk tier in batches.
+            for start in range(0, len(disk_keys), 500):
+                batch = disk_keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT key, lat, lng, expires_at FROM geocodes WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, lat, lng, expires_at in rows:
+                    if expires_at <= now:
+                        self.expired += 1
+                        continue
+                    entry = {'lat': lat, 'lng': lng, 'expires_at': expires_at}
+                    found[key] = entry
+                    self._remember(key, entry)
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        
+        record_cache('geocode', len(found), len(keys) - len(found))
+        return {key: {'lat': entry['lat'], 'lng': entry['lng']} for key, entry in found.items()}
+    
+    def set(self, address: str, lat: float, lng: float):
+        self.set_many([(address, lat, lng)])
+    
+    def set_many(self, entries: List[tuple]):
+        """Store (address, lat, lng) tuples."""
+        expires_at = time.time() + self.ttl
+        rows = [(self.normalize(address), lat, lng, expires_at) for address, lat, lng in entries]
+        
+        with self.lock:
+            for key, lat, lng, _ in rows:
+                self._remember(key, {'lat': lat, 'lng': lng, 'expires_at': expires_at})
+            self.db.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)", rows)
+            self.db.commit()
+    
+    def purge_expired(self) -> int:
+        """Delete expired rows from disk. Returns the number removed."""
+        with self.lock:
+            cursor = self.db.execute("DELETE FROM geocodes WHERE expires_at <= ?", (time.time(),))
+            self.db.commit()
+            return cursor.rowcount
+    
+    def _remember(self, key: str, entry: Dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": self.db.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+            }
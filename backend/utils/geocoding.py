@@ -1,17 +1,45 @@
-import time
+import os
+from typing import Optional
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderUnavailable, GeocoderRateLimited
+from backend.utils.geocode_cache import GeocodeCache
+from backend.utils.fetcher import RateLimitedFetcher, get_fetcher
 
 class GeocodingService:
-    def __init__(self):
-        self.geocoder = Nominatim(user_agent="delivery-route-optimizer")
-        self.delay = 1.0
+    def __init__(self, cache: Optional[GeocodeCache] = None, fetcher: Optional[RateLimitedFetcher] = None):
+        domain = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+        # Nominatim's usage policy allows 1 request/s; raise NOMINATIM_RATE for a self-hosted instance.
+        self.fetcher = fetcher or get_fetcher(
+            f"nominatim:{domain}",
+            rate=float(os.environ.get('NOMINATIM_RATE', '1')),
+            max_concurrency=int(os.environ.get('NOMINATIM_CONCURRENCY', '1'))
+        )
+        # Retries are handled by the fetcher, so geopy's own adapter must not retry.
+        self.geocoder = Nominatim(
+            user_agent="delivery-route-optimizer",
+            domain=domain,
+            adapter_factory=lambda proxies, ssl_context: RequestsAdapter(
+                proxies=proxies, ssl_context=ssl_context,
+                pool_maxsize=self.fetcher.max_concurrency, max_retries=0
+            )
+        )
+        self.cache = cache if cache is not None else GeocodeCache()
     
     def geocode_address(self, address):
+        cached = self.cache.get(address)
+        if cached:
+            return {"address": address, **cached, "success": True}
+        return self._geocode_remote(address)
+    
+    def _geocode_remote(self, address):
         try:
-            time.sleep(self.delay)
-            location = self.geocoder.geocode(address, timeout=10)
+            location = self.fetcher.call(
+                self.geocoder.geocode, address, timeout=10,
+                retry_on=(GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited)
+            )
             if location:
+                self.cache.set(address, location.latitude, location.longitude)
                 return {
                     "address": address,
                     "lat": location.latitude,
@@ -32,8 +60,26 @@ class GeocodingService:
             }
     
     def geocode_addresses(self, addresses):
+        """
+        Geocode a list of addresses, answering cache hits immediately.
+        Only cache misses go to Nominatim, concurrently within the fetcher's rate limit,
+        and each distinct address is looked up once.
+        """
+        cached = self.cache.get_many(addresses)
+        misses = {}
+        
+        for addr in addresses:
+            key = self.cache.normalize(addr)
+            if key not in cached and key not in misses:
+                misses[key] = addr
+        
+        remote = dict(zip(misses, self.fetcher.map(self._geocode_remote, misses.values())))
+        
         results = []
         for addr in addresses:
-            result = self.geocode_address(addr)
-            results.append(result)
+            key = self.cache.normalize(addr)
+            if key in cached:
+                results.append({"address": addr, **cached[key], "success": True})
+            else:
+                results.append({**remote[key], "address": addr})
         return results
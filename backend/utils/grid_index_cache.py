@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from backend.algorithms.grid_index import GridIndex, grid_key
+from backend.algorithms.pathfinding import Grid
+from backend.utils.metrics import record_cache, stage
+
+class GridIndexCache:
+    """
+    Built GridIndex objects keyed by a hash of the grid layout, with LRU eviction.
+    Uploading the same grid twice returns the index that is already built.
+    """
+    
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def add(self, cells, cluster_size: int = 16) -> GridIndex:
+        """Return the index for `cells` (a list of rows or a Grid), building it if this layout is new."""
+        grid = cells if isinstance(cells, Grid) else Grid(cells)
+        key = grid_key(grid)
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is not None and index.cluster_size == max(2, cluster_size):
+                self.indexes.move_to_end(key)
+                self.hits += 1
+                record_cache('grid_indexes', 1, 0)
+                return index
+            self.misses += 1
+        record_cache('grid_indexes', 0, 1)
+        
+        # Built outside the lock so other lookups aren't held up by a large grid.
+        with stage('index_build'):
+            index = GridIndex(grid, cluster_size=cluster_size)
+        with self.lock:
+            self.indexes[key] = index
+            self.indexes.move_to_end(key)
+            while len(self.indexes) > self.max_entries:
+                self.indexes.popitem(last=False)
+                self.evictions += 1
+        return index
+    
+    def get(self, key: str) -> Optional[GridIndex]:
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is not None:
+                self.indexes.move_to_end(key)
+        record_cache('grid_indexes', index is not None, index is None)
+        return index
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.indexes)
+            }
+
+
+_grid_index_cache: Optional[GridIndexCache] = None
+_grid_index_cache_lock = threading.Lock()
+
+def get_grid_index_cache() -> GridIndexCache:
+    """Return the process-wide grid index cache, sized by GRID_INDEX_CACHE_SIZE."""
+    global _grid_index_cache
+    with _grid_index_cache_lock:
+        if _grid_index_cache is None:
+            _grid_index_cache = GridIndexCache(max_entries=int(os.environ.get('GRID_INDEX_CACHE_SIZE', '32')))
+        return _grid_index_cache
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+class JobError(Exception):
+    """A job failure to report to the client as-is (e.g. addresses that could not be geocoded)."""
+    
+    def __init__(self, message: str, **details):
+        super().__init__(message)
+        self.details = details
+
+
+def request_key(payload: Dict) -> str:
+    """Hash of a request body with its keys sorted, so identical requests share a key."""
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Job:
+    """
+    One queued computation: its status and stage, progress counters, the best result
+    so far and finally the result or error. Every update bumps `version` and wakes
+    anyone waiting for a change.
+    """
+    
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.stage = None
+        self.progress: Dict = {}
+        self.best: Optional[Dict] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[Dict] = None
+        self.created = time.time()
+        self.updated = self.created
+        self.finished: Optional[float] = None
+        self.version = 0
+        self.changed = threading.Condition()
+    
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated = time.time()
+            if self.status in FINISHED and self.finished is None:
+                self.finished = self.updated
+            self.version += 1
+            self.changed.notify_all()
+    
+    def report_best(self, best: Dict, **progress):
+        """Record a best-so-far result, keeping the old one if it was shorter."""
+        with self.changed:
+            if self.best is None or best["total_distance"] <= self.best["total_distance"]:
+                self.best = best
+            self.progress = {**self.progress, **progress, "best_distance": self.best["total_distance"]}
+            self.updated = time.time()
+            self.version += 1
+            self.changed.notify_all()
+    
+    def snapshot(self) -> Dict:
+        with self.changed:
+            snapshot = {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "created": self.created,
+                "elapsed_ms": round(((self.finished or time.time()) - self.created) * 1000, 1),
+                "progress": dict(self.progress)
+            }
+            if self.status == DONE:
+                snapshot["result"] = self.result
+            elif self.best is not None:
+                snapshot["best"] = self.best
+            if self.error is not None:
+                snapshot["error"] = self.error
+            return snapshot
+    
+    def events(self, heartbeat: float = 15.0) -> Iterator[Dict]:
+        """Snapshots as the job changes (or every `heartbeat` seconds), ending with the finished job."""
+        seen = -1
+        while True:
+            with self.changed:
+                if self.version == seen and self.status not in FINISHED:
+                    self.changed.wait(heartbeat)
+                seen = self.version
+            snapshot = self.snapshot()
+            yield snapshot
+            if snapshot["status"] in FINISHED:
+                return
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a thread pool and keeps them for polling. Submitting a key
+    that is already queued or running returns that job instead of starting another,
+    so concurrent identical requests share one computation. Finished jobs are kept
+    for `ttl` seconds.
+    """
+    
+    def __init__(self, workers: int = 2, ttl: float = 600.0):
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self.jobs: Dict[str, Job] = {}
+        self.in_flight: Dict[str, Job] = {}
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+    
+    def submit(self, key: str, work: Callable[[Job], Dict]) -> Tuple[Job, bool]:
+        """
+        Queue work(job), whose return value becomes the job's result. Returns the job
+        and whether it was an identical job already in flight.
+        """
+        with self.lock:
+            self._purge()
+            job = self.in_flight.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job, True
+            job = Job(key)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            self.submitted += 1
+        self.executor.submit(self._run, job, work)
+        return job, False
+    
+    def _run(self, job: Job, work: Callable[[Job], Dict]):
+        job.update(status=RUNNING)
+        try:
+            job.update(status=DONE, stage=None, result=work(job))
+        except JobError as e:
+            job.update(status=FAILED, error={"message": str(e), **e.details})
+        except Exception as e:
+            job.update(status=FAILED, error={"message": str(e)})
+        finally:
+            with self.lock:
+                if self.in_flight.get(job.key) is job:
+                    del self.in_flight[job.key]
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+            del self.jobs[job_id]
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+            return {
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                **{status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED)}
+            }
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, sized by JOB_WORKERS and JOB_TTL_SECONDS."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(workers=int(os.environ.get('JOB_WORKERS', '2')),
+                                  ttl=float(os.environ.get('JOB_TTL_SECONDS', '600')))
+        return _job_queue
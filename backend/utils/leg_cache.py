@@ -0,0 +1,167 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from backend.algorithms.geometry import as_polyline
+from backend.utils.metrics import record_cache
+
+class LegCache:
+    """
+    Road legs (distance, duration, geometry) keyed by a pair of rounded coordinates.
+    Geometries are kept as encoded polylines, several times smaller than point lists.
+    Memory is bounded by an approximate byte budget with LRU eviction; pass `path`
+    to write legs through to SQLite so they survive restarts.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, precision: int = 5, path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.memory = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS legs ("
+                "key TEXT PRIMARY KEY, distance REAL, duration REAL, geometry TEXT)"
+            )
+            self.db.commit()
+    
+    def key(self, loc1: Dict, loc2: Dict) -> Tuple:
+        p = self.precision
+        return (round(loc1['lat'], p), round(loc1['lng'], p), round(loc2['lat'], p), round(loc2['lng'], p))
+    
+    def get(self, loc1: Dict, loc2: Dict) -> Optional[Dict]:
+        return self.get_many([(loc1, loc2)])[0]
+    
+    def get_many(self, pairs: List[Tuple[Dict, Dict]]) -> List[Optional[Dict]]:
+        """Look up (from, to) location pairs. Returns one leg dict or None per pair."""
+        keys = [self.key(loc1, loc2) for loc1, loc2 in pairs]
+        
+        with self.lock:
+            found = {}
+            disk_keys = {}
+            for key in keys:
+                leg = self.memory.get(key)
+                if leg is not None:
+                    self.memory.move_to_end(key)
+                    found[key] = leg
+                elif self.db is not None:
+                    disk_keys[self._db_key(key)] = key
+            
+            # SQLite caps bound parameters per statement, so query the disk tier in batches.
+            db_keys = list(disk_keys)
+            for start in range(0, len(db_keys), 500):
+                batch = db_keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT key, distance, duration, geometry FROM legs WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for db_key, distance, duration, geometry in rows:
+                    key = disk_keys[db_key]
+                    leg = {'distance': distance, 'duration': duration, 'geometry': self._load_geometry(geometry)}
+                    found[key] = leg
+                    self._remember(key, leg)
+            
+            results = [found.get(key) for key in keys]
+            hits = sum(leg is not None for leg in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        
+        record_cache('legs', hits, len(results) - hits)
+        return results
+    
+    def put(self, loc1: Dict, loc2: Dict, distance: Optional[float] = None,
+            duration: Optional[float] = None, geometry: Optional[List] = None):
+        """Store or extend a leg; fields left as None keep any value already cached."""
+        self.put_many([(loc1, loc2, distance, duration, geometry)])
+    
+    def put_many(self, legs: List[Tuple]):
+        """Store (loc1, loc2, distance, duration, geometry) tuples."""
+        with self.lock:
+            rows = []
+            for loc1, loc2, distance, duration, geometry in legs:
+                key = self.key(loc1, loc2)
+                leg = dict(self.memory.get(key) or {'distance': None, 'duration': None, 'geometry': None})
+                if distance is not None:
+                    leg['distance'] = distance
+                if duration is not None:
+                    leg['duration'] = duration
+                if geometry is not None:
+                    leg['geometry'] = as_polyline(geometry)
+                self._remember(key, leg)
+                rows.append((self._db_key(key), leg['distance'], leg['duration'], leg['geometry'] or None))
+            
+            if self.db is not None and rows:
+                # COALESCE keeps fields already on disk that this write doesn't know about.
+                self.db.executemany(
+                    "INSERT INTO legs VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "distance = COALESCE(excluded.distance, distance), "
+                    "duration = COALESCE(excluded.duration, duration), "
+                    "geometry = COALESCE(excluded.geometry, geometry)",
+                    rows
+                )
+                self.db.commit()
+    
+    @staticmethod
+    def _load_geometry(stored: Optional[str]) -> Optional[str]:
+        # Rows written before geometries were encoded hold JSON point lists.
+        if not stored:
+            return None
+        return as_polyline(json.loads(stored)) if stored.startswith('[') else stored
+    
+    def _db_key(self, key: Tuple) -> str:
+        return ','.join(f"{value:.{self.precision}f}" for value in key)
+    
+    def _remember(self, key: Tuple, leg: Dict):
+        if key in self.memory:
+            self.current_bytes -= self._size(self.memory[key])
+        self.memory[key] = leg
+        self.memory.move_to_end(key)
+        self.current_bytes += self._size(leg)
+        
+        while self.current_bytes > self.max_bytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.current_bytes -= self._size(evicted)
+            self.evictions += 1
+    
+    @staticmethod
+    def _size(leg: Dict) -> int:
+        """Rough footprint in bytes: the entry itself plus the encoded geometry string."""
+        geometry = leg.get('geometry')
+        return 400 + (49 + len(geometry) if geometry else 0)
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.current_bytes
+            }
+
+
+_leg_cache: Optional[LegCache] = None
+_leg_cache_lock = threading.Lock()
+
+def get_leg_cache() -> LegCache:
+    """Return the process-wide leg cache, configured from LEG_CACHE_MAX_MB and LEG_CACHE_PATH."""
+    global _leg_cache
+    with _leg_cache_lock:
+        if _leg_cache is None:
+            _leg_cache = LegCache(
+                max_bytes=int(float(os.environ.get('LEG_CACHE_MAX_MB', '64')) * 1024 * 1024),
+                path=os.environ.get('LEG_CACHE_PATH') or None
+            )
+        return _leg_cache
@@ -0,0 +1,326 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Dict, Optional, Sequence, Tuple
+
+# Latency buckets in seconds: 5 ms for cache hits up to a minute for long optimizations.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class CounterMetric:
+    """A Prometheus counter family: one running total per combination of label values."""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, labels: Sequence[str], value: float = 1.0):
+        key = tuple(str(label) for label in labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+    
+    def samples(self) -> List[Tuple[str, Tuple, float]]:
+        with self.lock:
+            return [(self.name + '_total', key, value) for key, value in sorted(self.values.items())]
+
+
+class HistogramMetric:
+    """A Prometheus histogram family with cumulative `le` buckets, a sum and a count per label set."""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], List] = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, labels: Sequence[str], value: float):
+        key = tuple(str(label) for label in labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then sum and count.
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][slot] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    def samples(self) -> List[Tuple[str, Tuple, float]]:
+        rows = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket
+                    rows.append((self.name + '_bucket', key + (_format_bound(bound),), cumulative))
+                rows.append((self.name + '_sum', key, total))
+                rows.append((self.name + '_count', key, count))
+        return rows
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Process-wide request metrics, rendered in the Prometheus text format for /metrics.
+    Labels are endpoint and algorithm names, never raw paths or user input, so the
+    number of series stays bounded.
+    """
+    
+    def __init__(self):
+        self.requests = CounterMetric('optimizer_http_requests', "HTTP requests served",
+                                      ('endpoint', 'method', 'status'))
+        self.latency = HistogramMetric('optimizer_http_request_duration_seconds', "Request latency",
+                                       ('endpoint', 'algorithm'))
+        self.stages = HistogramMetric('optimizer_stage_duration_seconds', "Time spent per request stage",
+                                      ('endpoint', 'stage'))
+        self.upstream_calls = CounterMetric('optimizer_upstream_calls', "Calls to geocoding and routing services",
+                                            ('upstream', 'outcome'))
+        self.upstream_latency = HistogramMetric('optimizer_upstream_duration_seconds', "Upstream call latency",
+                                                ('upstream',))
+        self.cache_lookups = CounterMetric('optimizer_cache_lookups', "Cache lookups by result",
+                                           ('cache', 'result'))
+        self.expansions = CounterMetric('optimizer_search_expansions', "Search iterations or expanded grid cells",
+                                        ('endpoint', 'algorithm'))
+        self.families = [self.requests, self.latency, self.stages, self.upstream_calls,
+                         self.upstream_latency, self.cache_lookups, self.expansions]
+    
+    def render(self) -> str:
+        lines = []
+        for family in self.families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            names = family.labelnames + (('le',) if family.kind == 'histogram' else ())
+            for sample, labels, value in family.samples():
+                pairs = ','.join(f'{name}="{_escape(label)}"' for name, label in zip(names, labels))
+                number = int(value) if float(value).is_integer() else value
+                lines.append(f"{sample}{{{pairs}}} {number}" if pairs else f"{sample} {number}")
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """
+    Stage timings, counts and labels for one request. Stage times are exclusive: a
+    stage opened inside another (e.g. geometry fetches during optimization) is taken
+    out of the outer one, so the stages add up to the time spent in them.
+    """
+    
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.labels = {"algorithm": "none"}
+        self.stages: Dict[str, float] = {}
+        self.counts = Counter()
+        self.started = time.perf_counter()
+        self.profile: Optional[Dict] = None
+        self._open = []
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name: str):
+        frame = [name, time.perf_counter(), 0.0]
+        self._open.append(frame)
+        try:
+            yield
+        finally:
+            self._open.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[2]
+            if self._open:
+                self._open[-1][2] += elapsed
+    
+    def count(self, name: str, value: int = 1):
+        # Upstream calls are counted from the fetcher's worker threads.
+        with self.lock:
+            self.counts[name] += value
+    
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value: stage durations in ms, then counts as descriptions."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        with self.lock:
+            entries += [f'{name};desc="{value}"' for name, value in sorted(self.counts.items())]
+        if self.profile is not None:
+            entries.append(f'profile;desc="{self.profile["samples"]} samples"')
+        return ', '.join(entries)
+
+
+_registry = MetricsRegistry()
+_current: contextvars.ContextVar = contextvars.ContextVar('request_timer', default=None)
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _current.get()
+
+
+def start_request(endpoint: str) -> RequestTimer:
+    timer = RequestTimer(endpoint)
+    _current.set(timer)
+    return timer
+
+
+def finish_request(method: str, status: int) -> Optional[RequestTimer]:
+    """Record the current request's latency and stages in the registry and detach its timer."""
+    timer = _current.get()
+    if timer is None:
+        return None
+    _current.set(None)
+    _record(timer, method, status)
+    return timer
+
+
+def finish_streamed_request(body: Iterable, method: str, status: int) -> Iterator:
+    """
+    Wrap a streamed response body so the current request is recorded when the body
+    is exhausted or closed (status 500 if it fails partway), not when its headers
+    go out. The body runs with the request's timer current, so its stages count.
+    """
+    timer = _current.get()
+    _current.set(None)
+    return _timed_body(timer, body, method, status)
+
+
+def _timed_body(timer: Optional[RequestTimer], body: Iterable, method: str, status: int) -> Iterator:
+    chunks = iter(body)
+    try:
+        while True:
+            # Current only while a chunk is produced: the server may serve others on this thread in between.
+            _current.set(timer)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                _current.set(None)
+            yield chunk
+    except Exception:
+        status = 500
+        raise
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+        if timer is not None:
+            _record(timer, method, status)
+
+
+def _record(timer: RequestTimer, method: str, status: int):
+    _registry.requests.inc((timer.endpoint, method, status))
+    _registry.latency.observe((timer.endpoint, timer.labels["algorithm"]), timer.elapsed())
+    for name, seconds in timer.stages.items():
+        _registry.stages.observe((timer.endpoint, name), seconds)
+    if timer.counts.get("expansions"):
+        _registry.expansions.inc((timer.endpoint, timer.labels["algorithm"]), timer.counts["expansions"])
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request; a no-op outside a request."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def tag(**labels):
+    timer = _current.get()
+    if timer is not None:
+        timer.labels.update({key: str(value) for key, value in labels.items()})
+
+
+def count(name: str, value: int = 1):
+    timer = _current.get()
+    if timer is not None and value:
+        timer.count(name, value)
+
+
+def record_cache(cache: str, hits: int, misses: int):
+    """Count cache lookups, process-wide and on the current request."""
+    if hits:
+        _registry.cache_lookups.inc((cache, 'hit'), hits)
+    if misses:
+        _registry.cache_lookups.inc((cache, 'miss'), misses)
+    count('cache_hits', hits)
+    count('cache_misses', misses)
+
+
+def record_upstream(upstream: str, outcome: str, seconds: float):
+    """Count one upstream call attempt (retries included) and its latency."""
+    _registry.upstream_calls.inc((upstream, outcome))
+    _registry.upstream_latency.observe((upstream,), seconds)
+    count('upstream_calls')
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a background
+    thread and tallies the stacks, which costs the profiled code nothing between
+    samples. Only the sampled thread is seen: time it spends waiting on pool
+    workers shows up as the wait.
+    """
+    
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005, max_depth: int = 40):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+    
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+    
+    def stop(self) -> 'SamplingProfiler':
+        self._stop.set()
+        self._thread.join()
+        return self
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+    
+    def report(self, limit: int = 30) -> Dict:
+        """The most frequent stacks in collapsed (flame graph) form, root first."""
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "stacks": [{"stack": stack, "count": n} for stack, n in self.stacks.most_common(limit)]
+        }
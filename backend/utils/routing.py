@@ -1,88 +1,396 @@
-import requests
-import time
+import os
+import numpy as np
 from typing import List, Dict, Tuple, Optional
+from backend.algorithms.distance_matrix import haversine_distance, haversine_matrix
+from backend.algorithms.geometry import encode_polyline
+from backend.algorithms.spatial import SparseDistances
+from backend.algorithms.time_windows import travel_time_matrix
+from backend.utils.fetcher import RateLimitedFetcher, get_fetcher
+from backend.utils.leg_cache import LegCache, get_leg_cache
 
 class RoutingService:
-    def __init__(self):
-        self.osrm_base_url = "http://router.project-osrm.org/route/v1/driving"
-        self.delay = 0.5
+    def __init__(self, osrm_url: Optional[str] = None, max_table_size: int = 100,
+                 fetcher: Optional[RateLimitedFetcher] = None, leg_cache: Optional[LegCache] = None):
+        # OSRM_URL lets the service point at a self-hosted or stub OSRM server.
+        self.osrm_url = (osrm_url or os.environ.get('OSRM_URL', 'http://router.project-osrm.org')).rstrip('/')
+        self.osrm_base_url = f"{self.osrm_url}/route/v1/driving"
+        self.osrm_table_url = f"{self.osrm_url}/table/v1/driving"
+        # The public OSRM server rejects /table requests with more than 100 coordinates.
+        self.max_table_size = max_table_size
+        # Defaults keep the public demo server at 2 requests/s; set OSRM_RATE=0 for a self-hosted backend.
+        self.fetcher = fetcher or get_fetcher(
+            f"osrm:{self.osrm_url}",
+            rate=float(os.environ.get('OSRM_RATE', '2')),
+            max_concurrency=int(os.environ.get('OSRM_CONCURRENCY', '4'))
+        )
+        # Legs are shared across requests (and RoutingService instances) through the process-wide cache.
+        self.leg_cache = leg_cache if leg_cache is not None else get_leg_cache()
     
     def get_route(self, loc1: Dict, loc2: Dict) -> Optional[Dict]:
         """
         Get route between two locations using OSRM API.
-        Returns route geometry and distance in kilometers.
+        Returns the route geometry as an encoded polyline and the distance in kilometers.
         """
         try:
-            time.sleep(self.delay)
-            
             coords = f"{loc1['lng']},{loc1['lat']};{loc2['lng']},{loc2['lat']}"
             url = f"{self.osrm_base_url}/{coords}"
             params = {
                 'overview': 'full',
-                'geometries': 'geojson',
+                'geometries': 'polyline',
                 'steps': 'false'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            data = self.fetcher.get_json(url, params=params, timeout=10)
             
-            if response.status_code == 200:
-                data = response.json()
+            if data:
                 if data.get('code') == 'Ok' and data.get('routes'):
                     route = data['routes'][0]
                     distance_km = route['distance'] / 1000
-                    geometry = route['geometry']['coordinates']
+                    geometry = route['geometry']
+                    self.leg_cache.put(loc1, loc2, distance_km, route.get('duration'), geometry)
                     
                     return {
                         'distance': distance_km,
-                        'geometry': [[coord[1], coord[0]] for coord in geometry],
+                        'geometry': geometry,
                         'success': True
                     }
             
             return None
+        
+        except Exception as e:
+            return None
+    
+    def get_table(self, locations: List[Dict], sources: Optional[List[int]] = None,
+                  destinations: Optional[List[int]] = None) -> Optional[Dict]:
+        """
+        Get a distance/duration table for the given locations with one OSRM /table call.
+        `sources` and `destinations` index into `locations`; both default to all of them.
+        Distances are in kilometers, durations in seconds; unreachable pairs are None.
+        """
+        try:
+            coords = ';'.join(f"{loc['lng']},{loc['lat']}" for loc in locations)
+            # Index lists are appended verbatim: OSRM expects literal ';' separators.
+            query = ['annotations=distance,duration']
+            if sources is not None:
+                query.append('sources=' + ';'.join(str(i) for i in sources))
+            if destinations is not None:
+                query.append('destinations=' + ';'.join(str(j) for j in destinations))
+            url = f"{self.osrm_table_url}/{coords}?{'&'.join(query)}"
+            
+            data = self.fetcher.get_json(url, timeout=30)
             
+            if data:
+                if data.get('code') == 'Ok' and data.get('distances'):
+                    return {
+                        'distances': [[d / 1000 if d is not None else None for d in row]
+                                      for row in data['distances']],
+                        'durations': data.get('durations'),
+                        'success': True
+                    }
+            
+            return None
+        
         except Exception as e:
             return None
     
-    def get_route_matrix(self, locations: List[Dict]) -> Tuple[List[List[float]], Dict]:
+    def get_route_matrix(self, locations: List[Dict], mode: str = "table") -> Tuple[np.ndarray, Dict]:
         """
-        Calculate distance matrix and store all route geometries.
+        Calculate distance matrix for all location pairs.
         Returns (distance_matrix, geometry_cache).
+        
+        In "table" mode distances come from the leg cache and batched OSRM /table requests
+        for the pairs it lacks; the geometry cache holds only already-cached geometries, so
+        use get_route_geometries to fetch the legs the optimizer picks. "pairwise" mode
+        issues one /route call per ordered pair.
         """
+        if mode == "pairwise":
+            return self._pairwise_route_matrix(locations)
+        
         n = len(locations)
-        distance_matrix = [[0.0 for _ in range(n)] for _ in range(n)]
+        # Straight-line distances are the fallback for any pair OSRM can't answer.
+        distance_matrix = haversine_matrix(locations)
         geometry_cache = {}
         
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    route = self.get_route(locations[i], locations[j])
-                    if route and route['success']:
-                        distance_matrix[i][j] = route['distance']
-                        geometry_cache[(i, j)] = route['geometry']
-                    else:
-                        distance_matrix[i][j] = self._haversine_distance(locations[i], locations[j])
-                        geometry_cache[(i, j)] = [
-                            [locations[i]['lat'], locations[i]['lng']],
-                            [locations[j]['lat'], locations[j]['lng']]
-                        ]
+        if n < 2:
+            return distance_matrix, geometry_cache
+        
+        pairs = [(i, j) for i in range(n) for j in range(n) if i != j]
+        legs = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in pairs])
+        missing = []
+        
+        for (i, j), leg in zip(pairs, legs):
+            if leg and leg['distance'] is not None:
+                distance_matrix[i, j] = leg['distance']
+                if leg['geometry']:
+                    geometry_cache[(i, j)] = leg['geometry']
+            else:
+                missing.append((i, j))
+        
+        if missing:
+            self._fetch_missing_legs(locations, missing, distance_matrix=distance_matrix)
         
         return distance_matrix, geometry_cache
     
-    def _haversine_distance(self, loc1: Dict, loc2: Dict) -> float:
-        """Fallback to straight-line distance if routing fails."""
-        import math
+    def get_duration_matrix(self, locations: List[Dict]) -> np.ndarray:
+        """
+        Travel times in seconds for all location pairs, from the leg cache and OSRM /table
+        requests for the pairs it lacks. After get_route_matrix in "table" mode every
+        reachable pair is already cached. Pairs OSRM can't answer fall back to the
+        straight-line distance at FALLBACK_SPEED_KMH.
+        """
+        n = len(locations)
+        duration_matrix = travel_time_matrix(haversine_matrix(locations))
+        if n < 2:
+            return duration_matrix
+        
+        pairs = [(i, j) for i in range(n) for j in range(n) if i != j]
+        legs = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in pairs])
+        missing = []
+        
+        for (i, j), leg in zip(pairs, legs):
+            if leg and leg['duration'] is not None:
+                duration_matrix[i, j] = leg['duration']
+            else:
+                missing.append((i, j))
+        
+        if missing:
+            self._fetch_missing_legs(locations, missing, duration_matrix=duration_matrix)
+        
+        return duration_matrix
+    
+    def _fetch_missing_legs(self, locations: List[Dict], missing: List[Tuple[int, int]],
+                            distance_matrix: Optional[np.ndarray] = None,
+                            duration_matrix: Optional[np.ndarray] = None) -> Dict[Tuple[int, int], float]:
+        """
+        Fill the missing (i, j) entries of distance_matrix and/or duration_matrix from OSRM /table requests,
+        and return the distances fetched for the missing pairs.
+        The missing pairs are covered by a small set of stops, and tables run from those
+        stops to everyone and from everyone else back to them: adding one stop to a
+        cached route costs 2N table cells instead of N².
+        """
+        n = len(locations)
+        cover = self._pair_cover(missing)
+        if len(cover) >= n - 1:
+            cover = list(range(n))
+        covered = set(cover)
+        others = [k for k in range(n) if k not in covered]
+        
+        blocks = self._table_blocks(cover, list(range(n)))
+        if others:
+            blocks += self._table_blocks(others, cover)
+        tables = self.fetcher.map(lambda block: self._get_table_block(locations, *block), blocks)
+        
+        fetched = []
+        distances = {}
+        wanted = set(missing)
+        for (rows, cols), table in zip(blocks, tables):
+            for a, i in enumerate(rows):
+                for b, j in enumerate(cols):
+                    if i == j:
+                        continue
+                    distance = table['distances'][a][b] if table else None
+                    if distance is not None:
+                        duration = table['durations'][a][b] if table.get('durations') else None
+                        fetched.append((locations[i], locations[j], distance, duration, None))
+                        if (i, j) in wanted:
+                            distances[(i, j)] = distance
+                        if distance_matrix is not None:
+                            distance_matrix[i, j] = distance
+                        if duration_matrix is not None and duration is not None:
+                            duration_matrix[i, j] = duration
+        
+        self.leg_cache.put_many(fetched)
+        return distances
+    
+    def get_stop_distances(self, locations: List[Dict], index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        One row and column of the distance matrix: (to_stop, from_stop), the distances
+        in kilometers from every location to locations[index] and back. Cached legs are
+        reused and the rest cost one 2N-cell table; straight-line distance fills any
+        pair OSRM can't answer.
+        """
+        n = len(locations)
+        to_stop = np.zeros(n)
+        from_stop = np.zeros(n)
+        others = [k for k in range(n) if k != index]
+        pairs = [(k, index) for k in others] + [(index, k) for k in others]
+        legs = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in pairs])
+        missing = []
+        
+        for (i, j), leg in zip(pairs, legs):
+            if leg and leg['distance'] is not None:
+                if j == index:
+                    to_stop[i] = leg['distance']
+                else:
+                    from_stop[j] = leg['distance']
+            else:
+                missing.append((i, j))
+        
+        if missing:
+            fetched = self._fetch_missing_legs(locations, missing)
+            for i, j in missing:
+                distance = fetched.get((i, j))
+                if distance is None:
+                    distance = haversine_distance(locations[i], locations[j])
+                if j == index:
+                    to_stop[i] = distance
+                else:
+                    from_stop[j] = distance
+        
+        return to_stop, from_stop
+    
+    def get_pair_distances(self, locations: List[Dict], pairs: List[Tuple[int, int]]) -> Dict[Tuple[int, int], float]:
+        """
+        Road distances in kilometers for just the given (i, j) pairs, from the leg cache
+        and OSRM /table requests for the rest. Sources are packed into tables in the
+        order they first appear, so pairs listed in spatial order share coordinates and
+        each request covers many of them. Pairs OSRM can't answer are left out.
+        """
+        distances = {}
+        legs = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in pairs])
+        targets: Dict[int, set] = {}
+        for (i, j), leg in zip(pairs, legs):
+            if leg and leg['distance'] is not None:
+                distances[(i, j)] = leg['distance']
+            else:
+                targets.setdefault(i, set()).add(j)
+        
+        blocks = []
+        rows, cols = [], set()
+        for i, js in targets.items():
+            if rows and len(set(rows) | cols | {i} | js) > self.max_table_size:
+                blocks += self._table_blocks(rows, sorted(cols))
+                rows, cols = [], set()
+            rows.append(i)
+            cols |= js
+        if rows:
+            blocks += self._table_blocks(rows, sorted(cols))
+        tables = self.fetcher.map(lambda block: self._get_table_block(locations, *block), blocks)
+        
+        fetched = []
+        for (rows, cols), table in zip(blocks, tables):
+            if not table:
+                continue
+            for a, i in enumerate(rows):
+                for b, j in enumerate(cols):
+                    distance = table['distances'][a][b]
+                    # Blocks share coordinates, so most cells are pairs nobody asked for; only wanted ones are kept.
+                    if distance is None or j not in targets[i]:
+                        continue
+                    duration = table['durations'][a][b] if table.get('durations') else None
+                    fetched.append((locations[i], locations[j], distance, duration, None))
+                    distances[(i, j)] = distance
+        
+        self.leg_cache.put_many(fetched)
+        return distances
+    
+    def get_candidate_matrix(self, locations: List[Dict], k: int = 10) -> SparseDistances:
+        """
+        Sparse distances for instances too large for a dense matrix: a spatial index picks
+        each stop's k nearest stops, and only those candidate edges (both directions) get
+        road distances. Memory and requests grow with N * k instead of N².
+        """
+        matrix = SparseDistances(locations, k)
+        pairs = matrix.candidate_pairs()
+        matrix.set_distances(self.get_pair_distances(locations, pairs + [(j, i) for i, j in pairs]))
+        return matrix
+    
+    @staticmethod
+    def _pair_cover(pairs: List[Tuple[int, int]]) -> List[int]:
+        """Greedy vertex cover: a small set of indices touching every pair."""
+        adjacency = {}
+        for i, j in pairs:
+            adjacency.setdefault(i, set()).add(j)
+            adjacency.setdefault(j, set()).add(i)
         
-        lat1, lng1 = loc1['lat'], loc1['lng']
-        lat2, lng2 = loc2['lat'], loc2['lng']
+        cover = []
+        while adjacency:
+            k = max(adjacency, key=lambda idx: len(adjacency[idx]))
+            cover.append(k)
+            for other in adjacency.pop(k):
+                adjacency[other].discard(k)
+                if not adjacency[other]:
+                    del adjacency[other]
         
-        R = 6371
+        return sorted(cover)
+    
+    def _get_table_block(self, locations: List[Dict], rows: List[int], cols: List[int]) -> Optional[Dict]:
+        """Fetch the rows x cols block of the table, sending only the coordinates it needs."""
+        block = sorted(set(rows) | set(cols))
+        local = {idx: k for k, idx in enumerate(block)}
+        full = len(block) == len(locations) and rows == block and cols == block
+        return self.get_table(
+            [locations[idx] for idx in block],
+            sources=None if full else [local[i] for i in rows],
+            destinations=None if full else [local[j] for j in cols]
+        )
+    
+    def _table_blocks(self, rows: List[int], cols: List[int]) -> List[Tuple[List[int], List[int]]]:
+        """Split a rows x cols table into blocks that each fit in one /table request."""
+        if len(set(rows) | set(cols)) <= self.max_table_size:
+            return [(rows, cols)]
         
-        dlat = math.radians(lat2 - lat1)
-        dlng = math.radians(lng2 - lng1)
+        # Split evenly, unless one side is short enough to send whole next to wider chunks of the other.
+        half = max(1, self.max_table_size // 2)
+        row_chunk = col_chunk = half
+        if len(rows) < half:
+            row_chunk, col_chunk = len(rows), self.max_table_size - len(rows)
+        elif len(cols) < half:
+            row_chunk, col_chunk = self.max_table_size - len(cols), len(cols)
+        row_chunks = [rows[start:start + row_chunk] for start in range(0, len(rows), row_chunk)]
+        col_chunks = [cols[start:start + col_chunk] for start in range(0, len(cols), col_chunk)]
+        return [(r, c) for r in row_chunks for c in col_chunks]
+    
+    def get_route_geometries(self, locations: List[Dict], legs: List[Tuple[int, int]]) -> Dict:
+        """
+        Fetch road geometries (encoded polylines) for the given (i, j) legs only.
+        Falls back to a straight line when OSRM has no route for a leg.
+        """
+        geometry_cache = {}
+        cached = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in legs])
+        to_fetch = [leg for leg, hit in zip(legs, cached) if not (hit and hit['geometry'])]
+        routes = self.fetcher.map(lambda leg: self.get_route(locations[leg[0]], locations[leg[1]]), to_fetch)
+        fetched = dict(zip(to_fetch, routes))
         
-        a = (math.sin(dlat / 2) ** 2 +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlng / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        for (i, j), hit in zip(legs, cached):
+            route = fetched.get((i, j))
+            if hit and hit['geometry']:
+                geometry_cache[(i, j)] = hit['geometry']
+            elif route and route['success']:
+                geometry_cache[(i, j)] = route['geometry']
+            else:
+                geometry_cache[(i, j)] = encode_polyline([
+                    [locations[i]['lat'], locations[i]['lng']],
+                    [locations[j]['lat'], locations[j]['lng']]
+                ])
         
-        return R * c
+        return geometry_cache
+    
+    def _pairwise_route_matrix(self, locations: List[Dict]) -> Tuple[np.ndarray, Dict]:
+        """
+        Calculate distance matrix and store all route geometries.
+        Returns (distance_matrix, geometry_cache).
+        """
+        n = len(locations)
+        distance_matrix = haversine_matrix(locations)
+        geometry_cache = {}
+        pairs = [(i, j) for i in range(n) for j in range(n) if i != j]
+        cached = self.leg_cache.get_many([(locations[i], locations[j]) for i, j in pairs])
+        to_fetch = [pair for pair, hit in zip(pairs, cached)
+                    if not (hit and hit['geometry'] and hit['distance'] is not None)]
+        fetched = dict(zip(to_fetch, self.fetcher.map(
+            lambda pair: self.get_route(locations[pair[0]], locations[pair[1]]), to_fetch
+        )))
+        
+        for (i, j), hit in zip(pairs, cached):
+            route = fetched.get((i, j), hit)
+            if route and route.get('success', True):
+                distance_matrix[i, j] = route['distance']
+                geometry_cache[(i, j)] = route['geometry']
+            else:
+                geometry_cache[(i, j)] = encode_polyline([
+                    [locations[i]['lat'], locations[i]['lng']],
+                    [locations[j]['lat'], locations[j]['lng']]
+                ])
+        
+        return distance_matrix, geometry_cache
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from backend.algorithms.incremental import IncrementalRoute
+from backend.algorithms.local_search import SearchBudget
+from backend.utils.metrics import stage
+
+# Wall-clock cap on the local repair after each edit.
+REPAIR_TIME_LIMIT_MS = 200
+
+class RouteSession:
+    """
+    A planned route kept between requests so single-stop edits don't redo the work
+    for the stops that stay: each edit geocodes one address, fetches one row and
+    column of distances, repairs the route locally and fetches geometries only for
+    legs that are new. Every stop gets a `stop_id` that stays fixed for the session.
+    """
+    
+    def __init__(self, locations: List[Dict], distance_matrix, route_indices: List[int],
+                 geometry_cache: Dict[Tuple[int, int], List], routing_service):
+        self.id = uuid.uuid4().hex
+        self.routing_service = routing_service
+        self.next_stop_id = len(locations)
+        stops = [{**location, "stop_id": stop_id} for stop_id, location in enumerate(locations)]
+        self.route = IncrementalRoute(stops, distance_matrix, route_indices)
+        # Road geometries by (slot, slot) leg; a freed slot's entries go when a new stop takes it.
+        self.geometries = dict(geometry_cache)
+        self.created = time.time()
+        self.used = self.created
+        self.edits = 0
+        self.lock = threading.Lock()
+    
+    def _slot(self, stop_id: int) -> Optional[int]:
+        for slot in self.route.route:
+            if self.route.locations[slot]["stop_id"] == stop_id:
+                return slot
+        return None
+    
+    def add_stop(self, location: Dict, time_limit_ms: Optional[float] = REPAIR_TIME_LIMIT_MS) -> Dict:
+        """Insert a geocoded location and return the updated route with what the edit did."""
+        route = self.route
+        slots = list(route.route)
+        with stage('matrix'):
+            to_stop, from_stop = self.routing_service.get_stop_distances(
+                [route.locations[slot] for slot in slots] + [location], len(slots)
+            )
+        stop = {**location, "stop_id": self.next_stop_id}
+        self.next_stop_id += 1
+        budget = SearchBudget(time_limit_ms)
+        with stage('optimize'):
+            edit = route.add_stop(stop, dict(zip(slots, to_stop.tolist())), dict(zip(slots, from_stop.tolist())),
+                                  budget=budget)
+        for key in [key for key in self.geometries if edit["slot"] in key]:
+            del self.geometries[key]
+        return self._edited(edit, budget, stop_id=stop["stop_id"])
+    
+    def remove_stop(self, stop_id: int, time_limit_ms: Optional[float] = REPAIR_TIME_LIMIT_MS) -> Optional[Dict]:
+        """
+        Remove a stop by id and return the updated route, or None if there is no such stop.
+        Raises ValueError for the start stop.
+        """
+        slot = self._slot(stop_id)
+        if slot is None:
+            return None
+        budget = SearchBudget(time_limit_ms)
+        with stage('optimize'):
+            edit = self.route.remove_stop(slot, budget=budget)
+        return self._edited(edit, budget, stop_id=stop_id)
+    
+    def _edited(self, edit: Dict, budget: SearchBudget, **details) -> Dict:
+        self.edits += 1
+        response = self.response()
+        response["edit"] = {
+            **details,
+            "position": edit["position"],
+            "cost_change": round(edit["insertion_cost"] if "insertion_cost" in edit else -edit["saving"], 2),
+            "improvements": edit["improvements"],
+            "iterations": budget.iterations,
+            "elapsed_ms": round(budget.elapsed_ms(), 1)
+        }
+        return response
+    
+    def response(self) -> Dict:
+        """The route in the /api/optimize-route response shape, plus the session id."""
+        route = self.route
+        locations = route.locations
+        legs = route.legs()
+        missing = [leg for leg in legs if leg not in self.geometries]
+        if missing:
+            slots = sorted({slot for leg in missing for slot in leg})
+            local = {slot: k for k, slot in enumerate(slots)}
+            with stage('geometry'):
+                fetched = self.routing_service.get_route_geometries(
+                    [locations[slot] for slot in slots], [(local[i], local[j]) for i, j in missing]
+                )
+            for i, j in missing:
+                self.geometries[(i, j)] = fetched[(local[i], local[j])]
+        return {
+            "session_id": self.id,
+            "route": [{**locations[slot], "order": order} for order, slot in enumerate(route.route, start=1)],
+            "total_distance": round(route.distance(), 2),
+            "geometries": [self.geometries[leg] for leg in legs],
+            "reused_geometries": len(legs) - len(missing)
+        }
+
+
+class RouteSessionStore:
+    """
+    Open route sessions by id. Sessions idle for more than `ttl` seconds are
+    dropped, and past `max_sessions` the least recently used one goes.
+    """
+    
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 1000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+    
+    def add(self, session: RouteSession) -> RouteSession:
+        with self.lock:
+            self._purge()
+            self.sessions[session.id] = session
+            self.created += 1
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+        return session
+    
+    def get(self, session_id: str) -> Optional[RouteSession]:
+        with self.lock:
+            self._purge()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.used = time.time()
+                self.sessions.move_to_end(session_id)
+            return session
+    
+    def delete(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+    
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.used >= cutoff:
+                break
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"open": len(self.sessions), "created": self.created, "evicted": self.evicted}
+
+
+_store: Optional[RouteSessionStore] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> RouteSessionStore:
+    """Return the process-wide session store, sized by ROUTE_SESSION_TTL_SECONDS and ROUTE_SESSION_MAX."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RouteSessionStore(ttl=float(os.environ.get('ROUTE_SESSION_TTL_SECONDS', '3600')),
+                                       max_sessions=int(os.environ.get('ROUTE_SESSION_MAX', '1000')))
+        return _store
@@ -0,0 +1,77 @@
+"""
+Compare two benchmark result files (e.g. from two commits).
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Prints time and quality changes for every (instance, algorithm) present in both.
+With --fail-on-regression the exit code is 1 when anything got slower than
+--threshold percent or lost quality, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import List, Dict, Optional, Tuple
+
+def _load(path: str) -> Tuple[Dict, Dict[Tuple[str, str, str], Dict]]:
+    with open(path) as f:
+        data = json.load(f)
+    return data["meta"], {(row["suite"], row["instance"], row["algorithm"]): row for row in data["results"]}
+
+
+def _quality(row: Dict) -> Optional[float]:
+    return row.get("distance_km", row.get("path_cost"))
+
+
+def compare(old_path: str, new_path: str, threshold: float = 10.0) -> List[Dict]:
+    """One entry per shared (suite, instance, algorithm) with time ratio and quality change."""
+    _, old = _load(old_path)
+    _, new = _load(new_path)
+    changes = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        ratio = after["time_ms"] / before["time_ms"] if before["time_ms"] > 0 else None
+        quality_before, quality_after = _quality(before), _quality(after)
+        # Distances and path costs are both lower-is-better.
+        worse = quality_before is not None and quality_after is not None and quality_after > quality_before + 1e-9
+        changes.append({
+            "suite": key[0],
+            "instance": key[1],
+            "algorithm": key[2],
+            "time_ms": (before["time_ms"], after["time_ms"]),
+            "time_ratio": ratio,
+            "quality": (quality_before, quality_after),
+            "slower": ratio is not None and ratio > 1 + threshold / 100,
+            "worse": worse
+        })
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent slowdown counted as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+    
+    old_meta, _ = _load(args.old)
+    new_meta, _ = _load(args.new)
+    print(f"old: {old_meta.get('commit')} ({old_meta.get('created')})  new: {new_meta.get('commit')} ({new_meta.get('created')})")
+    
+    changes = compare(args.old, args.new, args.threshold)
+    regressions = 0
+    for change in changes:
+        before, after = change["time_ms"]
+        ratio = f"{change['time_ratio']:.2f}x" if change["time_ratio"] is not None else "n/a"
+        flags = " ".join(flag for flag in ("slower", "worse") if change[flag])
+        regressions += bool(flags)
+        quality_before, quality_after = change["quality"]
+        print(f"{change['instance']:<22} {change['algorithm']:<20} {before:>10.1f} -> {after:>10.1f} ms "
+              f"{ratio:>7}  quality {quality_before} -> {quality_after}  {flags}")
+    
+    print(f"{len(changes)} compared, {regressions} regression(s)")
+    return 1 if args.fail_on_regression and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import random
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from backend.algorithms.distance_matrix import haversine_matrix
+from backend.algorithms.grid_index import label_components
+from backend.algorithms.pathfinding import Grid, WALL
+from backend.algorithms.spatial import DENSE_MATRIX_MAX_STOPS
+
+# Stops are spread over a ~50 km square around this point (Washington, DC).
+CENTER = (38.9072, -77.0369)
+SPREAD_DEG = 0.25
+
+ROUTE_KINDS = ('random', 'clustered')
+GRID_KINDS = ('open', 'maze', 'rooms', 'weighted')
+
+def instance_name(kind: str, size: int, seed: int) -> str:
+    return f"{kind}-{size}-s{seed}"
+
+
+def route_instance(kind: str, size: int, seed: int) -> Dict:
+    """
+    `size` stops with a haversine distance matrix. "random" spreads stops uniformly;
+    "clustered" draws them around a handful of centers, like deliveries to a few
+    neighborhoods. The same (kind, size, seed) always gives the same stops. Above
+    DENSE_MATRIX_MAX_STOPS the matrix is None and the optimizer builds sparse distances.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == 'random':
+        lats = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+        lngs = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+    elif kind == 'clustered':
+        clusters = max(2, int(round(size ** 0.5 / 2)))
+        centers = CENTER + rng.uniform(-SPREAD_DEG, SPREAD_DEG, (clusters, 2))
+        members = rng.integers(0, clusters, size)
+        points = centers[members] + rng.normal(0, SPREAD_DEG / 15, (size, 2))
+        lats, lngs = points[:, 0], points[:, 1]
+    else:
+        raise ValueError(f"Unknown route instance kind '{kind}'")
+    
+    locations = [
+        {"id": i, "address": f"Stop {i}", "lat": round(float(lat), 6), "lng": round(float(lng), 6)}
+        for i, (lat, lng) in enumerate(zip(lats, lngs))
+    ]
+    return {
+        "name": instance_name(kind, size, seed),
+        "kind": kind,
+        "size": size,
+        "seed": seed,
+        "locations": locations,
+        "matrix": haversine_matrix(locations) if size <= DENSE_MATRIX_MAX_STOPS else None
+    }
+
+
+def _maze(size: int, rng: random.Random) -> np.ndarray:
+    """Perfect maze (one path between any two cells) carved by an iterative depth-first walk."""
+    cells = np.full((size, size), WALL, dtype=np.uint8)
+    h, w = (size - 1) // 2, (size - 1) // 2
+    if not h or not w:
+        return np.zeros((size, size), dtype=np.uint8)
+    seen = bytearray(h * w)
+    stack = [0]
+    seen[0] = 1
+    cells[1, 1] = 0
+    while stack:
+        node = stack[-1]
+        y, x = divmod(node, w)
+        options = [(ny, nx) for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1))
+                   if 0 <= ny < h and 0 <= nx < w and not seen[ny * w + nx]]
+        if not options:
+            stack.pop()
+            continue
+        ny, nx = rng.choice(options)
+        seen[ny * w + nx] = 1
+        cells[2 * ny + 1, 2 * nx + 1] = 0
+        cells[y + ny + 1, x + nx + 1] = 0
+        stack.append(ny * w + nx)
+    return cells
+
+
+def _rooms(size: int, rng: np.random.Generator, room: int = 12) -> np.ndarray:
+    """Square rooms separated by one-cell walls with a door or two in every wall segment."""
+    cells = np.zeros((size, size), dtype=np.uint8)
+    lines = list(range(room, size, room + 1))
+    for line in lines:
+        cells[line, :] = WALL
+        cells[:, line] = WALL
+    bounds = [-1] + lines + [size]
+    for line in lines:
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if hi - lo < 2:
+                continue
+            for _ in range(rng.integers(1, 3)):
+                door = int(rng.integers(lo + 1, hi))
+                cells[line, door] = 0
+                cells[door, line] = 0
+    # A little clutter (shelves, pallets) inside the rooms.
+    clutter = (rng.random((size, size)) < 0.08) & (cells == 0)
+    cells[clutter] = WALL
+    return cells
+
+
+def grid_instance(kind: str, size: int, seed: int, queries: int = 5) -> Dict:
+    """
+    A size x size grid and `queries` seeded start/end pairs that are connected.
+    "open" has 20% scattered walls, "maze" is a perfect maze of one-cell corridors,
+    "rooms" is a warehouse-like floor of rooms joined by doors, and "weighted" is
+    "open" with a third of the floor costing 2..9 to cross.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == 'open':
+        cells = (rng.random((size, size)) < 0.2).astype(np.uint8)
+    elif kind == 'weighted':
+        cells = (rng.random((size, size)) < 0.2).astype(np.uint8)
+        slow = (rng.random((size, size)) < 0.33) & (cells == 0)
+        cells[slow] = rng.integers(2, 10, int(slow.sum()))
+    elif kind == 'maze':
+        cells = _maze(size, random.Random(seed))
+    elif kind == 'rooms':
+        cells = _rooms(size, rng)
+    else:
+        raise ValueError(f"Unknown grid instance kind '{kind}'")
+    
+    grid = Grid(cells)
+    return {
+        "name": instance_name(kind, size, seed),
+        "kind": kind,
+        "size": size,
+        "seed": seed,
+        "grid": grid,
+        "queries": _queries(grid, rng, queries)
+    }
+
+
+def _queries(grid: Grid, rng: np.random.Generator, count: int) -> List[Tuple[Dict[str, int], Dict[str, int]]]:
+    """Start/end pairs drawn from the largest connected area, so every query has a path."""
+    labels = label_components(grid)
+    counts = np.bincount(labels)
+    if counts.size < 2:
+        return []
+    counts[0] = 0
+    cells = np.flatnonzero(labels == counts.argmax())
+    picks = grid.points(rng.choice(cells, size=(count, 2)).ravel().tolist())
+    return [(picks[2 * k], picks[2 * k + 1]) for k in range(count)]
@@ -0,0 +1,256 @@
+"""
+Benchmark the route optimizers and grid pathfinders on seeded instances.
+
+    python -m benchmarks.run                      # default sizes, results/<time>-<commit>.json
+    python -m benchmarks.run --suite grids --grid-sizes 200 1000 --repeat 5
+    python -m benchmarks.compare old.json new.json
+
+Every algorithm is timed over --repeat runs (median reported) and run once more
+under tracemalloc for its peak Python/NumPy allocation; tracing slows a run down
+about 50x, so runs slower than --memory-budget-ms are not traced. Route quality is
+the gap to the best distance known for the instance (this run, or best_known.json);
+path quality is the gap to the exact Dijkstra cost. Nothing here uses the network.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.algorithms.distance_matrix import coordinates, haversine_pairs
+from backend.algorithms.grid_index import GridIndex
+from backend.algorithms.pathfinding import PATHFINDERS
+from backend.algorithms.route_optimizer import DENSE_ONLY_ALGORITHMS, RouteOptimizer
+from benchmarks.instances import ROUTE_KINDS, GRID_KINDS, route_instance, grid_instance
+
+ROUTE_ALGORITHMS = ('nearest_neighbor', 'greedy_insertion', 'two_opt', 'or_opt', 'simulated_annealing')
+GRID_ALGORITHMS = tuple(PATHFINDERS) + ('hpa',)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BEST_KNOWN_PATH = os.path.join(BENCHMARK_DIR, 'best_known.json')
+
+def measure(run: Callable[[], object], repeat: int,
+            memory_budget_ms: Optional[float] = None) -> Tuple[object, List[float], Optional[int]]:
+    """
+    Result of the last run, wall times (ms) of `repeat` runs, and peak traced bytes
+    of one more run, or None when the runs take longer than `memory_budget_ms`.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append((time.perf_counter() - start) * 1000)
+    
+    peak = None
+    if memory_budget_ms is not None and statistics.median(times) <= memory_budget_ms:
+        # Tracing slows allocation down, so it gets a run of its own.
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, times, peak
+
+
+def _row(suite: str, instance: Dict, algorithm: str, times: List[float], peak: Optional[int], **quality) -> Dict:
+    return {
+        "suite": suite,
+        "instance": instance["name"],
+        "kind": instance["kind"],
+        "size": instance["size"],
+        "seed": instance["seed"],
+        "algorithm": algorithm,
+        "time_ms": round(statistics.median(times), 3),
+        "times_ms": [round(t, 3) for t in times],
+        "peak_kb": round(peak / 1024, 1) if peak is not None else None,
+        **quality
+    }
+
+
+def _gap(value: float, best: float) -> Optional[float]:
+    if best is None or not np.isfinite(best):
+        return None
+    if best == 0:
+        return 0.0 if value == 0 else None
+    return round(100 * (value - best) / best, 3)
+
+
+def route_benchmarks(sizes: List[int], kinds: List[str], algorithms: List[str], seed: int, repeat: int,
+                     memory_budget_ms: Optional[float], time_limit_ms: Optional[float],
+                     best_known: Dict[str, float]) -> List[Dict]:
+    rows = []
+    for kind in kinds:
+        for size in sizes:
+            instance = route_instance(kind, size, seed)
+            locations, matrix = instance["locations"], instance["matrix"]
+            lats, lngs = coordinates(locations)
+            found = []
+            for algorithm in algorithms:
+                if matrix is None and algorithm in DENSE_ONLY_ALGORITHMS:
+                    continue
+                options = {"seed": seed} if algorithm == 'simulated_annealing' else {}
+                
+                def run():
+                    # A fresh optimizer per run, so no seed route or neighbor lists carry over.
+                    optimizer = RouteOptimizer(locations, distance_matrix=matrix)
+                    return optimizer.optimize(algorithm, time_limit_ms=time_limit_ms, **options)
+                
+                response, times, peak = measure(run, repeat, memory_budget_ms)
+                order = [stop["id"] for stop in response["route"]]
+                # Measured from the coordinates, so sparse runs (no matrix) are scored the same way.
+                distance = float(haversine_pairs(lats[order[:-1]], lngs[order[:-1]],
+                                                 lats[order[1:]], lngs[order[1:]]).sum()) if len(order) > 1 else 0.0
+                found.append(distance)
+                rows.append(_row("routes", instance, algorithm, times, peak, distance_km=round(distance, 4)))
+                _report(rows[-1], "distance_km")
+            
+            best = min(found + [best_known.get(instance["name"], float('inf'))])
+            for row in rows[-len(found):]:
+                row["best_known_km"] = round(best, 4)
+                row["gap_pct"] = _gap(row["distance_km"], best)
+    return rows
+
+
+def grid_benchmarks(sizes: List[int], kinds: List[str], algorithms: List[str], seed: int, repeat: int,
+                    memory_budget_ms: Optional[float], queries: int, diagonal: bool) -> List[Dict]:
+    rows = []
+    for kind in kinds:
+        for size in sizes:
+            instance = grid_instance(kind, size, seed, queries)
+            grid, pairs = instance["grid"], instance["queries"]
+            costs = {}
+            for algorithm in algorithms:
+                if algorithm == 'hpa':
+                    def run():
+                        # Built inside the run, so the time is a cold index: build plus first queries.
+                        index = GridIndex(grid)
+                        return [index.find_path(start, end, explored_format='none', diagonal=diagonal)
+                                for start, end in pairs]
+                else:
+                    pathfinder = PATHFINDERS[algorithm]
+                    
+                    def run():
+                        return [pathfinder(grid, start, end, diagonal=diagonal).find_path('none')
+                                for start, end in pairs]
+                
+                results, times, peak = measure(run, repeat, memory_budget_ms)
+                cost = sum(result["cost"] for result in results if result["found"])
+                costs[algorithm] = cost
+                rows.append(_row("grids", instance, algorithm, times, peak, queries=len(pairs),
+                                 found=sum(result["found"] for result in results), path_cost=cost))
+                _report(rows[-1], "path_cost")
+            
+            # Dijkstra is exact; without it, the cheapest result of this run stands in.
+            best = costs.get('dijkstra', min(costs.values()) if costs else None)
+            for row in rows[-len(costs):]:
+                row["gap_pct"] = _gap(row["path_cost"], best)
+    return rows
+
+
+def _report(row: Dict, quality: str):
+    peak = f"{row['peak_kb']:>10.0f} KB" if row["peak_kb"] is not None else ""
+    print(f"{row['instance']:<22} {row['algorithm']:<20} {row['time_ms']:>10.1f} ms {peak}  "
+          f"{quality}={row[quality]}", file=sys.stderr)
+
+
+def environment() -> Dict:
+    """Where the numbers came from: commit, interpreter, library and machine."""
+    def git(*args):
+        try:
+            return subprocess.run(('git',) + args, cwd=BENCHMARK_DIR, capture_output=True, text=True,
+                                  timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+    
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": git('rev-parse', '--short', 'HEAD'),
+        "dirty": bool(git('status', '--porcelain', '--untracked-files=no')),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def load_best_known(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_best_known(path: str, best_known: Dict[str, float], rows: List[Dict]) -> int:
+    """Record route distances that beat the best known ones; returns how many instances improved."""
+    improved = set()
+    for row in rows:
+        if row["suite"] == "routes" and row["distance_km"] < best_known.get(row["instance"], float('inf')):
+            best_known[row["instance"]] = row["distance_km"]
+            improved.add(row["instance"])
+    with open(path, 'w') as f:
+        json.dump(dict(sorted(best_known.items())), f, indent=2)
+        f.write('\n')
+    return len(improved)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', choices=('routes', 'grids', 'all'), default='all')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per algorithm (median is reported)")
+    parser.add_argument('--memory-budget-ms', type=float, default=200.0,
+                        help="trace peak memory only for runs at most this long (default 200)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--route-sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--route-kinds', nargs='+', choices=ROUTE_KINDS, default=list(ROUTE_KINDS))
+    parser.add_argument('--route-algorithms', nargs='+', choices=ROUTE_ALGORITHMS, default=list(ROUTE_ALGORITHMS))
+    parser.add_argument('--time-limit-ms', type=float, help="time limit passed to every route algorithm")
+    parser.add_argument('--grid-sizes', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--grid-kinds', nargs='+', choices=GRID_KINDS, default=list(GRID_KINDS))
+    parser.add_argument('--grid-algorithms', nargs='+', choices=GRID_ALGORITHMS, default=list(GRID_ALGORITHMS))
+    parser.add_argument('--queries', type=int, default=5, help="start/end pairs searched per grid")
+    parser.add_argument('--diagonal', action='store_true', help="8-connected grid moves")
+    parser.add_argument('--best-known', default=BEST_KNOWN_PATH, help="JSON of best route distances per instance")
+    parser.add_argument('--update-best-known', action='store_true', help="store any better route distances found")
+    parser.add_argument('--out', help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+    
+    meta = environment()
+    memory_budget = None if args.no_memory else args.memory_budget_ms
+    best_known = load_best_known(args.best_known)
+    rows = []
+    if args.suite in ('routes', 'all'):
+        rows += route_benchmarks(args.route_sizes, args.route_kinds, args.route_algorithms, args.seed,
+                                 args.repeat, memory_budget, args.time_limit_ms, best_known)
+    if args.suite in ('grids', 'all'):
+        rows += grid_benchmarks(args.grid_sizes, args.grid_kinds, args.grid_algorithms, args.seed,
+                                args.repeat, memory_budget, args.queries, args.diagonal)
+    
+    if args.update_best_known:
+        improved = save_best_known(args.best_known, best_known, rows)
+        print(f"{improved} best known distance(s) improved", file=sys.stderr)
+    
+    out = args.out
+    if out is None:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        out = os.path.join(BENCHMARK_DIR, 'results', f"{stamp}-{meta['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({"meta": {**meta, "args": vars(args)}, "results": rows}, f, indent=2)
+        f.write('\n')
+    print(f"Wrote {len(rows)} results to {out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
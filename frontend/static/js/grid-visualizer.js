@@ -39,6 +39,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const runPathfindingBtn = document.getElementById('run-pathfinding-btn');
     const clearGridBtn = document.getElementById('clear-grid-btn');
     const pathfindingAlgorithmSelect = document.getElementById('pathfinding-algorithm');
+    const diagonalMovesCheckbox = document.getElementById('diagonal-moves');
     const gridLoadingDiv = document.getElementById('grid-loading');
     const gridResultsDiv = document.getElementById('grid-results');
     const gridErrorDiv = document.getElementById('grid-error');
@@ -249,7 +250,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     grid: gridData,
                     start: startCell,
                     end: endCell,
-                    algorithm: pathfindingAlgorithmSelect.value
+                    algorithm: pathfindingAlgorithmSelect.value,
+                    diagonal: diagonalMovesCheckbox.checked
                 })
             });
             
@@ -30,6 +30,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     const findRouteBtn = document.getElementById('find-route-btn');
     const addressesInput = document.getElementById('addresses');
+    const routeAlgorithmSelect = document.getElementById('route-algorithm');
     const loadingDiv = document.getElementById('map-loading');
     const resultsDiv = document.getElementById('map-results');
     const errorDiv = document.getElementById('map-error');
@@ -61,7 +62,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 },
                 body: JSON.stringify({
                     addresses: addresses,
-                    algorithm: 'nearest_neighbor'
+                    algorithm: routeAlgorithmSelect.value,
+                    geometry_format: 'polyline',
+                    simplify_zoom: ROUTE_DETAIL_ZOOM
                 })
             });
             
@@ -81,6 +84,29 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Road geometries come as encoded polylines, simplified to what is visible at this zoom.
+    const ROUTE_DETAIL_ZOOM = 16;
+    
+    function decodePolyline(encoded) {
+        const points = [];
+        let index = 0, lat = 0, lng = 0;
+        while (index < encoded.length) {
+            const deltas = [0, 0].map(() => {
+                let result = 0, shift = 0, byte;
+                do {
+                    byte = encoded.charCodeAt(index++) - 63;
+                    result |= (byte & 0x1f) << shift;
+                    shift += 5;
+                } while (byte >= 0x20);
+                return (result & 1) ? ~(result >> 1) : (result >> 1);
+            });
+            lat += deltas[0];
+            lng += deltas[1];
+            points.push([lat / 1e5, lng / 1e5]);
+        }
+        return points;
+    }
+    
     function clearMap() {
         markers.forEach(marker => map.removeLayer(marker));
         markers = [];
@@ -160,7 +186,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         if (bounds.length > 1 && data.geometries && data.geometries.length > 0) {
             data.geometries.forEach(geometry => {
-                const line = L.polyline(geometry, {
+                const line = L.polyline(decodePolyline(geometry), {
                     color: '#667eea',
                     weight: 4,
                     opacity: 0.7
@@ -9,4 +9,4 @@ echo "🚀 Starting Flask server on http://localhost:3000"
 echo "Press CTRL+C to stop the server"
 echo ""
 
-python -m backend.app
+python -m backend
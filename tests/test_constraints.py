@@ -0,0 +1,155 @@
+import random
+
+import numpy as np
+import pytest
+
+from backend.algorithms.fleet import clarke_wright, reduce_routes, sweep
+from backend.algorithms.local_search import neighbor_lists, or_opt
+from backend.algorithms.time_windows import TimeWindowTour, parse_windows, time_window_insertion
+
+
+def random_points(n, seed):
+    return np.random.default_rng(seed).uniform(0, 50, size=(n, 2))
+
+
+def distance_matrix(points):
+    return np.linalg.norm(points[:, None] - points[None, :], axis=2)
+
+
+def random_windows(n, seed, horizon=400.0):
+    """A window on two stops in three, the depot's left open."""
+    rng = random.Random(seed)
+    windows = [None]
+    for _ in range(1, n):
+        if rng.random() < 0.33:
+            windows.append(None)
+        else:
+            earliest = rng.uniform(0, horizon)
+            windows.append([earliest, earliest + rng.uniform(20, 120)])
+    return windows
+
+
+def simulate(route, durations, earliest, latest, service, start_time=0.0):
+    """Service start at each stop when driving the route from scratch."""
+    starts = [max(earliest[route[0]], start_time)]
+    for a, b in zip(route, route[1:]):
+        starts.append(max(earliest[b], starts[-1] + service[a] + durations[a][b]))
+    return starts
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_time_window_insertion_schedules_only_on_time_stops(seed):
+    n = 40
+    points = random_points(n, seed)
+    matrix = distance_matrix(points)
+    # Euclidean travel times satisfy the triangle inequality, as TimeWindowTour assumes.
+    durations = matrix * 2
+    earliest, latest, service = parse_windows(random_windows(n, seed), 5, n)
+    tour = TimeWindowTour([0], matrix, durations, earliest, latest, service)
+    
+    unscheduled = time_window_insertion(tour, range(1, n))
+    
+    assert sorted(tour.route + unscheduled) == list(range(n))
+    assert tour.route[0] == 0
+    assert tour.feasible()
+    starts = simulate(tour.route, durations, earliest, latest, service)
+    for stop, start in zip(tour.route, starts):
+        assert earliest[stop] <= start <= latest[stop] + 1e-9
+    assert all(row["on_time"] for row in tour.schedule())
+    
+    # Or-opt moves on a time-window tour must keep it feasible; like the optimizer, it only sees scheduled stops.
+    routed = set(tour.route)
+    or_opt(tour, [[c for c in row if c in routed] for row in neighbor_lists(matrix, k=8)])
+    assert tour.feasible()
+    starts = simulate(tour.route, durations, earliest, latest, service)
+    assert all(start <= latest[stop] + 1e-9 for stop, start in zip(tour.route, starts))
+
+
+def test_time_window_insertion_leaves_out_unreachable_stops():
+    matrix = distance_matrix(np.array([[0, 0], [10, 0], [20, 0]]))
+    earliest, latest, service = parse_windows([None, [0, 5], None], 0, 3)
+    tour = TimeWindowTour([0], matrix, matrix, earliest, latest, service)
+    
+    unscheduled = time_window_insertion(tour, [1, 2])
+    
+    assert unscheduled == [1]
+    assert tour.route == [0, 2]
+
+
+def random_demands(n, seed, capacity):
+    rng = random.Random(seed)
+    return [0] + [rng.randint(1, capacity // 3) for _ in range(n - 1)]
+
+
+def check_routes(routes, n, demands, capacity):
+    visited = [stop for route in routes for stop in route]
+    assert sorted(visited) == list(range(1, n))
+    for route in routes:
+        assert route
+        assert sum(demands[stop] for stop in route) <= capacity
+
+
+@pytest.mark.parametrize('closed', [True, False], ids=['round-trip', 'one-way'])
+@pytest.mark.parametrize('seed', range(5))
+def test_clarke_wright_routes_fit_capacity(seed, closed):
+    n, capacity = 60, 30
+    matrix = distance_matrix(random_points(n, seed))
+    demands = random_demands(n, seed, capacity)
+    
+    routes = clarke_wright(matrix, demands, capacity, closed=closed)
+    
+    check_routes(routes, n, demands, capacity)
+    assert len(routes) >= sum(demands) / capacity
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sweep_routes_fit_capacity(seed):
+    n, capacity = 60, 30
+    locations = [{'lat': 38.9 + y / 1000, 'lng': -77.0 + x / 1000} for x, y in random_points(n, seed)]
+    demands = random_demands(n, seed, capacity)
+    
+    routes = sweep(locations, demands, capacity)
+    
+    check_routes(routes, n, demands, capacity)
+
+
+@pytest.mark.parametrize('closed', [True, False], ids=['round-trip', 'one-way'])
+@pytest.mark.parametrize('seed', range(5))
+def test_reduced_routes_fit_capacity_and_never_grow(seed, closed):
+    n, capacity = 60, 10
+    matrix = distance_matrix(random_points(n, seed))
+    rng = random.Random(seed)
+    demands = [0] + [rng.choice([3, 4, 6, 7]) for _ in range(n - 1)]
+    routes = clarke_wright(matrix, demands, capacity, closed=closed)
+    fewest = int(np.ceil(sum(demands) / capacity))
+    
+    reduced = reduce_routes(matrix, routes, demands, capacity, fewest, closed=closed)
+    
+    check_routes(reduced, n, demands, capacity)
+    assert fewest <= len(reduced) <= len(routes)
+
+
+def test_single_stop_routes_are_packed_into_the_fleet():
+    n, capacity = 40, 30
+    matrix = distance_matrix(random_points(n, 2))
+    demands = random_demands(n, 2, capacity)
+    vehicles = int(np.ceil(sum(demands) / capacity)) + 1
+    
+    reduced = reduce_routes(matrix, [[stop] for stop in range(1, n)], demands, capacity, vehicles)
+    
+    check_routes(reduced, n, demands, capacity)
+    assert len(reduced) <= vehicles
+
+
+def test_routes_stay_when_no_stop_fits_elsewhere():
+    matrix = distance_matrix(random_points(4, 0))
+    
+    reduced = reduce_routes(matrix, [[1], [2], [3]], [0, 6, 6, 6], 10, vehicles=1)
+    
+    assert sorted(reduced) == [[1], [2], [3]]
+
+
+def test_a_stop_heavier_than_the_vehicle_is_rejected():
+    matrix = distance_matrix(random_points(4, 0))
+    with pytest.raises(ValueError):
+        clarke_wright(matrix, [0, 5, 50, 5], 10)
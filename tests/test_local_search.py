@@ -0,0 +1,124 @@
+import random
+
+import numpy as np
+import pytest
+
+from backend.algorithms.local_search import Tour, cheapest_insertion, neighbor_lists, or_opt, two_opt
+from backend.algorithms.route_optimizer import RouteOptimizer
+
+TOURS = [(symmetric, closed) for symmetric in (True, False) for closed in (False, True)]
+IDS = [f"{'symmetric' if s else 'asymmetric'}-{'closed' if c else 'open'}" for s, c in TOURS]
+
+
+def random_matrix(n, symmetric, seed):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 100, size=(n, 2))
+    matrix = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+    if not symmetric:
+        # One-way streets: a random detour on each directed leg.
+        matrix = matrix * rng.uniform(1.0, 1.6, size=(n, n))
+        np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+
+def random_tour(n, symmetric, closed, seed):
+    matrix = random_matrix(n, symmetric, seed)
+    route = list(range(n))
+    route[1:] = random.Random(seed).sample(route[1:], n - 1)
+    return Tour(route, matrix, closed=closed), matrix
+
+
+def recomputed(route, matrix, closed):
+    return Tour(route, matrix, closed=closed).length()
+
+
+@pytest.mark.parametrize('symmetric,closed', TOURS, ids=IDS)
+def test_two_opt_delta_matches_recomputed_length(symmetric, closed):
+    for seed in range(5):
+        tour, matrix = random_tour(12, symmetric, closed, seed)
+        before = tour.length()
+        for i in range(tour.n - 2):
+            for j in range(i + 2, tour.n):
+                moved = Tour(tour.route, matrix, closed=closed)
+                delta = moved.two_opt_delta(i, j)
+                moved.apply_two_opt(i, j)
+                assert delta == pytest.approx(recomputed(moved.route, matrix, closed) - before, abs=1e-9)
+                assert moved.length() == pytest.approx(before + delta, abs=1e-9)
+
+
+@pytest.mark.parametrize('symmetric,closed', TOURS, ids=IDS)
+def test_or_opt_delta_matches_recomputed_length(symmetric, closed):
+    for seed in range(5):
+        tour, matrix = random_tour(12, symmetric, closed, seed)
+        before = tour.length()
+        for s in range(1, tour.n):
+            for e in range(s, min(s + 3, tour.n)):
+                for t in range(tour.n):
+                    if s - 1 <= t <= e:
+                        continue
+                    for reverse in (False, True):
+                        moved = Tour(tour.route, matrix, closed=closed)
+                        delta = moved.or_opt_delta(s, e, t, reverse)
+                        moved.apply_or_opt(s, e, t, reverse)
+                        assert delta == pytest.approx(recomputed(moved.route, matrix, closed) - before, abs=1e-9)
+
+
+@pytest.mark.parametrize('symmetric,closed', TOURS, ids=IDS)
+def test_incremental_prefix_sums_survive_many_moves(symmetric, closed):
+    tour, matrix = random_tour(30, symmetric, closed, seed=11)
+    rng = random.Random(11)
+    for _ in range(300):
+        if rng.random() < 0.5:
+            i = rng.randrange(tour.n - 2)
+            j = rng.randrange(i + 2, tour.n)
+            delta = tour.two_opt_delta(i, j)
+            expected = tour.length() + delta
+            tour.apply_two_opt(i, j)
+        else:
+            s = rng.randrange(1, tour.n)
+            e = min(tour.n - 1, s + rng.randrange(3))
+            t = rng.choice([t for t in range(tour.n) if not s - 1 <= t <= e])
+            reverse = rng.random() < 0.5
+            delta = tour.or_opt_delta(s, e, t, reverse)
+            expected = tour.length() + delta
+            tour.apply_or_opt(s, e, t, reverse)
+        assert tour.length() == pytest.approx(expected, abs=1e-6)
+        assert tour.pos == {stop: p for p, stop in enumerate(tour.route)}
+
+
+@pytest.mark.parametrize('symmetric,closed', TOURS, ids=IDS)
+@pytest.mark.parametrize('search', [two_opt, or_opt], ids=['two_opt', 'or_opt'])
+def test_local_search_keeps_the_route_and_never_lengthens_it(search, symmetric, closed):
+    for seed in range(5):
+        tour, matrix = random_tour(40, symmetric, closed, seed)
+        start, before = tour.route[0], tour.length()
+        
+        moves = search(tour, neighbor_lists(matrix, k=8))
+        
+        assert sorted(tour.route) == list(range(40))
+        assert tour.route[0] == start
+        assert tour.length() <= before + 1e-9
+        assert moves == 0 or tour.length() < before
+        assert tour.length() == pytest.approx(recomputed(tour.route, matrix, closed))
+
+
+@pytest.mark.parametrize('closed', [False, True], ids=['open', 'closed'])
+def test_cheapest_insertion_visits_every_stop_once(closed):
+    matrix = random_matrix(60, symmetric=False, seed=3)
+    
+    route = cheapest_insertion(matrix, start=5, closed=closed)
+    
+    assert route[0] == 5
+    assert sorted(route) == list(range(60))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_greedy_insertion_is_never_longer_than_nearest_neighbor(seed):
+    n = 10 + 9 * seed
+    matrix = random_matrix(n, symmetric=False, seed=seed)
+    locations = [{'lat': 38.9, 'lng': -77.0 + k / 1000, 'address': str(k)} for k in range(n)]
+    
+    insertion = RouteOptimizer(locations, matrix.tolist()).optimize('greedy_insertion')
+    nearest = RouteOptimizer(locations, matrix.tolist()).optimize('nearest_neighbor')
+    
+    assert insertion['total_distance'] <= nearest['total_distance'] + 1e-9
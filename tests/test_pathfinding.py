@@ -0,0 +1,136 @@
+import heapq
+import random
+
+import pytest
+
+from backend.algorithms.grid_index import GridIndex
+from backend.algorithms.pathfinding import DIAGONAL_STEP, PATHFINDERS, STRAIGHT_STEP, WALL
+
+# Pathfinders that must return shortest paths; greedy best-first only promises some path.
+EXACT = [name for name in PATHFINDERS if name != 'greedy']
+
+
+def random_grid(rng, rows, cols, weighted):
+    """About a quarter walls; weighted grids mix open ground with cells costing 2..9."""
+    grid = []
+    for _ in range(rows):
+        row = []
+        for _ in range(cols):
+            roll = rng.random()
+            if roll < 0.25:
+                row.append(WALL)
+            elif weighted and roll < 0.55:
+                row.append(rng.randint(2, 9))
+            else:
+                row.append(0)
+        grid.append(row)
+    return grid
+
+
+def open_cell(rng, grid):
+    while True:
+        x, y = rng.randrange(len(grid[0])), rng.randrange(len(grid))
+        if grid[y][x] != WALL:
+            return {'x': x, 'y': y}
+
+
+def step_cost(value):
+    return 1 if value == 0 else value
+
+
+def dijkstra(grid, start, end, diagonal):
+    """Plain Dijkstra on (x, y) cells, in the pathfinders' cost units; None when unreachable."""
+    rows, cols = len(grid), len(grid[0])
+    moves = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    if diagonal:
+        moves += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+    source, goal = (start['x'], start['y']), (end['x'], end['y'])
+    best = {source: 0}
+    heap = [(0, source)]
+    while heap:
+        g, (x, y) = heapq.heappop(heap)
+        if (x, y) == goal:
+            return g / STRAIGHT_STEP if diagonal else g
+        if g > best[(x, y)]:
+            continue
+        for dx, dy in moves:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < cols and 0 <= ny < rows) or grid[ny][nx] == WALL:
+                continue
+            if dx and dy and (grid[y][nx] == WALL or grid[ny][x] == WALL):
+                continue
+            unit = (DIAGONAL_STEP if dx and dy else STRAIGHT_STEP) if diagonal else 1
+            ng = g + unit * step_cost(grid[ny][nx])
+            if ng < best.get((nx, ny), float('inf')):
+                best[(nx, ny)] = ng
+                heapq.heappush(heap, (ng, (nx, ny)))
+    return None
+
+
+def check_path(grid, path, start, end, diagonal):
+    """The path's walking cost, after checking it joins start to end through open, adjacent cells."""
+    assert path[0] == start and path[-1] == end
+    straight = diagonal_steps = 0
+    for a, b in zip(path, path[1:]):
+        dx, dy = b['x'] - a['x'], b['y'] - a['y']
+        assert grid[b['y']][b['x']] != WALL
+        assert max(abs(dx), abs(dy)) == 1
+        if dx and dy:
+            assert diagonal
+            assert grid[a['y']][b['x']] != WALL and grid[b['y']][a['x']] != WALL
+            diagonal_steps += step_cost(grid[b['y']][b['x']])
+        else:
+            straight += step_cost(grid[b['y']][b['x']])
+    return straight + diagonal_steps * DIAGONAL_STEP / STRAIGHT_STEP
+
+
+def queries(weighted, diagonal, count=40):
+    rng = random.Random(hash((weighted, diagonal)) & 0xffff)
+    for _ in range(count):
+        grid = random_grid(rng, rng.randint(5, 24), rng.randint(5, 24), weighted)
+        yield grid, open_cell(rng, grid), open_cell(rng, grid)
+
+
+@pytest.mark.parametrize('diagonal', [False, True], ids=['4-way', '8-way'])
+@pytest.mark.parametrize('weighted', [False, True], ids=['uniform', 'weighted'])
+@pytest.mark.parametrize('algorithm', EXACT)
+def test_pathfinders_match_dijkstra(algorithm, weighted, diagonal):
+    for grid, start, end in queries(weighted, diagonal):
+        optimal = dijkstra(grid, start, end, diagonal)
+        result = PATHFINDERS[algorithm](grid, start, end, diagonal=diagonal).find_path('none')
+        
+        assert result['found'] == (optimal is not None)
+        if optimal is not None:
+            assert check_path(grid, result['path'], start, end, diagonal) == pytest.approx(result['cost'], abs=1e-3)
+            assert result['cost'] == pytest.approx(optimal, abs=1e-3)
+
+
+@pytest.mark.parametrize('diagonal', [False, True], ids=['4-way', '8-way'])
+@pytest.mark.parametrize('weighted', [False, True], ids=['uniform', 'weighted'])
+def test_greedy_finds_a_valid_path(weighted, diagonal):
+    for grid, start, end in queries(weighted, diagonal):
+        optimal = dijkstra(grid, start, end, diagonal)
+        result = PATHFINDERS['greedy'](grid, start, end, diagonal=diagonal).find_path('none')
+        
+        assert result['found'] == (optimal is not None)
+        if optimal is not None:
+            assert check_path(grid, result['path'], start, end, diagonal) == pytest.approx(result['cost'], abs=1e-3)
+            assert result['cost'] >= optimal - 1e-3
+
+
+@pytest.mark.parametrize('diagonal', [False, True], ids=['4-way', '8-way'])
+@pytest.mark.parametrize('weighted', [False, True], ids=['uniform', 'weighted'])
+def test_hierarchical_paths_are_valid_and_never_shorter_than_optimal(weighted, diagonal):
+    rng = random.Random(7)
+    for _ in range(10):
+        grid = random_grid(rng, 64, 64, weighted)
+        index = GridIndex(grid, cluster_size=8)
+        for _ in range(10):
+            start, end = open_cell(rng, grid), open_cell(rng, grid)
+            optimal = dijkstra(grid, start, end, diagonal)
+            result = index.find_path(start, end, explored_format='none', diagonal=diagonal)
+            
+            assert result['found'] == (optimal is not None)
+            if optimal is not None:
+                assert check_path(grid, result['path'], start, end, diagonal) == pytest.approx(result['cost'], abs=1e-3)
+                assert result['cost'] >= optimal - 1e-3
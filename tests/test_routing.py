@@ -0,0 +1,142 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pytest
+
+from backend.algorithms.geometry import encode_polyline
+from backend.utils.fetcher import RateLimitedFetcher
+from backend.utils.leg_cache import LegCache
+from backend.utils.routing import RoutingService
+
+
+def road_meters(a, b):
+    """The stub's road distance: Manhattan degrees scaled to meters, plus a one-way surcharge."""
+    (lng1, lat1), (lng2, lat2) = a, b
+    return 111000 * (abs(lng1 - lng2) + abs(lat1 - lat2)) + (25 if lng1 < lng2 else 0)
+
+
+class StubOSRM(BaseHTTPRequestHandler):
+    """Answers /table and /route like OSRM, counting calls and the coordinates sent."""
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        coords = [tuple(map(float, c.split(','))) for c in url.path.rsplit('/', 1)[1].split(';')]
+        query = parse_qs(url.query)
+        server = self.server
+        
+        if url.path.startswith('/table/'):
+            server.calls['table'] += 1
+            server.table_sizes.append(len(coords))
+            sources = [int(i) for i in query['sources'][0].split(';')] if 'sources' in query else range(len(coords))
+            destinations = ([int(j) for j in query['destinations'][0].split(';')]
+                            if 'destinations' in query else range(len(coords)))
+            distances = [[road_meters(coords[i], coords[j]) for j in destinations] for i in sources]
+            server.table_cells += len(distances) * len(distances[0])
+            body = {'code': 'Ok', 'distances': distances, 'durations': [[d / 10 for d in row] for row in distances]}
+        else:
+            server.calls['route'] += 1
+            a, b = coords
+            body = {'code': 'Ok', 'routes': [{
+                'distance': road_meters(a, b),
+                'duration': road_meters(a, b) / 10,
+                'geometry': encode_polyline([[a[1], a[0]], [b[1], b[0]]])
+            }]}
+        
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def osrm():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOSRM)
+    server.calls = {'table': 0, 'route': 0}
+    server.table_sizes = []
+    server.table_cells = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def routing_service(server, max_table_size):
+    return RoutingService(
+        osrm_url=f"http://127.0.0.1:{server.server_address[1]}",
+        max_table_size=max_table_size,
+        fetcher=RateLimitedFetcher('osrm:test', rate=0, retries=0),
+        leg_cache=LegCache()
+    )
+
+
+def locations(n):
+    rng = np.random.default_rng(n)
+    return [{'lat': 38.9 + lat, 'lng': -77.0 + lng}
+            for lat, lng in rng.uniform(-0.05, 0.05, size=(n, 2)).round(5)]
+
+
+def expected_matrix(stops):
+    coords = [(stop['lng'], stop['lat']) for stop in stops]
+    return np.array([[road_meters(a, b) / 1000 if a != b else 0.0 for b in coords] for a in coords])
+
+
+def test_table_requests_are_chunked_to_max_table_size(osrm):
+    service = routing_service(osrm, max_table_size=10)
+    stops = locations(37)
+    
+    matrix, _ = service.get_route_matrix(stops)
+    
+    assert osrm.calls['table'] > 1
+    assert max(osrm.table_sizes) <= 10
+    np.testing.assert_allclose(matrix, expected_matrix(stops))
+
+
+def test_single_table_request_when_it_fits(osrm):
+    service = routing_service(osrm, max_table_size=100)
+    stops = locations(12)
+    
+    matrix, _ = service.get_route_matrix(stops)
+    
+    assert osrm.calls['table'] == 1
+    np.testing.assert_allclose(matrix, expected_matrix(stops))
+
+
+def test_second_request_is_served_from_leg_cache(osrm):
+    service = routing_service(osrm, max_table_size=10)
+    stops = locations(23)
+    first, _ = service.get_route_matrix(stops)
+    legs = [(k, k + 1) for k in range(len(stops) - 1)]
+    service.get_route_geometries(stops, legs)
+    tables = osrm.calls['table']
+    routes = osrm.calls['route']
+    
+    second, geometry_cache = service.get_route_matrix(stops)
+    
+    assert osrm.calls['table'] == tables
+    np.testing.assert_array_equal(first, second)
+    assert set(legs) <= set(geometry_cache)
+    
+    service.get_route_geometries(stops, legs)
+    assert osrm.calls['route'] == routes
+
+
+def test_adding_a_stop_only_fetches_its_legs(osrm):
+    service = routing_service(osrm, max_table_size=10)
+    stops = locations(16)
+    service.get_route_matrix(stops[:-1])
+    osrm.table_cells = 0
+    
+    matrix, _ = service.get_route_matrix(stops)
+    
+    # One row and one column: 2N cells instead of a full N x N table.
+    assert osrm.table_cells <= 2 * len(stops)
+    np.testing.assert_allclose(matrix, expected_matrix(stops))
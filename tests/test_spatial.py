@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from backend.algorithms.spatial import SpatialIndex
+
+
+def uniform(n, seed):
+    rng = np.random.default_rng(seed)
+    return [{'lat': 38.9 + lat, 'lng': -77.0 + lng} for lat, lng in rng.uniform(-0.3, 0.3, size=(n, 2))]
+
+
+def clustered(n, seed):
+    """Tight neighborhoods far apart, so the tour's last stops sit across wide empty rings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-0.3, 0.3, size=(8, 2))
+    points = centers[rng.integers(0, 8, n)] + rng.normal(0, 0.005, size=(n, 2))
+    return [{'lat': 38.9 + lat, 'lng': -77.0 + lng} for lat, lng in points]
+
+
+def brute_force_route(index, start):
+    left = np.ones(index.n, dtype=bool)
+    left[start] = False
+    route = [start]
+    for _ in range(index.n - 1):
+        d = (index.x - index.x[route[-1]]) ** 2 + (index.y - index.y[route[-1]]) ** 2
+        d[~left] = np.inf
+        route.append(int(np.argmin(d)))
+        left[route[-1]] = False
+    return route
+
+
+@pytest.mark.parametrize('layout', [uniform, clustered], ids=['uniform', 'clustered'])
+@pytest.mark.parametrize('seed', range(3))
+def test_nearest_neighbor_route_matches_brute_force(layout, seed):
+    index = SpatialIndex(layout(600, seed))
+    
+    route = index.nearest_neighbor_route(start=seed)
+    
+    assert route == brute_force_route(index, start=seed)
+
+
+@pytest.mark.parametrize('layout', [uniform, clustered], ids=['uniform', 'clustered'])
+def test_knn_matches_brute_force(layout):
+    index = SpatialIndex(layout(300, 4))
+    
+    neighbors = index.knn(6)
+    
+    for i, row in enumerate(neighbors):
+        d = (index.x - index.x[i]) ** 2 + (index.y - index.y[i]) ** 2
+        d[i] = np.inf
+        assert sorted(d[row]) == pytest.approx(np.sort(d)[:6])